@@ -0,0 +1,60 @@
+# Backend/ML/class_expansion.py
+import numpy as np
+
+# Grows a fitted SGDClassifier's label set in place. The learned one-vs-rest weights of the
+# existing classes are kept and the new classes start from zero weights, so only new (and a
+# few recent) rows need training instead of a refit over the whole history.
+
+
+def _grow_rows(arr: np.ndarray, positions: np.ndarray, n_classes: int, binary: bool,
+               n_features: int | None = None, fill: float = 0.0) -> np.ndarray:
+    """Place the per-class rows of a coef (pass n_features) or intercept array at their new
+    positions in an array with n_classes rows. Rows of new classes are set to fill."""
+    if arr is None:
+        return None
+    arr = np.asarray(arr)
+    arr = arr.reshape(-1, n_features) if n_features is not None else arr.reshape(-1) # Binary weights may be stored flat
+    if binary:
+        # A binary model stores one row scoring the positive class (classes_[1]); one-vs-rest
+        # for the negative class is the same row negated.
+        arr = np.concatenate([-arr, arr], axis=0)
+    grown = np.full((n_classes,) + arr.shape[1:], fill, dtype=arr.dtype)
+    grown[positions] = arr
+    return grown
+
+
+def expand_classes(model, labels) -> list:
+    """Add the labels the model doesn't know yet to classes_, coef_ and intercept_ (and the
+    averaged weights when average=True). Returns the labels that were added."""
+    old = model.classes_
+    added = [c for c in np.unique(np.asarray(labels, dtype=object)) if c not in set(old)]
+    if not added:
+        return []
+
+    if old.dtype.kind in "US": # Fixed-width strings: widen to fit the longest label
+        classes = np.unique(np.concatenate([old.astype(str), np.asarray(added, dtype=str)]))
+    else:
+        classes = np.unique(np.concatenate([np.asarray(old, dtype=object), np.asarray(added, dtype=object)])) # Sorted, like partial_fit's classes_
+    positions = np.searchsorted(classes.astype(object), np.asarray(old, dtype=object)) # Where each old class moved to
+    binary = len(old) == 2
+    n = len(classes)
+    n_features = model.coef_.shape[-1]
+    # A new class starts with zero weights and the lowest existing bias, so it can't outscore
+    # the known classes on every row before it has seen any training data.
+    bias = float(np.min(np.concatenate([-np.ravel(model.intercept_), np.ravel(model.intercept_)]) if binary
+                        else model.intercept_))
+
+    if getattr(model, "average", False) and getattr(model, "_standard_coef", None) is not None:
+        model._standard_coef = _grow_rows(model._standard_coef, positions, n, binary, n_features)
+        model._standard_intercept = _grow_rows(model._standard_intercept, positions, n, binary, fill=bias)
+        model._average_coef = _grow_rows(model._average_coef, positions, n, binary, n_features)
+        model._average_intercept = _grow_rows(model._average_intercept, positions, n, binary, fill=bias)
+        use_average = model.average <= model.t_ - 1.0 # Same rule partial_fit uses to pick the exposed weights
+        model.coef_ = model._average_coef if use_average else model._standard_coef
+        model.intercept_ = model._average_intercept if use_average else model._standard_intercept
+    else:
+        model.coef_ = _grow_rows(model.coef_, positions, n, binary, n_features)
+        model.intercept_ = _grow_rows(model.intercept_, positions, n, binary, fill=bias)
+
+    model.classes_ = classes
+    return added
@@ -0,0 +1,167 @@
+# Backend/ML/holdout.py
+import os
+import json
+import time
+import numpy as np
+import scipy.sparse as sp
+from pathlib import Path
+from sklearn.metrics import accuracy_score, classification_report
+
+from app.artifact import vectorizer_config
+from app.features import same_features
+from app.scoring import LinearScorer
+from ML.seen_store import DIGEST
+
+# Fixed evaluation set kept next to the model. A row belongs to the holdout when its row id
+# falls in a stable hash bucket, so the same rows are held out on every run and on every
+# machine; they are never trained on. Their hashed feature matrix is stored too, so an
+# evaluation is only a predict over a saved sparse matrix. On disk (path without extension):
+#   <name>.X.npz     hashed features, one row per holdout row (scipy sparse)
+#   <name>.rows.npz  row ids and labels in the same order
+#   <name>.json      format, vectorizer config, fraction and revision (bumped when rows change)
+
+FORMAT = 1
+_BUCKETS = 10_000
+
+
+def holdout_bucket(ids: np.ndarray, fraction: float) -> np.ndarray:
+    """Boolean mask, True for row ids in the holdout hash bucket (about fraction of all ids)."""
+    ids = np.asarray(ids, dtype=DIGEST)
+    head = np.frombuffer(ids.tobytes(), dtype=">u8")[::2] # First 8 bytes of each digest
+    return head % _BUCKETS < int(round(fraction * _BUCKETS))
+
+
+class Holdout:
+    def __init__(self, path: str | os.PathLike, vectorizer, fraction: float = 0.1, max_rows: int = 50_000):
+        """Open the holdout at path (without extension). A stored holdout built with another
+        vectorizer config or fraction is dropped and rebuilt from the data seen from now on."""
+        self.path = Path(path)
+        self.vectorizer = vectorizer
+        self.fraction = fraction
+        self.max_rows = max_rows # New rows stop being held out (and get trained on) past this size
+        self.revision = 0
+        self.ids = np.empty(0, dtype=DIGEST)
+        self.labels = np.empty(0, dtype=object)
+        self.X = sp.csr_matrix((0, vectorizer.n_features), dtype=np.float64)
+        self._sorted = np.empty(0, dtype=DIGEST) # self.ids sorted, for membership tests
+        self._dirty = False
+        self._load()
+
+    def _file(self, suffix: str) -> Path:
+        return self.path.parent / (self.path.name + suffix)
+
+    def _meta(self) -> dict:
+        return {"format": FORMAT, "vectorizer": vectorizer_config(self.vectorizer), "fraction": self.fraction}
+
+    def _load(self):
+        meta_path = self._file(".json")
+        if not meta_path.exists():
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ours = self._meta()
+        if (meta.get("format") != ours["format"] or meta.get("fraction") != ours["fraction"]
+                or not same_features(meta.get("vectorizer"), ours["vectorizer"])): # Parameters only one sklearn version reports don't count
+            print(f"Holdout at {meta_path} was built with other settings, starting a new one.")
+            self.revision = meta.get("revision", 0) + 1 # Never reuse a revision number for different rows
+            self._dirty = True
+            return
+        rows = np.load(self._file(".rows.npz"), allow_pickle=False)
+        self.ids = rows["ids"].astype(DIGEST)
+        self.labels = rows["labels"].astype(object)
+        self.X = sp.load_npz(self._file(".X.npz")).tocsr()
+        self.revision = meta["revision"]
+        self._sorted = np.sort(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        """Boolean mask, True where the row id is in the holdout."""
+        ids = np.asarray(ids, dtype=DIGEST)
+        if len(self._sorted) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        pos = np.searchsorted(self._sorted, ids)
+        pos[pos == len(self._sorted)] = 0
+        return self._sorted[pos] == ids
+
+    def update(self, texts, categories, ids: np.ndarray, candidates: np.ndarray | None = None) -> np.ndarray:
+        """Add rows in the holdout bucket that aren't stored yet (only where candidates is True,
+        e.g. rows never trained on), vectorizing just those rows. Returns the mask of rows that
+        are in the holdout, which training must skip."""
+        ids = np.asarray(ids, dtype=DIGEST)
+        held = self.contains(ids)
+        add = holdout_bucket(ids, self.fraction) & ~held
+        if candidates is not None:
+            add &= candidates
+        add_idx = np.flatnonzero(add)
+        if len(add_idx):
+            _, first = np.unique(ids[add_idx], return_index=True) # Duplicate rows are held out once
+            add_idx = add_idx[np.sort(first)][:max(self.max_rows - len(self), 0)]
+        if len(add_idx):
+            texts, categories = np.asarray(texts, dtype=object), np.asarray(categories, dtype=object)
+            self.X = sp.vstack([self.X, self.vectorizer.transform(texts[add_idx])], format="csr")
+            self.ids = np.concatenate([self.ids, ids[add_idx]])
+            self.labels = np.concatenate([self.labels, categories[add_idx]])
+            self._sorted = np.sort(self.ids)
+            self.revision += 1
+            self._dirty = True
+            held = self.contains(ids)
+        return held
+
+    def save(self):
+        """Write the holdout if it changed. Each file is replaced atomically."""
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._replace(".X.npz", lambda f: sp.save_npz(f, self.X))
+        self._replace(".rows.npz", lambda f: np.savez(f, ids=self.ids, labels=self.labels.astype(str)))
+        meta = {**self._meta(), "revision": self.revision, "rows": len(self)}
+        self._replace(".json", lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8"))) # Written last, marks the set complete
+        self._dirty = False
+
+    def _replace(self, suffix: str, write):
+        tmp = self._file(suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, self._file(suffix))
+
+    def evaluate(self, model, latency_rows: int = 200) -> dict | None:
+        """Score the model on the stored features: accuracy, per-class metrics and latency.
+        Latency is measured with the scorer the API serves with. Returns None when the holdout
+        is too small to say anything."""
+        if len(self) < 10 or len(np.unique(self.labels)) < 2:
+            return None
+        scorer = LinearScorer.from_model(model)
+        predict = (lambda X: scorer.predict(scorer.decision_function(X))) if scorer is not None else model.predict
+        start = time.perf_counter()
+        y_pred = predict(self.X)
+        seconds = time.perf_counter() - start
+
+        single = [] # One row at a time, what a /predict call costs
+        for i in range(min(latency_rows, len(self))):
+            row = self.X[i]
+            t = time.perf_counter()
+            predict(row)
+            single.append(time.perf_counter() - t)
+        single_us = np.array(single) * 1e6
+
+        return {
+            "holdout": {"revision": self.revision, "rows": len(self), "fraction": self.fraction},
+            "accuracy": float(accuracy_score(self.labels, y_pred)),
+            "per_class": classification_report(self.labels, y_pred, output_dict=True, zero_division=0),
+            "latency": {
+                "batch_seconds": seconds,
+                "batch_rows_per_sec": len(self) / max(seconds, 1e-9),
+                "single_row_us_p50": float(np.percentile(single_us, 50)),
+                "single_row_us_p99": float(np.percentile(single_us, 99)),
+            },
+        }
+
+
+def write_eval(report: dict, snapshot_path: str | os.PathLike) -> Path:
+    """Save an evaluation report next to its snapshot as <snapshot>.eval.json."""
+    out = Path(str(snapshot_path) + ".eval.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"snapshot": Path(snapshot_path).name, **report}, f, indent=2)
+    return out
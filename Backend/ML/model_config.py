@@ -0,0 +1,51 @@
+# Backend/ML/model_config.py
+import ast
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+
+# Vectorizer and classifier settings behind build_vectorizer() and new_model(). The defaults are
+# below; a tuning run (retrain_ml_model.py --tune --promote) writes its winner to ML/model_config.json,
+# which then overrides them for the trainer and the API alike (PAI_MODEL_CONFIG names another file).
+# Only the tunable keys live here, alternate_sign=False and norm="l2" stay fixed in build_vectorizer.
+
+CONFIG_PATH = Path(os.getenv("PAI_MODEL_CONFIG", str(Path(__file__).resolve().parent / "model_config.json")))
+DEFAULT_VECTORIZER = {"n_features": 2**20, "ngram_range": [1, 2]}
+DEFAULT_CLASSIFIER = {"loss": "log_loss", "alpha": 1e-5, "max_iter": 5, "tol": 1e-3}
+
+
+def load_model_config(path: str | os.PathLike | None = None) -> Dict[str, Dict[str, Any]]:
+    """{"vectorizer": {...}, "classifier": {...}}: the defaults updated with the promoted file, if any."""
+    path = Path(path) if path else CONFIG_PATH
+    config = {"vectorizer": dict(DEFAULT_VECTORIZER), "classifier": dict(DEFAULT_CLASSIFIER)}
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        for section, values in config.items():
+            values.update(saved.get(section) or {})
+    return config
+
+
+def save_model_config(vectorizer: Dict[str, Any], classifier: Dict[str, Any],
+                      path: str | os.PathLike | None = None, **info) -> Path:
+    """Make these settings the defaults from now on. info (e.g. the tuning report) is kept alongside."""
+    path = Path(path) if path else CONFIG_PATH
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"vectorizer": vectorizer, "classifier": classifier,
+                   "promoted_at": datetime.now().isoformat(timespec="seconds"), **info}, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def vectorizer_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """The tunable settings of a vectorizer_config() dict, as stored in artifact headers
+    (tuples there are reprs, "(1, 2)")."""
+    settings = {}
+    for key, default in DEFAULT_VECTORIZER.items():
+        value = config.get(key, default)
+        value = ast.literal_eval(value) if isinstance(value, str) else value
+        settings[key] = list(value) if isinstance(value, tuple) else value
+    return settings
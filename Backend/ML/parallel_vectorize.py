@@ -0,0 +1,58 @@
+# Backend/ML/parallel_vectorize.py
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+# HashingVectorizer is stateless, so upcoming batches can be hashed in worker processes while
+# the main process runs partial_fit on the current one. Batches always come back in the order
+# they went in, so training sees exactly the same sequence as the single-process loop.
+
+_worker_vectorizer = None # Set once per worker process by _init_worker
+
+
+def _init_worker(vectorizer):
+    global _worker_vectorizer
+    _worker_vectorizer = vectorizer
+
+
+def _transform(texts):
+    return _worker_vectorizer.transform(texts)
+
+
+class VectorizePool:
+    def __init__(self, vectorizer, workers: int = 1, max_pending: int | None = None):
+        self.vectorizer = vectorizer
+        self.workers = workers # 1 (or less) hashes inline in the calling process
+        self.max_pending = max_pending or 2 * max(workers, 1) # Batches hashed ahead of the consumer (backpressure)
+        self._pool: ProcessPoolExecutor | None = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.vectorizer,)) # Vectorizer is shipped to each worker once
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def transform_batches(self, batches: Iterable) -> Iterator:
+        """Yield the feature matrix of every batch of texts, in input order."""
+        if self._pool is None:
+            for texts in batches:
+                yield self.vectorizer.transform(texts)
+            return
+
+        it = iter(batches)
+        pending = deque()
+        for texts in it: # Fill the window
+            pending.append(self._pool.submit(_transform, texts))
+            if len(pending) >= self.max_pending:
+                break
+        while pending:
+            X = pending.popleft().result() # Oldest first keeps the order
+            nxt = next(it, None)
+            if nxt is not None: # Refill one slot for every batch handed out
+                pending.append(self._pool.submit(_transform, nxt))
+            yield X
@@ -0,0 +1,150 @@
+# Backend/ML/registry.py
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Index of the trained model versions in a models directory. manifest.json lists every registered
+# snapshot (files, accuracy, rows, classes, sizes) and names the active one, so serving and the
+# smoke test find the current model with one small read instead of scanning the directory.
+# The manifest is always replaced atomically; file names in it are relative to the directory.
+
+MANIFEST = "manifest.json"
+
+
+class Registry:
+    def __init__(self, models_dir: str | os.PathLike):
+        self.models_dir = Path(models_dir)
+        self.path = self.models_dir / MANIFEST
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> Dict[str, Any]:
+        """The manifest, or an empty one when nothing has been registered yet."""
+        if not self.path.exists():
+            return {"format": 1, "active": None, "versions": []}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, manifest: Dict[str, Any]):
+        self.models_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path) # Readers see the old or the new manifest, never half of one
+
+    def versions(self) -> List[Dict[str, Any]]:
+        return self.load()["versions"]
+
+    def get(self, version_id: str) -> Dict[str, Any] | None:
+        return next((v for v in self.versions() if v["id"] == version_id), None)
+
+    def active(self) -> Dict[str, Any] | None:
+        """Entry of the active version, None when there is none."""
+        manifest = self.load()
+        return next((v for v in manifest["versions"] if v["id"] == manifest["active"]), None)
+
+    def active_path(self, prefer_artifact: bool = True) -> Path | None:
+        """File to serve for the active version: its artifact when there is one and it's preferred."""
+        entry = self.active()
+        if entry is None:
+            return None
+        name = entry.get("artifact") if prefer_artifact and entry.get("artifact") else entry["file"]
+        return self.models_dir / name
+
+    def register(self, snapshot: str | os.PathLike, artifact: str | os.PathLike | None = None,
+                 eval_file: str | os.PathLike | None = None, accuracy: float | None = None,
+                 rows_trained: int | None = None, classes=None, activate: bool = True) -> Dict[str, Any]:
+        """Add a snapshot (plus its artifact and evaluation report) as a new version, made active by default."""
+        snapshot = Path(snapshot)
+        files = [p for p in (snapshot, artifact, eval_file) if p is not None]
+        entry = {
+            "id": snapshot.stem,
+            "file": snapshot.name,
+            "artifact": Path(artifact).name if artifact is not None else None,
+            "eval": Path(eval_file).name if eval_file is not None else None,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "created_ts": time.time(),
+            "accuracy": accuracy,
+            "rows_trained": rows_trained,
+            "classes": [str(c) for c in classes] if classes is not None else None,
+            "size_bytes": sum(os.path.getsize(p) for p in files),
+        }
+        manifest = self.load()
+        manifest["versions"] = [v for v in manifest["versions"] if v["id"] != entry["id"]] + [entry]
+        if activate:
+            manifest["active"] = entry["id"]
+        self._write(manifest)
+        return entry
+
+    def activate(self, version_id: str) -> Dict[str, Any]:
+        """Serve another registered version, e.g. to roll back."""
+        manifest = self.load()
+        entry = next((v for v in manifest["versions"] if v["id"] == version_id), None)
+        if entry is None:
+            raise KeyError(f"Unknown model version: {version_id}")
+        manifest["active"] = version_id
+        self._write(manifest)
+        return entry
+
+    def gc(self, keep_last: int | None = None, max_age_days: float | None = None) -> List[str]:
+        """Delete versions beyond the keep_last newest and/or older than max_age_days, with their
+        files. The active version is always kept. Returns the ids removed."""
+        manifest = self.load()
+        versions = sorted(manifest["versions"], key=lambda v: v["created_ts"], reverse=True) # Newest first
+        now = time.time()
+        keep, drop = [], []
+        for i, v in enumerate(versions):
+            too_many = keep_last is not None and i >= keep_last
+            too_old = max_age_days is not None and now - v["created_ts"] > max_age_days * 86400
+            (drop if (too_many or too_old) and v["id"] != manifest["active"] else keep).append(v)
+        if not drop:
+            return []
+        manifest["versions"] = sorted(keep, key=lambda v: v["created_ts"])
+        self._write(manifest) # Unlist first, a crash below only leaves unreferenced files
+        for v in drop:
+            for name in (v["file"], v.get("artifact"), v.get("eval")):
+                if name:
+                    try:
+                        os.remove(self.models_dir / name)
+                    except FileNotFoundError:
+                        pass
+        return [v["id"] for v in drop]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Inspect and manage registered model versions")
+    p.add_argument("--models_dir", default=str(Path(__file__).resolve().parent / "saved_models"))
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="Registered versions, the active one marked with *")
+    act = sub.add_parser("activate", help="Serve a registered version (rollback)")
+    act.add_argument("version")
+    gc = sub.add_parser("gc", help="Delete old versions")
+    gc.add_argument("--keep_last", type=int, default=None)
+    gc.add_argument("--max_age_days", type=float, default=None)
+    args = p.parse_args()
+
+    registry = Registry(args.models_dir)
+    if args.cmd == "list":
+        manifest = registry.load()
+        for v in manifest["versions"]:
+            mark = "*" if v["id"] == manifest["active"] else " "
+            acc = f"{v['accuracy']:.4f}" if v.get("accuracy") is not None else "   n/a"
+            print(f"{mark} {v['id']}  {v['created_at']}  acc {acc}  rows {v.get('rows_trained')}  "
+                  f"classes {len(v.get('classes') or [])}  {v['size_bytes'] / 2**20:.0f} MB")
+    elif args.cmd == "activate":
+        print(f"Active: {registry.activate(args.version)['id']}")
+    else:
+        removed = registry.gc(args.keep_last, args.max_age_days)
+        print(f"Removed {len(removed)} versions" + (f": {', '.join(removed)}" if removed else ""))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 import os
+import sys
 import json 
+import time
 import argparse
 from datetime import datetime
 import hashlib
+import shutil
 import joblib
 import pandas as pd
 import numpy as np
@@ -12,6 +15,20 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 from pathlib import Path
 
+if __package__ in (None, ""): # Run as a script (python ML/retrain_ml_model.py), make Backend/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ML.seen_store import SeenStore, row_ids
+from ML.parallel_vectorize import VectorizePool
+from ML.class_expansion import expand_classes
+from ML.holdout import Holdout, write_eval
+from ML.registry import Registry
+from ML.data_sources import WATERMARK_FILE, SqlSource, redact_url
+from ML.vendor_index import INDEX_FILE as VENDOR_INDEX_FILE, build_index, model_names
+from ML.model_config import load_model_config
+from app.features import FIXED_PARAMS, column_renames, same_features
+from app.artifact import SUFFIX as ARTIFACT_SUFFIX, artifact_path, export_artifact, read_header, vectorizer_config
+from app.metrics import METRICS
+
 
 ROOT = Path(__file__).resolve().parent.parent   # Backend/
 DEFAULT_OUTDIR = ROOT / "ML" / "saved_models" 
@@ -19,47 +36,123 @@ DEFAULT_OUTDIR = ROOT / "ML" / "saved_models"
 def get_args():
     """Parse command line arguments."""
     p = argparse.ArgumentParser(description="Incremtal bill category model retraining")
-    p.add_argument("--csv", default= r"C:\Users\saifb\Downloads\PAI\data\training_data.csv", 
+    p.add_argument("--csv", default= str(ROOT.parent / "data" / "training_data.csv"),
                    help= "Path to the training data CSV file")
+    p.add_argument("--source", choices=["csv", "sql"], default="csv",
+        help="Where training rows come from: the CSV, or the database view streamed with a created_at watermark."
+    )
+    p.add_argument("--db_url", default=os.getenv("PAI_DB_URL"),
+        help="Database for --source sql, sqlite:///path.db or postgresql://... (default: PAI_DB_URL)."
+    )
+    p.add_argument("--sql_view", default="training_expenses",
+        help="View (or table) with vendor, description, category and created_at columns."
+    )
+    p.add_argument("--sql_full", action="store_true",
+        help="Ignore the watermark and read the whole view (already trained rows are still skipped)."
+    )
     p.add_argument("--outdir", default= str(DEFAULT_OUTDIR),
                    help= "Path to the output directory for saving the model")
     p.add_argument("--model_name", default= "bill_category_model.joblib",
                    help= "Name of the model to be saved")
+    p.add_argument("--seen_store", default= "seen_ids",
+                   help= "Base filename of the binary store of trained row ids (.ids/.log)")
     p.add_argument("--seen_file", default= "seen_hashes.json",
-                   help= "Filename to store trained data hashes")
+                   help= "Legacy JSON of trained data hashes, migrated into --seen_store on first use")
     p.add_argument("--batch_size", type=int, default=2048,
         help="Mini-batch size for partial_fit (helps with very large CSVs)."
     )
     p.add_argument("--test_size", type=float, default=0.2,
-        help="Holdout share for quick accuracy check each run."
+        help="Split share for the quick accuracy check, used while the persistent holdout is too small."
+    )
+    p.add_argument("--holdout", default= "holdout",
+                   help= "Base filename of the persistent evaluation holdout (features, labels, metadata)")
+    p.add_argument("--holdout_fraction", type=float, default=0.1,
+        help="Share of new rows kept out of training for the persistent holdout."
+    )
+    p.add_argument("--holdout_max_rows", type=int, default=50_000,
+        help="Maximum holdout size, new rows are trained on once it is full."
     )
     p.add_argument("--random_state", type=int, default=42,
         help="Random seed for reproducible splits."
     )
+    p.add_argument("--stream", action="store_true",
+        help="Read the CSV in chunks instead of all at once, memory stays bounded by --chunk_size."
+    )
+    p.add_argument("--chunk_size", type=int, default=100_000,
+        help="Rows per CSV chunk in --stream mode."
+    )
+    p.add_argument("--workers", type=int, default=1,
+        help="Processes vectorizing upcoming batches while partial_fit runs (1 = no extra processes)."
+    )
+    p.add_argument("--train_mode", choices=["sequential", "sharded"], default="sequential",
+        help="How a model is trained from scratch (first run, new vectorizer settings, --refit_on_new_classes): one "
+             "partial_fit pass in this process, or replicas on --shards worker processes with parameter averaging."
+    )
+    p.add_argument("--shards", type=int, default=os.cpu_count() or 1,
+        help="Worker processes (and data shards) in --train_mode sharded."
+    )
+    p.add_argument("--shard_rounds", type=int, default=1,
+        help="Synchronized averaging rounds in --train_mode sharded, 1 averages once at the end."
+    )
+    p.add_argument("--keep_last", type=int, default=5,
+        help="Registered snapshots kept, older ones are deleted (the active one is always kept)."
+    )
+    p.add_argument("--max_age_days", type=float, default=None,
+        help="Also delete snapshots older than this many days."
+    )
+    p.add_argument("--refit_on_new_classes", action="store_true",
+        help="Retrain from scratch on all data when new categories appear, instead of adding them to the model."
+    )
+    p.add_argument("--replay_rows", type=int, default=10_000,
+        help="Recent already-trained rows mixed into training when new categories are added."
+    )
+    p.add_argument("--vendor_index", default=VENDOR_INDEX_FILE,
+        help="Vendor lookup index written to outdir from the CSV and the feedback, empty to skip."
+    )
+    p.add_argument("--feedback_csv", default=str(ROOT / "data" / "feedback.csv"),
+        help="Feedback CSV written by the API, counted into the vendor index."
+    )
+    p.add_argument("--vendor_min_count", type=int, default=20,
+        help="Rows a vendor needs before the API answers it from the index."
+    )
+    p.add_argument("--vendor_min_share", type=float, default=0.99,
+        help="Share of a vendor's rows its top category needs for the index to answer it."
+    )
+    p.add_argument("--artifact_layout", choices=["dense", "compact"], default="compact",
+        help="Artifact layout: compact stores only the weights of features the model uses."
+    )
+    p.add_argument("--artifact_dtype", choices=["float32", "float64"], default="float32",
+        help="Weight precision of the artifact, the .joblib snapshot always keeps float64."
+    )
+    p.add_argument("--artifact_prune", type=float, default=0.0,
+        help="Compact artifacts drop features whose largest weight is below this fraction of the model's largest, 0 keeps all."
+    )
+    p.add_argument("--tune", action="store_true",
+        help="Search vectorizer and classifier settings on the CSV and the holdout instead of training (see ML/tuning.py)."
+    )
+    p.add_argument("--tune_grid", default=None,
+        help='JSON grid, e.g. {"vectorizer": {"n_features": [262144]}, "classifier": {"alpha": [1e-5, 1e-4]}}.'
+    )
+    p.add_argument("--tune_jobs", type=int, default=None,
+        help="Candidates trained at the same time, default all cores."
+    )
+    p.add_argument("--tune_cache", default="tune_cache",
+        help="Directory in outdir caching the hashed CSV per vectorizer config."
+    )
+    p.add_argument("--tune_tolerance", type=float, default=0.001,
+        help="Candidates this close to the best accuracy are ranked by artifact size, then training time."
+    )
+    p.add_argument("--promote", action="store_true",
+        help="With --tune, make the best candidate the default config (ML/model_config.json)."
+    )
+    p.add_argument("--summary_json", default="last_run.json",
+        help="Run summary (arguments, rows, time per stage, peak RSS) written to outdir, empty to skip."
+    )
     return p.parse_args()
 
 
-def load_data(csv_path: str) -> pd.DataFrame:
-    # Read CSV (utf-8-sig handles BOMs from Excel)
-    df = pd.read_csv(csv_path, encoding="utf-8-sig")
-
-    # Normalize headers
-    df.columns = [c.replace("\ufeff", "").strip().lower() for c in df.columns]
-
-    print(list(df.columns))  # Debug: print column names
-
-    # Map common synonyms
-    if "supplier" in df.columns and "vendor" not in df.columns:
-        df = df.rename(columns={"supplier": "vendor"})
-    if "details" in df.columns and "description" not in df.columns:
-        df = df.rename(columns={"details": "description"})
-    if "memo" in df.columns and "description" not in df.columns:
-        df = df.rename(columns={"memo": "description"})
-    if "label" in df.columns and "category" not in df.columns:
-        df = df.rename(columns={"label": "category"})
-    if "class" in df.columns and "category" not in df.columns:
-        df = df.rename(columns={"class": "category"})
-
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Check the required columns, clean them and build the text column for a frame with normalized headers."""
     # Ensure required columns exist
     required = {"vendor", "description", "category"}
     missing = required - set(df.columns)
@@ -78,37 +171,163 @@ def load_data(csv_path: str) -> pd.DataFrame:
 
     return df
 
+def load_data(csv_path: str) -> pd.DataFrame:
+    # Read CSV (utf-8-sig handles BOMs from Excel)
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+
+    df = df.rename(columns=column_renames(df.columns)) # Normalize headers and map common synonyms
+
+    print(list(df.columns))  # Debug: print column names
+
+    return clean_frame(df)
+
+def iter_data_chunks(csv_path: str, chunk_size: int):
+    """Stream the CSV as cleaned frames of at most chunk_size rows (same cleaning as load_data)."""
+    renames = column_renames(pd.read_csv(csv_path, encoding="utf-8-sig", nrows=0).columns)
+    for chunk in pd.read_csv(csv_path, encoding="utf-8-sig", chunksize=chunk_size):
+        yield clean_frame(chunk.rename(columns=renames))
+
+def scan_categories(csv_path: str, chunk_size: int) -> np.ndarray:
+    """All category labels in the CSV, reading only the category column chunk by chunk."""
+    renames = column_renames(pd.read_csv(csv_path, encoding="utf-8-sig", nrows=0).columns)
+    col = next((raw for raw, norm in renames.items() if norm == "category"), None)
+    if col is None:
+        raise ValueError(f"CSV missing required columns: {{'category'}}. Found: {sorted(set(renames.values()))}")
+    cats = set()
+    for chunk in pd.read_csv(csv_path, encoding="utf-8-sig", usecols=[col], chunksize=chunk_size):
+        values = chunk[col].astype(str).fillna("").str.strip()
+        cats.update(values[values.str.len() > 0].unique())
+    return np.array(sorted(cats), dtype=object)
+
+def peak_rss_mb() -> float | None:
+    """Peak resident memory of this process in MB, None where it can't be read."""
+    try:
+        import resource # Unix only
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10 # Bytes on macOS, KB on Linux
+    except ImportError:
+        try:
+            import psutil # Optional, gives the peak working set on Windows
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return None
+
 def row_id(text: str, category: str) -> str:
     """Create a unique and stable ID per row to avoid retraining on seen data (
-     using a hash of text + category)."""
+     using a hash of text + category). Legacy format, only used to migrate seen_hashes.json;
+     training uses the vectorized ML.seen_store.row_ids."""
     h = hashlib.sha256() # Create a new sha256 hash object. 
     h.update((text + "||" + str(category)).encode("utf-8")) # Update the hash object with the combined text and category."))
     return h.hexdigest() # Return the hexadecimal representation of the hash with 64 characters.
 
-def prepare_seen(outdir: str, seen_file: str) -> set:
-    """Load or initialize the set of seen row hashes."""
-    os.makedirs(outdir, exist_ok=True) # Ensure output directory exists for saving the seen hashes file.
-    path = os.path.join(outdir, seen_file) # Full path to the seen hashes file. 
-    if os.path.exists(path): # If the file exists, load the seen hashes from it.
-        with open(path, "r", encoding="utf-8") as f: # Open the file for reading.
-                return set(json.load(f)) # Load the JSON data and convert it to a set.
-    return set() # If the file doesn't exist, return an empty set.
-
-def save_seen(outdir: str, seen_file: str, seen_ids: set):
-    """Persist the set of seen row hashes to disk."""
-    path = os.path.join(outdir, seen_file) # Full path to the seen hashes file.
-    with open(path, "w", encoding="utf-8") as f: # Open the file for writing.
-         json.dump(sorted(list(seen_ids)), f) # Save the sorted list of seen hashes as JSON.
-
-def build_vectorizer() -> HashingVectorizer:
-     """Create a stateless text vectorizer that works for strreaming/online learning."""
+def prepare_seen(outdir: str, seen_store: str, seen_file: str | None = None, df=None) -> SeenStore:
+    """Open the store of seen row ids. If it doesn't exist yet but a legacy JSON file does,
+    migrate the JSON hashes into it once (this needs the training rows: df is a data frame
+    or an iterable of CSV or database chunks)."""
+    os.makedirs(outdir, exist_ok=True) # Ensure output directory exists for saving the seen ids.
+    store = SeenStore(os.path.join(outdir, seen_store))
+    legacy = os.path.join(outdir, seen_file) if seen_file else None
+    if not store.exists() and legacy and os.path.exists(legacy) and df is not None:
+        migrated = store.migrate_json(legacy, [df] if isinstance(df, pd.DataFrame) else df)
+        store.save()
+        print(f"Migrated {migrated} seen rows from {legacy} to {store.ids_path}")
+    return store
+
+def save_seen(seen: SeenStore):
+    """Persist the row ids added during this run to disk."""
+    seen.save()
+
+def build_vectorizer(settings: dict | None = None) -> HashingVectorizer:
+     """Create a stateless text vectorizer that works for strreaming/online learning.
+     settings (n_features, ngram_range) default to ML/model_config.py's, i.e. the promoted ones."""
+     settings = settings or load_model_config()["vectorizer"]
      return HashingVectorizer(
-        n_features = 2**20,  #Large feature space to reduce collisions
-        alternate_sign=False, # Keeps the output non-negative for better interpretability
-        ngram_range=(1, 2), # Uses unigrams and bigrams for better context capture
-        norm="l2" # Normalizes the output to unit length for consistent scaling
+        n_features = settings["n_features"],  #Large feature space (2**20 by default) to reduce collisions
+        ngram_range=tuple(settings["ngram_range"]), # Unigrams and bigrams by default for better context capture
+        **FIXED_PARAMS # alternate_sign=False keeps the output non-negative, norm="l2" scales rows to unit length
      )  
 
+def new_model(random_state: int, params: dict | None = None) -> SGDClassifier:
+    """Untrained classifier for text classification. params (loss, alpha, ...) default to
+    ML/model_config.py's: log loss, alpha=1e-5 against overfitting, unless a tuned config was promoted."""
+    return SGDClassifier(
+        **(params or load_model_config()["classifier"]),
+        random_state=random_state, # Ensures reproducibility.
+    )
+
+def vectorizer_changed(outdir: str) -> bool:
+    """True when the active model was trained with other vectorizer settings than build_vectorizer()'s
+    (e.g. after promoting a tuned config). Its weights mean nothing for the new features, so the
+    next run must train a new model on every row."""
+    active = Registry(outdir).active_path(prefer_artifact=True)
+    if active is None or active.suffix != ARTIFACT_SUFFIX or not active.exists():
+        return False
+    header, _ = read_header(active)
+    config = header.get("vectorizer")
+    return config is not None and not same_features(config, vectorizer_config(build_vectorizer()))
+
+def _check_vectorizer(outdir: str) -> bool:
+    """vectorizer_changed(outdir), announced."""
+    stale = vectorizer_changed(outdir)
+    if stale:
+        print("The active model was trained with other vectorizer settings (a tuned config was promoted), "
+              "training a new model on every row.")
+    return stale
+
+def load_or_new_model(outdir: str, model_name: str, random_state: int) -> SGDClassifier:
+    """Load the registry's active model (the latest saved one without a registry), or start a new one on the first run."""
+    active = Registry(outdir).active_path(prefer_artifact=False) # Follows rollbacks done with ML/registry.py activate
+    latest_model_path = str(active) if active is not None and active.exists() else os.path.join(outdir, model_name) # Assigns the path for the latest model file (Initializes or loads).
+    if os.path.exists(latest_model_path):  # If the model file exists, load it.
+        model: SGDClassifier = joblib.load(latest_model_path) # Load the existing model.
+        print(f"Loaded existing model from {latest_model_path}") # Print confirmation of model loading.
+        return model
+    print("Initialized new SGDClassifier model")
+    return new_model(random_state)
+
+def _link_or_copy(src: str, dst: str):
+    """Atomically make dst the same file as src (a hard link, or a copy where links aren't supported)."""
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+def artifact_options(args) -> dict:
+    """export_artifact options from the command line."""
+    return {"layout": args.artifact_layout, "dtype": args.artifact_dtype, "prune": args.artifact_prune}
+
+def save_model(model, outdir: str, model_name: str, accuracy: float | None = None,
+               rows_trained: int | None = None, report: dict | None = None, artifact_options: dict | None = None):
+    """Save a timestamped snapshot with its artifact (and holdout report), register it as the active
+    version in the model registry and point the latest files at it. artifact_options are passed to
+    export_artifact (layout, dtype, prune), a dense float64 artifact without them. Returns (latest, snapshot) paths."""
+    os.makedirs(outdir, exist_ok=True) # Ensure the output directory exists.
+    ts =  datetime.now().strftime("%Y%m%dT%H%M%SZ") # Get the current timestamp.
+    snapshot = os.path.join(outdir, f"bill_categorizer_incremental_{ts}.joblib") # Save a snapshot of the model with a timestamp.
+    joblib.dump(model, snapshot + ".tmp") # Save the snapshot of the model.
+    os.replace(snapshot + ".tmp", snapshot) # Never rewrite a file in place, the latest name may link to it
+    latest_model_path = os.path.join(outdir, model_name)
+    _link_or_copy(snapshot, latest_model_path) # Training resumes from this name, a link costs no second write.
+    print(f"Snapshot saved to:   {snapshot}")
+    print(f"Saved latest model to: {latest_model_path}")
+
+    artifact = export_artifact(model, artifact_path(snapshot), build_vectorizer(), **(artifact_options or {})) # What the API memory-maps
+    if artifact is not None:
+        _link_or_copy(str(artifact), str(artifact_path(latest_model_path))) # For servers scanning without a manifest
+        print(f"Artifact saved to:   {artifact}")
+    eval_file = write_eval(report, snapshot) if report is not None else None
+    if report is not None:
+        _print_report(report, eval_file)
+
+    entry = Registry(outdir).register(snapshot, artifact, eval_file, accuracy=accuracy, rows_trained=rows_trained,
+                                      classes=getattr(model, "classes_", None)) # Also makes it the active version
+    print(f"Registered version {entry['id']} as active")
+    return latest_model_path, snapshot
+
 def new_labels(model: SGDClassifier, labels: np.ndarray) -> np.ndarray:
      """Return labels not seen by the existing model yet to avoid retraining on them."""
      if not hasattr(model, "classes_"):  # If model has no classes (only happens when model not trained), return all unique labels.
@@ -118,81 +337,185 @@ def new_labels(model: SGDClassifier, labels: np.ndarray) -> np.ndarray:
 def train_or_update_model(df: pd.DataFrame,
                           outdir: str,
                           model_name: str,
-                          seen: set,
+                          seen: SeenStore,
                           batch_size: int,
                           test_size: float,
-                          random_state: int):
+                          random_state: int,
+                          workers: int = 1,
+                          refit_on_new_classes: bool = False,
+                          replay_rows: int = 10_000,
+                          holdout: Holdout | None = None,
+                          artifact_options: dict | None = None,
+                          shards: int = 1,
+                          shard_rounds: int = 1):
     """Train the data on the first run or update otherwise with new data incrementally:
     - It uses only rhe new rows for partial_fit.
-    - If unseen categories appear, refits from scartch on All data ro register new classes.
+    - If unseen categories appear, grows the model's classes in place and trains on the new rows
+      plus the replay_rows most recent seen ones (or refits from scartch on All data with refit_on_new_classes).
+    - Rows in the persistent holdout are never trained on; the model is evaluated on it (or on a
+      quick split while it is too small).
+    - With shards > 1, models trained from scratch are trained by ML/sharded.py (replicas in worker
+      processes, parameter averaging over shard_rounds rounds); incremental updates stay sequential.
     """
+    stale = _check_vectorizer(outdir) # Promoted vectorizer settings: a new model, every row counts as new
     # Compute IDs per row and split into new and seen. 
-    df["row_id"] = [row_id(t, c) for t, c in zip(df["text"], df["category"])]  # Create unique row IDs based on text and category.
-    df_new = df[~df["row_id"].isin(seen)].reset_index(drop=True) # Filter out rows that have already been seen."
+    with METRICS.time("pai_train_stage_seconds", stage="row_ids"):
+        ids = row_ids(df["text"].values, df["category"].values) # Vectorized 16 byte IDs based on text and category.
+        is_seen = seen.contains(ids) & (not stale) # One bulk membership test for the whole frame.
+    with METRICS.time("pai_train_stage_seconds", stage="holdout"):
+        is_held = (holdout.update(df["text"].values, df["category"].values, ids, candidates=~is_seen) # Only untrained rows can be held out.
+                   if holdout is not None else np.zeros(len(df), dtype=bool))
+    is_new = ~is_seen & ~is_held
+    df_new = df[is_new].reset_index(drop=True) # Filter out rows that have already been seen."
 
     vectorizer = build_vectorizer() # Create a new vectorizer instance (stateless).
 
-    latest_model_path = os.path.join(outdir, model_name) # Assigns the path for the latest model file (Initializes or loads).
-
-    if os.path.exists(latest_model_path):  # If the model file exists, load it.
-        model: SGDClassifier = joblib.load(latest_model_path) # Load the existing model.
-        print(f"Loaded existing model from {latest_model_path}") # Print confirmation of model loading.
-
-    else: 
-        # First time model training with default parameters for text classification.
-        model = SGDClassifier(
-            loss="log_loss",  # Uses log loss for multi-class classification.
-            alpha=1e-5, # Regularization term to prevent overfitting.
-            max_iter=5, # Number of iterations for training.
-            tol=1e-3, # Tolerance for stopping criteria.
-            random_state=random_state, # Ensures reproducibility.
-        )
-        print("Initialized new SGDClassifier model") 
+    with METRICS.time("pai_train_stage_seconds", stage="load_model"):
+        model = new_model(random_state) if stale else load_or_new_model(outdir, model_name, random_state) # Loads the latest model or initializes one on the first run.
     
-    # If there are labels current model doesn't know, they mush be registered via full retraining.
+    # If there are labels current model doesn't know, they mush be registered before training on them.
 
     unseen = new_labels(model, df_new["category"].values) # Get labels not seen by the model yet.
-    if hasattr(model, "classes_") and len(unseen) > 0: # If the model is already trained and there are unseen labels.
+    if hasattr(model, "classes_") and len(unseen) > 0 and refit_on_new_classes: # Already trained, unseen labels, full retraining asked for.
         print(f"New categories detected: {unseen}. Re-fitting model from scratch to register them.") # Notify about new categories.
+        start = time.perf_counter()
         all_classes = np.unique(df["category"].values) # Get all unique categories from the entire dataset.
-        model = SGDClassifier(
-            loss="log_loss",  # Uses log loss for multi-class classification.
-            alpha=1e-5, # Regularization term to prevent overfitting.
-            max_iter=5, # Number of iterations for training.
-            tol=1e-3, # Tolerance for stopping criteria.
-            random_state=random_state, # Ensures reproducibility.
-        )
-        _full_refit(df, model, vectorizer, all_classes, batch_size) # Refit the model from scrtatch with all data to register new classes.
-        seen.update(df["row_id"].tolist()) # Update the seen set with all row IDs.
+        model = new_model(random_state)
+        df_train = df[~is_held].reset_index(drop=True) # Everything except the holdout.
+        if shards > 1:
+            model = _sharded_fit(df_train, vectorizer, all_classes, batch_size, random_state, shards, shard_rounds)
+        else:
+            with VectorizePool(vectorizer, workers) as pool: # Worker processes hash upcoming batches while partial_fit runs.
+                _full_refit(df_train, model, vectorizer, all_classes, batch_size, pool=pool) # Refit the model from scrtatch with all data to register new classes.
+        seen.add(ids[~is_held]) # Mark all trained row IDs as seen.
+        rows_trained = len(df_train)
+        print(f"Full refit on {len(df_train)} rows took {time.perf_counter() - start:.1f}s")
+
+    elif hasattr(model, "classes_") and len(unseen) > 0: # Already trained and there are unseen labels.
+        print(f"New categories detected: {unseen}. Adding them to the existing model.") # Notify about new categories.
+        start = time.perf_counter()
+        expand_classes(model, unseen) # Keeps the learned weights, new classes start from zero.
+        recent = df[is_seen].tail(replay_rows) # Most recent trained rows, so the old classes keep seeing examples.
+        df_train = pd.concat([recent, df_new], ignore_index=True).sample(frac=1, random_state=random_state) # Mix new and old rows.
+        with VectorizePool(vectorizer, workers) as pool:
+            _partial_fit_stream(df_train.reset_index(drop=True), model, vectorizer, batch_size, pool=pool)
+        seen.add(ids[is_new]) # Mark the new row IDs as seen.
+        rows_trained = len(df_train)
+        print(f"Registered {len(unseen)} new categories training on {len(df_train)} rows "
+              f"({len(df_new)} new, {len(recent)} recent) in {time.perf_counter() - start:.1f}s")
     
     else:
+        rows_trained = len(df_new)
+        sharded = shards > 1 and not hasattr(model, "classes_") and len(df_new) > 0 # Trained from scratch: replicas on shards, averaged.
         if not hasattr(model, "classes_"): # If the model has no classes (not trained yet).
              all_classes = np.unique(df_new["category"].values) # Get all unique categories from the new data.
              print(f"Registering classes {list(map(str, all_classes))} ") # Notify about training on new data.
-
-             _bootstrap_classes(df, model, vectorizer, all_classes) # Bootstrap the model with the new classes.
+             if not sharded: # sharded_fit registers them itself
+                  _bootstrap_classes(df_new, model, vectorizer, all_classes) # Bootstrap the model with the new classes.
         
         if len(df_new) == 0: # If there are no new rows to train on.
             print("No new rows to train on. Model is up to date.") # Notify that there are no new rows.
+        elif sharded:
+             print(f"Training on {len(df_new)} new rows on {shards} shards.")
+             model = _sharded_fit(df_new, vectorizer, all_classes, batch_size, random_state, shards, shard_rounds)
+             seen.add(ids[is_new])
         else:
              print(f"Training on {len(df_new)} new rows.") # Notify about the number of new rows to train on.
-             _partial_fit_stream(df_new, model, vectorizer, batch_size) # Train the model incrementally on the new data.
-             seen.update(df_new["row_id"].tolist()) # Update the seen set with new row IDs.
+             with VectorizePool(vectorizer, workers) as pool: # Worker processes hash upcoming batches while partial_fit runs.
+                  _partial_fit_stream(df_new, model, vectorizer, batch_size, pool=pool) # Train the model incrementally on the new data.
+             seen.add(ids[is_new]) # Mark the new row IDs as seen.
         
-    acc = _quick_evaluate(df, model, vectorizer, test_size, random_state) # Quick evaluation of the model on a holdout set.
-
-    os.makedirs(outdir, exist_ok=True) # Ensure the output directory exists.
-    joblib.dump(model, latest_model_path) # Save the trained model to disk.
-    ts =  datetime.now().strftime("%Y%m%dT%H%M%SZ") # Get the current timestamp.
-    snapshot = os.path.join(outdir, f"bill_categorizer_incremental_{ts}.joblib") # Save a snapshot of the model with a timestamp.
-    joblib.dump(model, snapshot) # Save the snapshot of the model.  
+    with METRICS.time("pai_train_stage_seconds", stage="evaluate"):
+        report = holdout.evaluate(model) if holdout is not None else None # Scoring only, the features are stored.
+        if report is None:
+            acc = _quick_evaluate(df, model, vectorizer, test_size, random_state) # Quick evaluation of the model on a split.
+        else:
+            acc = report["accuracy"]
 
-    print(f"Saved latest model to: {latest_model_path}")
-    print(f"Snapshot saved to:   {snapshot}")
+    with METRICS.time("pai_train_stage_seconds", stage="save"):
+        save_model(model, outdir, model_name, accuracy=acc, rows_trained=rows_trained, report=report,
+                   artifact_options=artifact_options) # Snapshot + latest + registry.
     print(f"Eval accuracy: {acc:.4f}")
 
     return model, vectorizer, seen
 
+def train_streaming(csv_path: str,
+                    outdir: str,
+                    model_name: str,
+                    seen: SeenStore,
+                    chunk_size: int,
+                    batch_size: int,
+                    random_state: int,
+                    workers: int = 1,
+                    refit_on_new_classes: bool = False,
+                    holdout: Holdout | None = None,
+                    source: SqlSource | None = None,
+                    artifact_options: dict | None = None):
+    """Train from the CSV (or from source, e.g. the database) chunk by chunk so peak memory depends on chunk_size, not on the history:
+    - Each chunk is cleaned like load_data, seen rows are dropped and the rest goes to partial_fit.
+    - If unseen categories appear, grows the model's classes in place (or refits from scratch
+      over the whole stream with refit_on_new_classes).
+    - Rows in the persistent holdout are never trained on; the model is evaluated on it.
+    """
+    start = time.perf_counter()
+    vectorizer = build_vectorizer() # Create a new vectorizer instance (stateless).
+    stale = _check_vectorizer(outdir) # Promoted vectorizer settings: a new model, every row counts as new
+    with METRICS.time("pai_train_stage_seconds", stage="load_model"):
+        model = new_model(random_state) if stale else load_or_new_model(outdir, model_name, random_state) # Loads the latest model or initializes one on the first run.
+
+    if source is not None: # Rows from the database, cleaned like the CSV chunks
+        all_classes = source.categories() # SELECT DISTINCT on the server.
+        chunks = (clean_frame(chunk) for chunk in source.chunks())
+    else:
+        all_classes = scan_categories(csv_path, chunk_size) # Cheap first pass over the category column only.
+        chunks = iter_data_chunks(csv_path, chunk_size)
+    unseen = new_labels(model, all_classes)
+    refit = hasattr(model, "classes_") and len(unseen) > 0 and refit_on_new_classes
+    if refit:
+        print(f"New categories detected: {unseen}. Re-fitting model from scratch to register them.")
+        model = new_model(random_state)
+    elif hasattr(model, "classes_") and len(unseen) > 0:
+        print(f"New categories detected: {unseen}. Adding them to the existing model.")
+        expand_classes(model, unseen) # Keeps the learned weights, only the new rows get trained below.
+    elif not hasattr(model, "classes_"):
+        print(f"Registering classes {list(map(str, all_classes))} ")
+
+    rows_read = rows_trained = 0
+    with VectorizePool(vectorizer, workers) as pool: # One pool for the whole stream.
+        for chunk in _timed(chunks, "load_csv" if source is None else "load_sql"):
+            rows_read += len(chunk)
+            with METRICS.time("pai_train_stage_seconds", stage="row_ids"):
+                ids = row_ids(chunk["text"].values, chunk["category"].values)
+                is_seen = seen.contains(ids) & (not stale)
+            with METRICS.time("pai_train_stage_seconds", stage="holdout"):
+                is_held = (holdout.update(chunk["text"].values, chunk["category"].values, ids, candidates=~is_seen)
+                           if holdout is not None else np.zeros(len(chunk), dtype=bool))
+            is_new = ~is_held if refit else ~is_seen & ~is_held # A refit trains on every row but the holdout.
+            chunk_new = chunk[is_new].reset_index(drop=True)
+            if len(chunk_new) == 0:
+                continue
+            classes = all_classes if not hasattr(model, "classes_") else None # The first partial_fit must know every class.
+            _partial_fit_stream(chunk_new, model, vectorizer, batch_size, classes=classes, pool=pool)
+            seen.add(ids[is_new])
+            rows_trained += len(chunk_new)
+
+    if rows_trained == 0:
+        print("No new rows to train on. Model is up to date.")
+    else:
+        with METRICS.time("pai_train_stage_seconds", stage="evaluate"):
+            report = holdout.evaluate(model) if holdout is not None else None
+        with METRICS.time("pai_train_stage_seconds", stage="save"):
+            save_model(model, outdir, model_name, accuracy=report["accuracy"] if report is not None else None,
+                       rows_trained=rows_trained, report=report, artifact_options=artifact_options) # Snapshot + latest + registry.
+
+    seconds = time.perf_counter() - start
+    rss = peak_rss_mb()
+    print(f"Streamed {rows_read} rows ({rows_trained} trained) in {seconds:.1f}s, "
+          f"{rows_read / max(seconds, 1e-9):,.0f} rows/sec, peak RSS "
+          + (f"{rss:.0f} MB" if rss is not None else "n/a"))
+
+    return model, vectorizer, seen
+
 def _bootstrap_classes(df, model, vectorizer, all_classes):
      """Ensure that the model knows the full label set before streaming updates.
      Attempt to feed at least one example per class to the model; if not possible, pass
@@ -202,37 +525,49 @@ def _bootstrap_classes(df, model, vectorizer, all_classes):
      y_boot = df["category"].values[:1] if len(df) > 0 else np.array(all_classes[0]) # Get the category labels for the first row or a placeholder (labels the model tries to predict).
      model.partial_fit(x_boot, y_boot, classes=all_classes) # Perform a partial fit to register the classes.    
 
-def _partial_fit_stream(df_chunked, model, vectorizer, batch_size):
-     """Stream new data in batches to the model to avoid memory spikes."""
-
-     n = len(df_chunked)
-     for start in range(0, n, batch_size): # Iterate oover the DataFrame in chunks of batch_size.
-          end = min(start + batch_size, n) # Find the end index for the current batch.
-          x_batch = vectorizer.transform(df_chunked["text"].values[start:end]) # Transform the text data into feature vectors for the current batch.)
-          y_batch = df_chunked["category"].values[start:end] # Get the category labels for the current batch.
-          model.partial_fit(x_batch, y_batch) # Perform a partial fit on the current batch of data.
-          
-def _full_refit(df, model, vectorizer, all_classes, batch_size):
+def _text_batches(df, batch_size, start=0):
+     """Slices of the text column, batch_size rows each, beginning at row start."""
+     texts = df["text"].values
+     for begin in range(start, len(df), batch_size):
+          yield texts[begin:begin + batch_size]
+
+def _partial_fit_stream(df_chunked, model, vectorizer, batch_size, classes=None, pool: VectorizePool | None = None):
+     """Stream new data in batches to the model to avoid memory spikes. classes is passed
+     to the first partial_fit call when the model hasn't been trained yet. With a pool, upcoming
+     batches are vectorized in worker processes while partial_fit runs here."""
+
+     labels = df_chunked["category"].values
+     batches = _text_batches(df_chunked, batch_size) # Iterate oover the DataFrame in chunks of batch_size.
+     x_batches = pool.transform_batches(batches) if pool is not None else map(vectorizer.transform, batches) # Feature vectors per batch.
+     for start, x_batch in zip(range(0, len(df_chunked), batch_size), _timed(x_batches, "vectorize")): # With a pool, only the wait is timed.
+          y_batch = labels[start:start + batch_size] # Get the category labels for the current batch.
+          with METRICS.time("pai_train_stage_seconds", stage="partial_fit"):
+               model.partial_fit(x_batch, y_batch, classes=classes if start == 0 else None) # Perform a partial fit on the current batch of data.
+
+def _timed(items, stage: str):
+     """Yield from items, recording the time spent producing each one under stage."""
+     it = iter(items)
+     while True:
+          with METRICS.time("pai_train_stage_seconds", stage=stage):
+               item = next(it, _timed)
+          if item is _timed: # Exhausted
+               return
+          yield item
+
+def _full_refit(df, model, vectorizer, all_classes, batch_size, pool: VectorizePool | None = None):
      """Do a full but batched fit via partial_fit so the model learns new categories."""
-     n = len(df)
-     # FIrst call must have all classes registered.
-     first_end = min(batch_size, n) # Determine the end index for the first batch.
-     x0 = vectorizer.transform(df["text"].values[:first_end]) # Transform the text data into feature vectors for the first batch.
-     y0 = df["category"].values[:first_end] # Get the category labels for the first batch.
-     model.partial_fit(x0, y0, classes=all_classes) # Perform a partial fit on the first batch with all classes registered.
-     # Continue with the rest of the data in batches.
-     for start in range(first_end, n, batch_size): 
-          end = min(start + batch_size, n) 
-          xb = vectorizer.transform(df["text"].values[start:end]) # Transform the text data into feature vectors for the current batch.
-          yb = df["category"].values[start:end] # Get the category labels for the current batch.
-          model.partial_fit(xb, yb) # Perform a partial fit on the current batch of data.
+     # FIrst call must have all classes registered, _partial_fit_stream passes them with the first batch.
+     _partial_fit_stream(df, model, vectorizer, batch_size, classes=all_classes, pool=pool)
+
+def _sharded_fit(df, vectorizer, all_classes, batch_size, random_state, shards, rounds):
+     """New model trained on every row of df by ML/sharded.py, replicas averaged over rounds."""
+     from ML.sharded import sharded_fit # Imported here, it builds on this module
+     return sharded_fit(df["text"].values, df["category"].values, all_classes, vectorizer, shards, rounds=rounds,
+                        batch_size=batch_size, random_state=random_state)
 
 def _quick_evaluate(df, model, vectorizer, test_size, random_state):
      """Quickly perform a sanity-check evaluation on a holdout set (not a full validation)."""
      
-     X_text = df["text"].to_numpy() # Convert the text column to a NumPy array.
-     y = df["category"].to_numpy()
-     
      if len(np.unique(df["category"].values)) < 2 or len(df) < 10: # Checks if enough categories or rows
           print("Not enough data for evaluation. Skipping accuracy check.") 
           return 0.0 # If not enough data, return 0.0 accuracy.
@@ -242,25 +577,120 @@ def _quick_evaluate(df, model, vectorizer, test_size, random_state):
           stratify=df["category"].values
      )
      
-     X_train = vectorizer.transform(x_train) # Transform the training text data into feature vectors.
-     X_test  = vectorizer.transform(x_test)
+     X_test  = vectorizer.transform(x_test) # Only the test split is scored, x_train is never vectorized.
 
      y_pred = model.predict(X_test) # Predict categories for the test set.
      acc = accuracy_score(y_test, y_pred)
      print(f"Quick eval accuracy: {acc:.3f}")
      return acc
 
+def _print_report(report: dict, path):
+     """Short summary of a holdout evaluation, the full report is in the JSON file."""
+     h, lat = report["holdout"], report["latency"]
+     print(f"Holdout accuracy: {report['accuracy']:.3f} on {h['rows']} rows (revision {h['revision']}), "
+           f"{lat['batch_rows_per_sec']:,.0f} rows/sec batched, {lat['single_row_us_p50']:.0f} us/row single")
+     worst = sorted((v["f1-score"], k) for k, v in report["per_class"].items() if isinstance(v, dict) and "support" in v
+                    and k not in ("macro avg", "weighted avg"))[:3]
+     print("Lowest F1: " + ", ".join(f"{k} {f:.3f}" for f, k in worst))
+     print(f"Evaluation saved to: {path}")
+
+def _write_vendor_index(args):
+     """Rebuild the vendor lookup index the API answers frequent single-category vendors from."""
+     with METRICS.time("pai_train_stage_seconds", stage="vendor_index"):
+          index = build_index([args.csv], args.feedback_csv, chunk_size=args.chunk_size,
+                              min_count=args.vendor_min_count, min_share=args.vendor_min_share,
+                              models=model_names(args.outdir, args.model_name)) # Served only with the model saved (or kept) by this run
+          path = os.path.join(args.outdir, args.vendor_index)
+          index.save(path)
+     print(f"Vendor index: {len(index)} of {len(index.counts)} vendors answered without the model -> {path}")
+
+def write_run_summary(args, seconds: float, path: str):
+     """Arguments, time per stage (from METRICS) and peak memory of this run, as JSON."""
+     summary = {
+          "finished_at": datetime.now().isoformat(timespec="seconds"),
+          "args": {**vars(args), "db_url": redact_url(getattr(args, "db_url", None))}, # Never the database password
+          "total_seconds": seconds,
+          "peak_rss_mb": peak_rss_mb(),
+          "stages": {k.split("=", 1)[-1]: v for k, v in METRICS.summary().get("pai_train_stage_seconds", {}).items()},
+     }
+     with open(path, "w", encoding="utf-8") as f:
+          json.dump(summary, f, indent=2)
+     print(f"Run summary saved to: {path}")
+
+def _collect_garbage(args):
+     """Apply the snapshot retention policy to the registry."""
+     removed = Registry(args.outdir).gc(keep_last=args.keep_last, max_age_days=args.max_age_days)
+     if removed:
+          print(f"Removed {len(removed)} old snapshots: {', '.join(removed)}")
+
 def main():
     args = get_args()
+    start = time.perf_counter()
 
-    # Ensure output directory exists (for model + seen_ids.json).
+    # Ensure output directory exists (for model + seen ids).
     os.makedirs(args.outdir, exist_ok=True)
 
+    if args.tune: # Hyperparameter search only, no model is trained or saved
+        from ML.tuning import tune # Imported here, it builds on this module
+        tune(args, load_data(args.csv), build_vectorizer)
+        return
+
+    # Fixed evaluation rows, never trained on, with their features cached on disk.
+    holdout = Holdout(os.path.join(args.outdir, args.holdout), build_vectorizer(),
+                      fraction=args.holdout_fraction, max_rows=args.holdout_max_rows)
+
+    source = None
+    if args.source == "sql":
+        if not args.db_url:
+            raise SystemExit("--source sql needs --db_url (or PAI_DB_URL)")
+        source = SqlSource(args.db_url, view=args.sql_view, chunk_size=args.chunk_size,
+                           watermark_path=os.path.join(args.outdir, WATERMARK_FILE), full=args.sql_full)
+        print(f"Reading {source.describe()} from the database")
+
+    if args.train_mode == "sharded" and (args.stream or source is not None):
+        raise SystemExit("--train_mode sharded splits rows held in memory, it can't be combined with --stream or --source sql")
+
+    if args.stream or source is not None:
+        # Read the CSV (or the database) in chunks, only one chunk is in memory at a time.
+        if source is None:
+            legacy_rows = iter_data_chunks(args.csv, args.chunk_size)
+        else: # Every row of the view, the legacy hashes may cover rows before the watermark; leaves it alone
+            legacy_rows = (clean_frame(chunk) for chunk in
+                           SqlSource(args.db_url, view=args.sql_view, chunk_size=args.chunk_size, full=True).chunks())
+        seen = prepare_seen(args.outdir, args.seen_store, args.seen_file, legacy_rows) # Lazy, only read to migrate
+        model, vectorizer, seen = train_streaming(
+            csv_path=args.csv,
+            outdir=args.outdir,
+            model_name=args.model_name,
+            seen=seen,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            random_state=args.random_state,
+            workers=args.workers,
+            refit_on_new_classes=args.refit_on_new_classes,
+            holdout=holdout,
+            source=source,
+            artifact_options=artifact_options(args)
+        )
+        with METRICS.time("pai_train_stage_seconds", stage="save"):
+            save_seen(seen)
+            holdout.save()
+        if source is not None:
+            source.commit() # Only now, a run that fails before this reads the same labels again
+        elif args.vendor_index:
+            _write_vendor_index(args) # Built from the CSV, the database path has no full copy of the rows
+        _collect_garbage(args)
+        if args.summary_json:
+            write_run_summary(args, time.perf_counter() - start, os.path.join(args.outdir, args.summary_json))
+        print("\nDone.")
+        return
+
     # Load the CSV every run (so we can detect newly added rows).
-    df = load_data(args.csv)
+    with METRICS.time("pai_train_stage_seconds", stage="load_csv"):
+        df = load_data(args.csv)
 
-    # Load or init the seen set (to avoid double-training).
-    seen = prepare_seen(args.outdir, args.seen_file)
+    # Load or init the seen store (to avoid double-training).
+    seen = prepare_seen(args.outdir, args.seen_store, args.seen_file, df)
 
     # Train or update on the CSV content.
     model, vectorizer, seen = train_or_update_model(
@@ -270,11 +700,25 @@ def main():
         seen=seen,
         batch_size=args.batch_size,
         test_size=args.test_size,
-        random_state=args.random_state
+        random_state=args.random_state,
+        workers=args.workers,
+        refit_on_new_classes=args.refit_on_new_classes,
+        replay_rows=args.replay_rows,
+        holdout=holdout,
+        artifact_options=artifact_options(args),
+        shards=args.shards if args.train_mode == "sharded" else 1,
+        shard_rounds=args.shard_rounds
     )
 
-    # Persist the seen IDs after successful update.
-    save_seen(args.outdir, args.seen_file, seen)
+    # Persist the seen IDs and the holdout after successful update.
+    with METRICS.time("pai_train_stage_seconds", stage="save"):
+        save_seen(seen)
+        holdout.save()
+    if args.vendor_index:
+        _write_vendor_index(args)
+    _collect_garbage(args)
+    if args.summary_json:
+        write_run_summary(args, time.perf_counter() - start, os.path.join(args.outdir, args.summary_json))
 
     print("\nDone.")
 
@@ -0,0 +1,152 @@
+# Backend/ML/seen_store.py
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Compact record of the (text, category) rows the model has already been trained on.
+# Every row id is a fixed-width 16 byte digest. They are kept as one sorted numpy array, so a
+# membership test for a whole batch is a single searchsorted, and 10M rows take 160 MB instead
+# of several GB of Python strings. On disk there are two raw files next to the model:
+#   <name>.ids  sorted digests, rewritten only when the log is compacted into it
+#   <name>.log  digests appended by each run (append-only, unsorted)
+
+DIGEST = np.dtype("S16")
+_HASH_KEYS = ("pai-seen-rows-k1", "pai-seen-rows-k2") # Two 16 char keys -> two independent 64 bit hashes per row
+
+
+def row_ids(texts, categories) -> np.ndarray:
+    """Vectorized stable row ids for (text, category) pairs, one 16 byte digest per row.
+    Same inputs always give the same ids, across runs and machines."""
+    keyed = (pd.Series(texts, dtype=object).astype(str) + "||"
+             + pd.Series(categories, dtype=object).astype(str)).to_numpy(dtype=object) # Same text the old sha256 row_id hashed
+    h1 = pd.util.hash_array(keyed, hash_key=_HASH_KEYS[0], categorize=False) # Rows are mostly distinct, skip factorizing
+    h2 = pd.util.hash_array(keyed, hash_key=_HASH_KEYS[1], categorize=False)
+    # Big-endian so byte order equals numeric order, then view each pair of uint64 as one 16 byte value
+    return np.stack([h1, h2], axis=1).astype(">u8").view(DIGEST).ravel()
+
+
+def _sorted_unique(ids: np.ndarray) -> np.ndarray:
+    """Sort and drop duplicates (much faster than np.unique for fixed-width bytes)."""
+    ids = np.sort(ids, kind="stable")
+    if len(ids) > 1:
+        ids = ids[np.concatenate([[True], ids[1:] != ids[:-1]])]
+    return ids
+
+
+def _merge(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Merge two sorted arrays with no common ids. The stable sort is a timsort, which
+    detects the two sorted runs and merges them in linear time."""
+    if len(a) == 0:
+        return b
+    if len(b) == 0:
+        return a
+    return np.sort(np.concatenate([a, b]), kind="stable")
+
+
+class SeenStore:
+    def __init__(self, path: str | os.PathLike | None = None):
+        """Open the store at path (without extension), or an in-memory store when path is None."""
+        self.path = Path(path) if path is not None else None
+        self._ids = np.empty(0, dtype=DIGEST) # Sorted, unique
+        self._pending = np.empty(0, dtype=DIGEST) # Added since the last save
+        self._log_rows = 0 # Digests currently in the .log file
+        if self.path is not None:
+            self._load()
+
+    @property
+    def ids_path(self) -> Path:
+        return self.path.parent / (self.path.name + ".ids")
+
+    @property
+    def log_path(self) -> Path:
+        return self.path.parent / (self.path.name + ".log")
+
+    def exists(self) -> bool:
+        return self.path is not None and (self.ids_path.exists() or self.log_path.exists())
+
+    def _read(self, p: Path) -> np.ndarray:
+        if not p.exists():
+            return np.empty(0, dtype=DIGEST)
+        return np.fromfile(p, dtype=DIGEST)
+
+    def _load(self):
+        base = self._read(self.ids_path)
+        log = self._read(self.log_path)
+        self._log_rows = len(log)
+        self._ids = _sorted_unique(np.concatenate([base, log])) if len(log) else base
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._pending)
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        """Boolean mask, True where the id has been seen (saved or added since)."""
+        ids = np.asarray(ids, dtype=DIGEST)
+        mask = self._member(self._ids, ids)
+        if len(self._pending):
+            mask |= self._member(self._pending, ids)
+        return mask
+
+    @staticmethod
+    def _member(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        if len(sorted_ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        pos = np.searchsorted(sorted_ids, ids)
+        pos[pos == len(sorted_ids)] = 0 # Past the end can't match, compare against anything
+        return sorted_ids[pos] == ids
+
+    def add(self, ids: np.ndarray):
+        """Mark ids as seen. They are written to disk on the next save()."""
+        ids = _sorted_unique(np.asarray(ids, dtype=DIGEST))
+        new = ids[~self.contains(ids)]
+        if len(new):
+            self._pending = _merge(self._pending, new)
+
+    def save(self, compact_ratio: float = 0.25):
+        """Append the ids added since the last save to the log. When the log grows past
+        compact_ratio of the sorted file, merge it in and start a fresh log."""
+        if self.path is None:
+            self._ids = _merge(self._ids, self._pending)
+            self._pending = np.empty(0, dtype=DIGEST)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if len(self._pending):
+            with open(self.log_path, "ab") as f: # Append-only, existing bytes are never rewritten here
+                f.write(self._pending.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_rows += len(self._pending)
+            self._ids = _merge(self._ids, self._pending)
+            self._pending = np.empty(0, dtype=DIGEST)
+        if self._log_rows and self._log_rows > compact_ratio * max(len(self._ids) - self._log_rows, 1):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the sorted file with every id and empty the log."""
+        tmp = self.path.parent / (self.path.name + ".ids.tmp")
+        self._ids.tofile(tmp)
+        os.replace(tmp, self.ids_path) # Atomic, a crash leaves either the old or the new file
+        if self.log_path.exists():
+            os.remove(self.log_path) # Everything in it is now in the sorted file
+        self._log_rows = 0
+
+    def migrate_json(self, json_path: str | os.PathLike, frames) -> int:
+        """One-time import of a legacy seen_hashes.json (hex sha256 of "text||category").
+        The old hashes can't be turned into new ids directly, so the rows they cover are
+        recognised by hashing the training rows the old way. frames is an iterable of data
+        frames with text and category columns (one frame or CSV chunks). Returns rows migrated."""
+        with open(json_path, "r", encoding="utf-8") as f:
+            legacy = set(json.load(f))
+        if not legacy:
+            return 0
+        migrated = 0
+        for df in frames:
+            texts, categories = df["text"].values, df["category"].values
+            keyed = [f"{t}||{c}" for t, c in zip(texts, categories)]
+            known = np.fromiter((hashlib.sha256(k.encode("utf-8")).hexdigest() in legacy for k in keyed),
+                                dtype=bool, count=len(keyed))
+            self.add(row_ids(texts, categories)[known])
+            migrated += int(known.sum())
+        return migrated
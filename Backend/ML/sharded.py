@@ -0,0 +1,120 @@
+# Backend/ML/sharded.py
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ML.retrain_ml_model import new_model
+
+# Data-parallel training for retrain_ml_model.py --train_mode sharded, used when a model is trained
+# from scratch (first run, new vectorizer settings, --refit_on_new_classes). The rows are shuffled
+# and split into one shard per worker process; each shard is split again into `rounds` parts. In
+# round r every worker hashes part r of its shard and trains a replica on it with partial_fit,
+# starting from the averaged weights of round r - 1, then the replicas' coef_/intercept_ are
+# averaged (weighted by rows). rounds=1 is one-shot averaging; more rounds keep the replicas closer
+# together for a little more synchronization. Every row is still trained on once, like the
+# sequential path. Weights move between processes through memory-mapped .npy files in a scratch
+# directory, never through pickles (a 1M-feature model is ~160 MB per copy).
+# bench/bench_sharded.py reports accuracy and speedup against sequential training.
+
+_worker: Dict[str, Any] = {} # Set once per worker process by _init_worker
+
+
+def _init_worker(work_dir: str, vectorizer, classes: np.ndarray, params: Dict[str, Any], random_state: int, batch_size: int):
+    _worker.update(work_dir=Path(work_dir), vectorizer=vectorizer, classes=classes, params=params,
+                   random_state=random_state, batch_size=batch_size)
+
+
+def _with_weights(model, coef: np.ndarray, intercept: np.ndarray, t: float):
+    """Load averaged weights into a model that has seen one partial_fit call (so it has every
+    fitted attribute and the full class list). t_ drives the learning rate schedule."""
+    model.coef_ = np.array(coef, dtype=np.float64, order="C")
+    model.intercept_ = np.array(intercept, dtype=np.float64)
+    model.t_ = t
+    return model
+
+
+def _train_part(shard: int, round_: int, texts: np.ndarray, labels: np.ndarray, t: float) -> Dict[str, Any]:
+    """Train this round's replica of shard on its rows, from the averaged weights of the previous
+    round (none in round 0). Writes the weights to replica_<shard>.npy, returns rows and t_."""
+    w = _worker
+    model = new_model(w["random_state"] + shard, w["params"]) # Its own seed per replica
+    batch = w["batch_size"]
+    start = time.perf_counter()
+    for begin in range(0, len(texts), batch):
+        X = w["vectorizer"].transform(texts[begin:begin + batch])
+        y = labels[begin:begin + batch]
+        if begin == 0:
+            model.partial_fit(X[:1], y[:1], classes=w["classes"]) # Allocates the fitted state, overwritten next
+            if round_ > 0:
+                weights = np.load(w["work_dir"] / "global.npy", mmap_mode="r")
+                _with_weights(model, weights[:, :-1], weights[:, -1], t)
+            else:
+                _with_weights(model, np.zeros_like(model.coef_), np.zeros_like(model.intercept_), 1.0)
+        model.partial_fit(X, y)
+    out = np.lib.format.open_memmap(w["work_dir"] / f"replica_{shard}.npy", mode="w+", dtype=np.float64,
+                                    shape=(model.coef_.shape[0], model.coef_.shape[1] + 1))
+    out[:, :-1] = model.coef_
+    out[:, -1] = model.intercept_
+    out.flush()
+    return {"shard": shard, "rows": len(texts), "t": model.t_, "seconds": time.perf_counter() - start}
+
+
+def _average(work_dir: Path, parts: List[Dict[str, Any]]) -> float:
+    """Row-weighted mean of the replicas into global.npy, returns the averaged t_."""
+    parts = [p for p in parts if p["rows"] > 0]
+    total = sum(p["rows"] for p in parts)
+    acc = None
+    for p in parts:
+        replica = np.load(work_dir / f"replica_{p['shard']}.npy", mmap_mode="r")
+        if acc is None:
+            acc = np.zeros(replica.shape, dtype=np.float64)
+        acc += replica * (p["rows"] / total)
+    tmp = work_dir / "global.tmp.npy"
+    np.save(tmp, acc)
+    os.replace(tmp, work_dir / "global.npy") # Workers of the next round only ever see a complete file
+    return float(sum(p["t"] * p["rows"] for p in parts) / total)
+
+
+def sharded_fit(texts: np.ndarray, labels: np.ndarray, classes: np.ndarray, vectorizer, shards: int,
+                rounds: int = 1, batch_size: int = 2048, random_state: int = 42,
+                params: Dict[str, Any] | None = None, workers: int | None = None, verbose: bool = True):
+    """Train a new SGDClassifier on all rows with `shards` replicas in worker processes and
+    parameter averaging over `rounds` synchronized rounds. workers caps the replicas trained at the
+    same time (default one per CPU, each holds a dense copy of the weights). Returns the averaged
+    model, a regular fitted SGDClassifier the normal save path can write."""
+    if len(texts) == 0:
+        raise ValueError("No rows to train on")
+    shards = max(1, min(shards, len(texts)))
+    rounds = max(1, min(rounds, len(texts) // shards or 1))
+    order = np.random.default_rng(random_state).permutation(len(texts)) # Every replica sees a mix of the whole corpus
+    parts = [np.array_split(shard, rounds) for shard in np.array_split(order, shards)]
+
+    start = time.perf_counter()
+    work_dir = Path(tempfile.mkdtemp(prefix="pai_sharded_"))
+    try:
+        t = 1.0
+        with ProcessPoolExecutor(max_workers=workers or min(shards, os.cpu_count() or 1), initializer=_init_worker,
+                                 initargs=(str(work_dir), vectorizer, classes, params, random_state, batch_size)) as pool:
+            for r in range(rounds):
+                round_start = time.perf_counter()
+                futures = [pool.submit(_train_part, k, r, texts[parts[k][r]], labels[parts[k][r]], t) for k in range(shards)]
+                done = [f.result() for f in futures]
+                t = _average(work_dir, done)
+                if verbose:
+                    print(f"  round {r + 1}/{rounds}: {sum(d['rows'] for d in done)} rows on {shards} shards "
+                          f"in {time.perf_counter() - round_start:.1f}s (slowest shard {max(d['seconds'] for d in done):.1f}s)")
+        weights = np.load(work_dir / "global.npy")
+        model = new_model(random_state, params)
+        model.partial_fit(vectorizer.transform(texts[:1]), labels[:1], classes=classes) # Fitted attributes, then the averaged weights
+        _with_weights(model, weights[:, :-1], weights[:, -1], t)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if verbose:
+        print(f"Sharded training on {len(texts)} rows ({shards} shards, {rounds} rounds) took {time.perf_counter() - start:.1f}s")
+    return model
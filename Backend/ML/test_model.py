@@ -4,20 +4,23 @@ import sys
 import joblib
 
 # ---- Locate project root (Backend) and models dir ----
-# This file is likely at Backend/app/ML/test_model.py → parents[2] = Backend
-ROOT = Path(__file__).resolve().parents[2]
+# This file is at Backend/ML/test_model.py → parents[1] = Backend
+ROOT = Path(__file__).resolve().parents[1]
 MODELS_DIR = ROOT / "ML" / "saved_models"
+sys.path.insert(0, str(ROOT))
+from ML.registry import Registry
 
 print(f"Looking for models in: {MODELS_DIR}")
 
-# ---- Pick latest .joblib safely ----
-models = sorted(MODELS_DIR.glob("*.joblib"))
-if not models:
-    print(f"ERROR: No .joblib models found in {MODELS_DIR}")
-    print("Tip: run your retrain script so it saves into ML/saved_models.")
-    sys.exit(1)
-
-latest_model = models[-1]
+# ---- Pick the active model from the registry, or the newest .joblib like the API does ----
+latest_model = Registry(MODELS_DIR).active_path(prefer_artifact=False)
+if latest_model is None:
+    models = sorted(MODELS_DIR.glob("*.joblib"), key=lambda p: p.stat().st_mtime)
+    if not models:
+        print(f"ERROR: No .joblib models found in {MODELS_DIR}")
+        print("Tip: run your retrain script so it saves into ML/saved_models.")
+        sys.exit(1)
+    latest_model = models[-1]
 print(f"Loading model: {latest_model}")
 
 # ---- Load model with friendly error ----
@@ -32,5 +35,9 @@ sample_vendor = "Hydro One"
 sample_desc = "Monthly electricity bill for office"
 text = f"{sample_vendor} {sample_desc}".lower().strip()
 
-pred = model.predict([text])[0]
+if hasattr(model, "steps"): # Pipeline with its own vectorizer takes raw text
+    pred = model.predict([text])[0]
+else: # Bare classifier, hash the text the way training does
+    from ML.retrain_ml_model import build_vectorizer
+    pred = model.predict(build_vectorizer().transform([text]))[0]
 print("Predicted category:", pred)
@@ -0,0 +1,236 @@
+# Backend/ML/tuning.py
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, f1_score
+
+from app.artifact import vectorizer_config
+from app.scoring import LinearScorer
+from ML.holdout import Holdout, holdout_bucket
+from ML.model_config import CONFIG_PATH, load_model_config, save_model_config
+from ML.parallel_vectorize import VectorizePool
+from ML.seen_store import row_ids
+
+# Hyperparameter search for retrain_ml_model.py --tune. The CSV is hashed once per vectorizer
+# config and cached under <outdir>/tune_cache/<key>/ as the raw CSR arrays (.npy), keyed by the
+# vectorizer config and the rows, so the next search with the same data only reads them back.
+# Every classifier candidate is then trained in a worker process (all cores by default) the way the
+# trainer trains, partial_fit over batch_size rows in CSV order, and scored on the persistent
+# holdout rows (the holdout hash bucket while there is no holdout yet). The workers memory-map the
+# cached arrays, so one copy of each matrix sits in the page cache however many workers read it.
+# The ranked report goes to <outdir>/tuning_report.json, --promote makes the winner the default
+# (ML/model_config.json).
+
+REPORT_FILE = "tuning_report.json"
+# Searched when no --tune_grid file is given. partial_fit runs one epoch per call, so max_iter and
+# tol don't change what the trainer learns and aren't searched.
+DEFAULT_GRID = {
+    "vectorizer": {"n_features": [2**18, 2**20], "ngram_range": [[1, 1], [1, 2]]},
+    "classifier": {"loss": ["log_loss", "modified_huber"], "alpha": [1e-6, 1e-5, 1e-4]},
+}
+
+_worker_cache_dir: Path | None = None # Set once per worker process by _init_worker
+_worker_data: Dict[str, tuple] = {} # Cache key -> memory-mapped (X_train, y_train, X_test, y_test)
+
+
+def expand_grid(grid: Dict[str, Dict[str, List[Any]]], base: Dict[str, Dict[str, Any]]) -> List[Dict[str, Dict[str, Any]]]:
+    """Every combination of the grid values, each on top of the base (current) settings."""
+    sections = []
+    for section in ("vectorizer", "classifier"):
+        keys = list((grid.get(section) or {}).keys())
+        sections.append([{**base[section], **dict(zip(keys, values))}
+                         for values in itertools.product(*(grid[section][k] for k in keys))] if keys else [dict(base[section])])
+    return [{"vectorizer": v, "classifier": c} for v, c in itertools.product(*sections)]
+
+
+def _cache_key(vectorizer, fingerprint: str) -> str:
+    config = json.dumps(vectorizer_config(vectorizer), sort_keys=True)
+    return hashlib.sha1(f"{config}|{fingerprint}".encode("utf-8")).hexdigest()[:16]
+
+
+def _save_csr(folder: Path, name: str, X: sp.csr_matrix):
+    for part in ("data", "indices", "indptr"):
+        np.save(folder / f"{name}.{part}.npy", getattr(X, part))
+
+
+def _load_csr(folder: Path, name: str, shape) -> sp.csr_matrix:
+    parts = [np.load(folder / f"{name}.{part}.npy", mmap_mode="r") for part in ("data", "indices", "indptr")]
+    return sp.csr_matrix(tuple(parts), shape=tuple(shape), copy=False)
+
+
+def build_cache(cache_dir: Path, vectorizer, texts: np.ndarray, labels: np.ndarray, is_test: np.ndarray,
+                fingerprint: str, workers: int = 1, batch_size: int = 50_000) -> str:
+    """Hash the rows with vectorizer into the cache unless they already are there. Returns the cache key."""
+    key = _cache_key(vectorizer, fingerprint)
+    folder = cache_dir / key
+    if (folder / "meta.json").exists():
+        print(f"  {key}: cached")
+        return key
+    folder.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    shapes = {}
+    with VectorizePool(vectorizer, workers) as pool:
+        for name, mask in (("train", ~is_test), ("test", is_test)):
+            rows = texts[mask]
+            X = sp.vstack(list(pool.transform_batches(rows[i:i + batch_size] for i in range(0, len(rows), batch_size)))
+                          or [sp.csr_matrix((0, vectorizer.n_features))], format="csr")
+            _save_csr(folder, f"X_{name}", X)
+            np.save(folder / f"y_{name}.npy", np.asarray(labels[mask], dtype=str))
+            shapes[name] = list(X.shape)
+    with open(folder / "meta.json", "w", encoding="utf-8") as f: # Written last, marks the entry complete
+        json.dump({"vectorizer": vectorizer_config(vectorizer), "fingerprint": fingerprint, "shapes": shapes}, f, indent=2)
+    print(f"  {key}: hashed {len(texts)} rows in {time.perf_counter() - start:.1f}s")
+    return key
+
+
+def _init_worker(cache_dir: Path):
+    global _worker_cache_dir
+    _worker_cache_dir = cache_dir
+
+
+def _open(key: str):
+    """The cached matrices of key, memory-mapped on first use in this worker."""
+    if key not in _worker_data:
+        folder = _worker_cache_dir / key
+        with open(folder / "meta.json", "r", encoding="utf-8") as f:
+            shapes = json.load(f)["shapes"]
+        _worker_data[key] = (_load_csr(folder, "X_train", shapes["train"]), np.load(folder / "y_train.npy"),
+                             _load_csr(folder, "X_test", shapes["test"]), np.load(folder / "y_test.npy"))
+    return _worker_data[key]
+
+
+def evaluate_candidate(key: str, params: Dict[str, Any], classes: np.ndarray, batch_size: int, random_state: int) -> Dict[str, Any]:
+    """Train one classifier on the cached training rows of key like the trainer does, then score
+    it on the cached holdout rows: accuracy, macro F1, training time and compact artifact size."""
+    X, y, X_test, y_test = _open(key)
+    model = SGDClassifier(**params, random_state=random_state)
+    start = time.perf_counter()
+    for begin in range(0, X.shape[0], batch_size):
+        model.partial_fit(X[begin:begin + batch_size], y[begin:begin + batch_size], classes=classes if begin == 0 else None)
+    train_seconds = time.perf_counter() - start
+
+    scorer = LinearScorer.from_model(model)
+    start = time.perf_counter()
+    y_pred = scorer.predict(scorer.decision_function(X_test))
+    score_seconds = time.perf_counter() - start
+    active = int((np.abs(model.coef_).max(axis=0) > 0).sum())
+    n_classes = model.coef_.shape[0]
+    return {
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "macro_f1": float(f1_score(y_test, y_pred, average="macro", zero_division=0)),
+        "train_seconds": train_seconds,
+        "score_us_per_row": score_seconds / max(X_test.shape[0], 1) * 1e6,
+        "active_features": active,
+        "artifact_mb": (active * (4 * n_classes + 4) + 12 * n_classes) / 2**20, # Compact float32 layout, the trainer's default
+    }
+
+
+def _fingerprint(ids: np.ndarray, is_test: np.ndarray) -> str:
+    """Identifies the rows and the split, a cache entry is only reused for the same data."""
+    digest = hashlib.sha1(np.ascontiguousarray(ids).tobytes())
+    digest.update(np.packbits(is_test).tobytes())
+    return digest.hexdigest()
+
+
+def _describe(settings: Dict[str, Any]) -> str:
+    return " ".join(f"{k}={v}" for k, v in settings.items())
+
+
+def tune(args, df, build_vectorizer) -> Dict[str, Any]:
+    """Run the search over df (the cleaned training CSV) and write the report. With args.promote
+    the best candidate becomes the default config. Returns the report."""
+    start = time.perf_counter()
+    grid = DEFAULT_GRID
+    if args.tune_grid:
+        with open(args.tune_grid, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+    current = load_model_config()
+    candidates = expand_grid(grid, current)
+    texts, labels = df["text"].values, df["category"].values
+
+    ids = row_ids(texts, labels)
+    holdout = Holdout(os.path.join(args.outdir, args.holdout), build_vectorizer(), fraction=args.holdout_fraction,
+                      max_rows=args.holdout_max_rows)
+    is_test = holdout.contains(ids)
+    source = f"persistent holdout (revision {holdout.revision})"
+    if is_test.sum() < 10:
+        is_test = holdout_bucket(ids, args.holdout_fraction if args.holdout_fraction > 0 else 0.1)
+        source = "holdout hash bucket (no persistent holdout yet)"
+    if is_test.sum() < 10 or is_test.all():
+        raise ValueError(f"Not enough rows to tune on ({len(df)} rows, {int(is_test.sum())} for evaluation)")
+    classes = np.unique(np.asarray(labels, dtype=str))
+    fingerprint = _fingerprint(ids, is_test)
+    print(f"Tuning {len(candidates)} candidates on {int((~is_test).sum())} training rows, "
+          f"evaluated on {int(is_test.sum())} rows of the {source}")
+
+    cache_dir = Path(args.outdir) / args.tune_cache
+    keys = {} # Vectorizer settings (as JSON) -> cache key, each config is hashed once
+    for candidate in candidates:
+        settings = json.dumps(candidate["vectorizer"], sort_keys=True)
+        if settings not in keys:
+            keys[settings] = build_cache(cache_dir, build_vectorizer(candidate["vectorizer"]), texts, labels, is_test,
+                                         fingerprint, workers=args.workers)
+    tasks = [(keys[json.dumps(c["vectorizer"], sort_keys=True)], c["classifier"]) for c in candidates]
+
+    jobs = args.tune_jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        futures = [pool.submit(evaluate_candidate, key, params, classes, args.batch_size, args.random_state)
+                   for key, params in tasks]
+        results = [{**candidate, **future.result()} for candidate, future in zip(candidates, futures)]
+
+    # Best accuracy first; among candidates within tolerance of the best one the smaller artifact,
+    # then the faster training, wins
+    best_accuracy = max(r["accuracy"] for r in results)
+    results.sort(key=lambda r: (-min(r["accuracy"] + args.tune_tolerance, best_accuracy), r["artifact_mb"], r["train_seconds"]))
+    for rank, r in enumerate(results, 1):
+        r["rank"] = rank
+        r["current"] = r["vectorizer"] == current["vectorizer"] and r["classifier"] == current["classifier"]
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "csv": args.csv,
+        "train_rows": int((~is_test).sum()),
+        "eval_rows": int(is_test.sum()),
+        "eval_source": source,
+        "seconds": time.perf_counter() - start,
+        "jobs": jobs,
+        "grid": grid,
+        "candidates": results,
+    }
+    report_path = Path(args.outdir) / REPORT_FILE
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    _print_ranking(results)
+    print(f"Tuned in {report['seconds']:.1f}s with {jobs} workers, report saved to {report_path}")
+
+    best = results[0]
+    if args.promote:
+        if best["current"]:
+            print("The current config is already the best one, nothing promoted.")
+        else:
+            path = save_model_config(best["vectorizer"], best["classifier"], accuracy=best["accuracy"],
+                                     report=str(report_path))
+            print(f"Promoted rank 1 to {path}.")
+            if best["vectorizer"] != current["vectorizer"]:
+                print("The vectorizer settings changed: the next training run trains a new model on every row.")
+    elif not best["current"]:
+        print(f"Run again with --promote to make rank 1 the default (written to {CONFIG_PATH}).")
+    return report
+
+
+def _print_ranking(results: List[Dict[str, Any]], limit: int = 20):
+    print(f"{'rank':>4}  {'accuracy':>8} {'macro F1':>8} {'train s':>8} {'MB':>7}  settings")
+    for r in results[:limit]:
+        mark = " *" if r["current"] else ""
+        print(f"{r['rank']:>4}  {r['accuracy']:>8.4f} {r['macro_f1']:>8.4f} {r['train_seconds']:>8.2f} {r['artifact_mb']:>7.1f}  "
+              f"{_describe(r['vectorizer'])} | {_describe(r['classifier'])}{mark}")
+    if len(results) > limit:
+        print(f"... {len(results) - limit} more in the report")
@@ -0,0 +1,184 @@
+# Backend/ML/vendor_index.py
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Container, Dict, Iterable, List, Tuple
+
+if __package__ in (None, ""): # Run as a script (python ML/vendor_index.py), make Backend/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.features import column_renames
+from ML.registry import Registry
+
+if TYPE_CHECKING:
+    import pandas as pd # Only the trainer builds indexes, the API just loads them and shouldn't import pandas
+
+# Vendor -> category lookup built at training time. Much of the traffic comes from vendors whose
+# category never varies ("Toronto Hydro", "Starbucks", "Rogers #412"), so the store can answer
+# those from a dict instead of hashing bigrams and scoring a 1M-feature model. The index keeps the
+# category counts of every normalized vendor name (lower case, store numbers like "#858" removed,
+# whitespace collapsed) over the training CSV and the feedback not merged into it yet (rows
+# api/merge_feedback_once.py appended are counted once, from the CSV); only vendors seen at least
+# min_count times with one category holding min_share of their rows are answered from it.
+# An index belongs to the model it was trained with: it lists that model's file names (registry
+# version id and the latest name) and the store only uses it while one of them is served, so a
+# registry rollback or a newer model doesn't get answers counted for another one. An answer lists
+# only the categories the vendor was seen with, so it can hold fewer than top_k pairs.
+
+INDEX_FILE = "vendor_index.json" # In the models directory, written next to the model by the trainer
+_STORE_NUMBER = re.compile(r"#\s*\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_vendor(vendor: str) -> str:
+    """Vendor key: lower case, store numbers removed, single spaces ("Rogers  #412 " -> "rogers")."""
+    return _SPACES.sub(" ", _STORE_NUMBER.sub(" ", (vendor or "").lower())).strip()
+
+
+def normalize_vendors(vendors: "pd.Series") -> "pd.Series":
+    """normalize_vendor over a whole column."""
+    return (vendors.fillna("").astype(str).str.lower()
+            .str.replace(_STORE_NUMBER, " ", regex=True)
+            .str.replace(_SPACES, " ", regex=True).str.strip())
+
+
+class VendorIndex:
+    def __init__(self, counts: Dict[str, Dict[str, int]] | None = None, min_count: int = 20, min_share: float = 0.99,
+                 models: List[str] | None = None, built_at: float = 0.0):
+        self.counts = counts or {} # Normalized vendor -> {category: rows}
+        self.min_count = min_count # Rows a vendor needs before it is trusted
+        self.min_share = min_share # Share of those rows its top category must hold
+        self.models = models # Stems of the model files it goes with, None for indexes older than this field
+        self.built_at = built_at # time.time() when the counting started, later feedback isn't in it
+        self._table: Dict[str, Tuple[str, List[Tuple[str, float]]]] = {}
+        self.compile()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def add(self, vendors: "pd.Series", categories: "pd.Series", known: Dict[str, str] | None = None):
+        """Count (vendor, category) pairs of one chunk. known maps lower-cased labels to their
+        training spelling, feedback labels are free text."""
+        cats = categories.fillna("").astype(str).str.strip()
+        if known:
+            cats = cats.map(lambda c: known.get(c.lower(), c))
+        import pandas as pd
+        frame = pd.DataFrame({"vendor": normalize_vendors(vendors), "category": cats})
+        frame = frame[(frame["vendor"].str.len() > 0) & (frame["category"].str.len() > 0)]
+        for (vendor, category), n in frame.groupby(["vendor", "category"], sort=False).size().items():
+            per_vendor = self.counts.setdefault(vendor, {})
+            per_vendor[category] = per_vendor.get(category, 0) + int(n)
+
+    def compile(self):
+        """Rebuild the lookup table of confident vendors from the counts."""
+        table = {}
+        for vendor, cats in self.counts.items():
+            total = sum(cats.values())
+            if total < self.min_count:
+                continue
+            ranked = sorted(cats.items(), key=lambda kv: (-kv[1], kv[0]))
+            if ranked[0][1] / total >= self.min_share:
+                table[vendor] = (ranked[0][0], [(c, n / total) for c, n in ranked])
+        self._table = table
+
+    def serves(self, model_path: Path | None) -> bool:
+        """Whether this index was built for the model file at model_path."""
+        return self.models is not None and model_path is not None and model_path.stem in self.models
+
+    def lookup(self, vendor: str, top_k: int = 3, exclude: Container[str] = ()) -> Tuple[str, List[Tuple[str, float]]] | None:
+        """(category, up to top_k (category, share) pairs) for a confident vendor, None otherwise and
+        for the normalized vendors in exclude."""
+        key = normalize_vendor(vendor)
+        hit = self._table.get(key)
+        if hit is None or key in exclude:
+            return None
+        return hit[0], hit[1][:top_k]
+
+    def save(self, path: str | os.PathLike):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"format": 1, "min_count": self.min_count, "min_share": self.min_share, "models": self.models,
+                       "built_at": self.built_at, "confident": len(self._table), "counts": self.counts}, f)
+        os.replace(tmp, path) # The API reloads it when it changes, never half written
+
+    @classmethod
+    def load(cls, path: str | os.PathLike, min_count: int | None = None, min_share: float | None = None) -> "VendorIndex":
+        """Read an index, thresholds default to the ones it was built with."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["counts"], min_count=data["min_count"] if min_count is None else min_count,
+                   min_share=data["min_share"] if min_share is None else min_share,
+                   models=data.get("models"), built_at=data.get("built_at", 0.0))
+
+
+def _read_columns(path: str | os.PathLike, chunk_size: int) -> Iterable["pd.DataFrame"]:
+    """vendor and category columns of a CSV in chunks (headers normalized like the trainer does)."""
+    import pandas as pd
+    header = pd.read_csv(path, encoding="utf-8-sig", nrows=0).columns
+    names = column_renames(header) # Lower case, synonyms like supplier/label resolved
+    cols = [c for c, n in names.items() if n in ("vendor", "category")]
+    if len(cols) < 2:
+        return
+    for chunk in pd.read_csv(path, encoding="utf-8-sig", usecols=cols, dtype=str, keep_default_na=False, chunksize=chunk_size):
+        yield chunk.rename(columns=names)
+
+
+def model_names(models_dir: str | os.PathLike, model_name: str = "bill_category_model.joblib") -> List[str]:
+    """Stems of the files serving the model in models_dir now: the registry's active version and the latest name."""
+    entry = Registry(models_dir).active()
+    return ([entry["id"]] if entry is not None else []) + [Path(model_name).stem]
+
+
+def _unmerged_feedback(feedback_csv: str | os.PathLike, csv_paths: Iterable[str | os.PathLike]) -> "pd.DataFrame":
+    """Feedback rows past the watermark of api/merge_feedback_once.py (its default state file next to
+    each training CSV), the ones before it are already in a training CSV."""
+    from api.merge_feedback_once import load_state, read_new_feedback # Same parsing as the merge
+    offset = max((load_state(Path(p).with_name(Path(p).name + ".merge_state.json"))["offset"] for p in csv_paths), default=0)
+    if Path(feedback_csv).stat().st_size < offset: # Feedback file was replaced, none of it is merged
+        offset = 0
+    return read_new_feedback(Path(feedback_csv), offset)[0]
+
+
+def build_index(csv_paths: Iterable[str | os.PathLike], feedback_csv: str | os.PathLike | None = None,
+                chunk_size: int = 200_000, min_count: int = 20, min_share: float = 0.99,
+                models: List[str] | None = None) -> VendorIndex:
+    """Count vendor categories over the training CSVs, then the feedback. Labels are matched
+    case-insensitively to their first spelling, feedback (also once merged into a CSV) is free text.
+    models are the file stems of the model it goes with (model_names()), an index without them is never served."""
+    csv_paths = list(csv_paths) # Read twice, for the rows and for the merge watermarks
+    index = VendorIndex(min_count=min_count, min_share=min_share, models=models, built_at=time.time())
+    known: Dict[str, str] = {} # Lower-cased label -> first spelling seen
+    for path in csv_paths:
+        for chunk in _read_columns(path, chunk_size):
+            for c in chunk["category"].str.strip().unique():
+                known.setdefault(c.lower(), c)
+            index.add(chunk["vendor"], chunk["category"], known=known)
+    if feedback_csv and Path(feedback_csv).exists():
+        feedback = _unmerged_feedback(feedback_csv, csv_paths)
+        index.add(feedback["vendor"], feedback["category"], known=known)
+    index.compile()
+    return index
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build the vendor lookup index from training data and feedback")
+    p.add_argument("csv", nargs="+", help="Training CSV files")
+    p.add_argument("--feedback", default=None, help="Feedback CSV written by the API")
+    p.add_argument("--out", required=True, help="Index file, e.g. ML/saved_models/vendor_index.json")
+    p.add_argument("--model_name", default="bill_category_model.joblib",
+                   help="Latest model name in the index's directory, the index is tied to it and the registry's active version")
+    p.add_argument("--min_count", type=int, default=20)
+    p.add_argument("--min_share", type=float, default=0.99)
+    args = p.parse_args()
+    index = build_index(args.csv, args.feedback, min_count=args.min_count, min_share=args.min_share,
+                        models=model_names(Path(args.out).parent, args.model_name))
+    index.save(args.out)
+    print(f"{len(index)} of {len(index.counts)} vendors answered from the index -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
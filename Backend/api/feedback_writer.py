@@ -0,0 +1,130 @@
+# Backend/api/feedback_writer.py
+import csv
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+# Feedback rows are queued by the request handlers and written by one background thread in batches,
+# so a /feedback call never opens the CSV file itself. Until start() (or after close()), e.g. in an
+# app run without its lifespan, rows are written right away instead, never left in memory.
+
+FEEDBACK_HEADER = ["date", "amount", "vendor", "description", "category", "source", "created_at_utc"]
+
+_STOP = object() # Queue sentinel telling the writer thread to flush and exit
+
+
+class FeedbackWriter:
+    def __init__(self, path: Path, flush_interval: float = 1.0, flush_size: int = 100):
+        self.path = Path(path)
+        self.flush_interval = flush_interval # Longest time (seconds) a queued row waits before hitting the disk
+        self.flush_size = flush_size # Flush as soon as this many rows are waiting
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._write_lock = threading.Lock() # Direct writes and the thread's flushes never interleave
+        self.rows_written = 0
+        self.flushes = 0
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Sequence):
+        """Queue one CSV row, returns immediately. Written synchronously while the thread isn't running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._flush([list(row)])
+            return
+        self._queue.put(list(row))
+
+    def close(self):
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        pending: List[list] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty: # Interval elapsed with rows waiting
+                item = None
+            if item is _STOP:
+                self._flush(pending)
+                return
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval # The first waiting row starts the clock
+            if pending and (len(pending) >= self.flush_size or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = []
+                deadline = None
+
+    def _flush(self, rows: List[list]):
+        if not rows:
+            return
+        with self._write_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True) # Ensure the parent directory exists
+            write_header = not self.path.exists() or self.path.stat().st_size == 0
+            with self.path.open("a", newline="", encoding="utf-8") as f: # One open per batch instead of per row
+                w = csv.writer(f)
+                if write_header:
+                    w.writerow(FEEDBACK_HEADER)
+                w.writerows(rows)
+            self.rows_written += len(rows)
+            self.flushes += 1
+
+
+class CategoryIndex:
+    """Known categories kept in memory. Seeded once from the model labels and the feedback file,
+    then updated as feedback arrives, so listing them never re-reads the CSV."""
+
+    def __init__(self):
+        self._cats: set = set()
+        self._sorted: Tuple[str, ...] = ()
+        self._dirty = False
+        self._model_version = None # Model whose labels were merged in last
+        self._lock = threading.Lock()
+
+    def seed_from_csv(self, path: Path):
+        """Add every category found in an existing feedback CSV (done once at start-up)."""
+        path = Path(path)
+        if not path.exists():
+            return
+        with path.open("r", newline="", encoding="utf-8") as f:
+            self.update(row.get("category") or "" for row in csv.DictReader(f))
+
+    def sync_model(self, version: int, labels: Iterable[str]):
+        """Merge a model's labels, only does work when the model version changed."""
+        if version == self._model_version:
+            return
+        self.update(labels)
+        self._model_version = version
+
+    def add(self, category: str):
+        self.update([category])
+
+    def update(self, categories: Iterable[str]):
+        with self._lock:
+            for cat in categories:
+                cat = str(cat).strip()
+                if cat and cat not in self._cats:
+                    self._cats.add(cat)
+                    self._dirty = True
+
+    def sorted(self) -> Tuple[str, ...]:
+        """All categories sorted alphabetically (case-insensitive), re-sorted only after a change."""
+        with self._lock:
+            if self._dirty:
+                self._sorted = tuple(sorted(self._cats, key=lambda s: s.lower()))
+                self._dirty = False
+            return self._sorted
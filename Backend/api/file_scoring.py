@@ -0,0 +1,124 @@
+# Backend/api/file_scoring.py
+import codecs
+import csv
+import io
+import threading
+import time
+from typing import BinaryIO, Iterator, List
+
+from app.interface import ModelStore
+from app.metrics import METRICS
+from app.features import column_renames
+
+# Categorizes whole CSV exports for /predict/file. The upload is read row by row with the csv
+# module, chunk_rows rows at a time are scored with one predict_many call, and each chunk is
+# written back out (every original column untouched, plus category and confidence) before the
+# next one is read, so memory depends on chunk_rows and not on the file size. Headers are matched
+# like the trainer's (supplier -> vendor, details/memo -> description, ...). Rows with neither a
+# vendor nor a description keep empty result columns instead of failing the file.
+# bench/bench_file_predict.py measures rows/sec and peak memory for growing file sizes.
+
+
+class FileScorer:
+    def __init__(self, store: ModelStore, chunk_rows: int = 2000):
+        self.store = store
+        self.chunk_rows = chunk_rows # Rows per predict_many call and per piece of the streamed response
+        self._lock = threading.Lock() # Files are scored on threadpool threads
+        self.files = 0
+        self.rows = 0
+        self.seconds = 0.0 # Parsing + scoring + writing, summed over all files
+        self.last_file: dict | None = None
+
+    def annotate(self, raw: BinaryIO, top_k: int = 1) -> Iterator[str]:
+        """CSV text of the file in raw with result columns added, as an iterator of pieces. The
+        header is checked and the first chunk scored before this returns, so a bad file or a missing
+        model raises here (and becomes an error status) instead of in the middle of the response."""
+        start = time.perf_counter()
+        reader = csv.reader(codecs.getreader("utf-8-sig")(raw, errors="replace"))
+        header = next(reader, None)
+        if not header:
+            raise ValueError("The file is empty.")
+        renames = column_renames(header)
+        names = [renames[h] for h in header]
+        vendor_col = names.index("vendor") if "vendor" in names else None
+        description_col = names.index("description") if "description" in names else None
+        if vendor_col is None and description_col is None:
+            raise ValueError(f"The file needs a vendor or description column (or a synonym such as supplier, details, memo). "
+                             f"Found: {header}")
+        added = ["predicted_category" if "category" in names else "category", "confidence"] # Never overwrite the file's own column
+        if top_k > 1:
+            added.append("top")
+
+        def pairs(rows: List[List[str]]):
+            return [(row[vendor_col] if vendor_col is not None and vendor_col < len(row) else "",
+                     row[description_col] if description_col is not None and description_col < len(row) else "")
+                    for row in rows]
+
+        chunks = self._chunks(reader)
+        first = next(chunks, [])
+        first_results = self._score(pairs(first), top_k) # Raises now if there is no model
+        return self._stream(header + added, first, first_results, chunks, pairs, top_k, start)
+
+    def _chunks(self, reader) -> Iterator[List[List[str]]]:
+        chunk = []
+        for row in reader:
+            if not row: # Blank line
+                continue
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _score(self, items, top_k: int):
+        """Results for the rows with some text, None for the others (predict_many rejects empty rows)."""
+        results = [None] * len(items)
+        todo = [i for i, (vendor, description) in enumerate(items) if (vendor or "").strip() or (description or "").strip()]
+        if todo:
+            scored = self.store.predict_many([items[i] for i in todo], top_k=top_k, use_cache=False)
+            for i, result in zip(todo, scored):
+                results[i] = result
+        return results
+
+    def _stream(self, header, rows, results, chunks, pairs, top_k: int, start: float) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(header)
+        n = 0
+        while rows:
+            with METRICS.time("pai_file_stage_seconds", stage="write"):
+                for row, result in zip(rows, results):
+                    if result is None:
+                        extra = ["", ""] + ([""] if top_k > 1 else [])
+                    else:
+                        category, top = result
+                        extra = [category, f"{top[0][1]:.4f}" if top else ""]
+                        if top_k > 1:
+                            extra.append("; ".join(f"{c}:{p:.4f}" for c, p in top))
+                    writer.writerow(row + extra)
+                n += len(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            with METRICS.time("pai_file_stage_seconds", stage="parse"):
+                rows = next(chunks, None)
+            if rows:
+                with METRICS.time("pai_file_stage_seconds", stage="score"):
+                    results = self._score(pairs(rows), top_k)
+        if n == 0:
+            yield buffer.getvalue() # Header only
+        self._record(n, time.perf_counter() - start)
+
+    def _record(self, rows: int, seconds: float):
+        with self._lock:
+            self.files += 1
+            self.rows += rows
+            self.seconds += seconds
+            self.last_file = {"rows": rows, "seconds": seconds, "rows_per_sec": rows / max(seconds, 1e-9)}
+
+    def stats(self) -> dict:
+        """Files and rows categorized so far and the throughput, overall and for the last file."""
+        with self._lock:
+            return {"files": self.files, "rows": self.rows, "seconds": self.seconds,
+                    "rows_per_sec": self.rows / self.seconds if self.seconds else 0.0, "last_file": self.last_file}
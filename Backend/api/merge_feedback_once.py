@@ -1,27 +1,179 @@
 # Backend/api/merge_feedback_once.py
+import io
+import os
+import sys
+import csv
+import json
+import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
 ROOT = Path(__file__).resolve().parents[2] # Go up two levels to get to PAI/
+if str(ROOT / "Backend") not in sys.path: # Run as a script, make Backend/ importable
+    sys.path.insert(0, str(ROOT / "Backend"))
+from ML.seen_store import SeenStore, row_ids
+from app.features import column_renames
+
 train_csv = ROOT / "data" / "training_data.csv" # Path to the main training data CSV file
-feedback_csv = ROOT / "data" / "feedback.csv"  # Path to the feedback CSV file
-
-df_train = pd.read_csv(train_csv, encoding="utf-8-sig") # Read the main training data CSV file
-df_fb = pd.read_csv(feedback_csv, encoding="utf-8-sig") if feedback_csv.exists() else pd.DataFrame() 
-
-if not df_fb.empty:
-    df_train.columns = [c.strip().lower() for c in df_train.columns] # Normalize column names by stripping whitespace and converting to lowercase
-    df_fb.columns = [c.strip().lower() for c in df_fb.columns]
-
-    keep = ["date", "amount", "vendor", "description", "category"]
-    for c in keep:
-        if c not in df_train.columns: df_train[c] = "" # Creates any missing columns in df_train and fills with empty strings
-        if c not in df_fb.columns: df_fb[c] = "" 
-    
-    df_all = pd.concat([df_train[keep], df_fb[keep]], ignore_index=True).drop_duplicates() # Only select the keep columns and drop duplicates
-    # ^ Concat stacks the two dataframes vertically, ignore_index resets the index in the new dataframe
-
-    df_all.to_csv(train_csv, index=False, encoding="utf-8") # Writes the merged dataframe back to the training data CSV file
-    print(f"Merged {len(df_fb)} feedback rows -> {train_csv}")
-else:
-    print("No feedback to merge")
+feedback_csv = ROOT / "Backend" / "data" / "feedback.csv"  # Path to the feedback CSV file the API appends to
+
+# Appends new feedback rows to the training data without rewriting it. A state file next to the
+# training CSV keeps a byte-offset watermark into the feedback file, so each run only reads the
+# feedback written since the last one, and a key index (a SeenStore of row keys) replaces the
+# drop_duplicates over the whole history. Crash safety: before touching any file the run records
+# what it is about to do (a "pending" entry with the old sizes); a run that finds a pending entry
+# truncates the training CSV and the key log back to those sizes and starts over from the old watermark.
+
+KEEP = ["date", "amount", "vendor", "description", "category"] # Columns that make up a training row (and its key)
+
+
+def get_args():
+    p = argparse.ArgumentParser(description="Append new feedback rows to the training data")
+    p.add_argument("--training", default=str(train_csv), help="Training data CSV to append to")
+    p.add_argument("--feedback", default=str(feedback_csv), help="Feedback CSV written by the API")
+    p.add_argument("--state", default=None, help="Watermark file (default: <training>.merge_state.json)")
+    p.add_argument("--keys", default=None, help="Key index base name (default: <training>.merge_keys)")
+    return p.parse_args()
+
+
+def load_state(path: Path) -> dict:
+    if not path.exists():
+        return {"offset": 0, "training_size": None, "pending": None}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: Path, state: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path) # The state is either the old one or the new one
+
+
+def truncate(path: Path, size: int):
+    if path.exists() and path.stat().st_size > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+            os.fsync(f.fileno())
+
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """Key of each row over the KEEP columns, exact values like drop_duplicates compared."""
+    rest = df["date"] + "\x1f" + df["amount"] + "\x1f" + df["vendor"] + "\x1f" + df["description"]
+    return row_ids(rest.values, df["category"].values)
+
+
+def normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """KEEP columns as stripped strings, missing columns filled with empty strings."""
+    df = df.rename(columns=column_renames(df.columns))
+    out = pd.DataFrame(index=df.index)
+    for c in KEEP:
+        out[c] = df[c].fillna("").astype(str).str.strip() if c in df.columns else ""
+    return out
+
+
+def build_index(keys_base: Path, training: Path, chunk_size: int = 100_000) -> SeenStore:
+    """Index every row already in the training CSV (one pass, only when there is no usable index)."""
+    keys = SeenStore(keys_base)
+    for p in (keys.ids_path, keys.log_path):
+        if p.exists():
+            os.remove(p)
+    keys = SeenStore(keys_base) # Start from an empty store
+    if training.exists():
+        for chunk in pd.read_csv(training, encoding="utf-8-sig", dtype=str, keep_default_na=False, chunksize=chunk_size):
+            keys.add(row_keys(normalized(chunk)))
+    keys.save()
+    return keys
+
+
+def ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_new_feedback(feedback: Path, offset: int) -> tuple[pd.DataFrame, int]:
+    """Complete feedback rows written after offset, and the offset just past the last one."""
+    if not feedback.exists():
+        return pd.DataFrame(columns=KEEP), 0
+    with open(feedback, "rb") as f:
+        header = f.readline()
+        offset = max(offset, len(header)) # Never parse the header as data
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1 # A row still being written has no newline yet, leave it for the next run
+    if end == 0:
+        return pd.DataFrame(columns=KEEP), offset
+    text = (header + data[:end]).decode("utf-8-sig")
+    df = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+    return normalized(df), offset + end
+
+
+def main():
+    args = get_args()
+    training, feedback = Path(args.training), Path(args.feedback)
+    state_path = Path(args.state) if args.state else training.with_name(training.name + ".merge_state.json")
+    keys_base = Path(args.keys) if args.keys else training.with_name(training.stem + ".merge_keys")
+    state = load_state(state_path)
+
+    # Roll back a run that stopped half way, then redo it from the old watermark
+    if state.get("pending"):
+        pending = state["pending"]
+        truncate(training, pending["training_size"])
+        truncate(SeenStore(keys_base).log_path, pending["keys_log_bytes"])
+        state["pending"] = None
+        save_state(state_path, state)
+        print("Recovered from an interrupted merge, retrying it")
+
+    keys = SeenStore(keys_base)
+    training_size = training.stat().st_size if training.exists() else 0
+    if not keys.exists() or state.get("training_size") != training_size: # First run, or the CSV was edited by hand
+        print(f"Indexing the rows already in {training}")
+        keys = build_index(keys_base, training)
+        state["training_size"] = training_size
+
+    if feedback.exists() and feedback.stat().st_size < state["offset"]: # Feedback file was replaced, read it all again
+        state["offset"] = 0
+    df_fb, new_offset = read_new_feedback(feedback, state["offset"])
+    if len(df_fb) == 0:
+        save_state(state_path, {**state, "offset": new_offset})
+        print("No feedback to merge")
+        return
+
+    ids = row_keys(df_fb)
+    fresh = ~keys.contains(ids) & ~pd.Series(ids).duplicated().to_numpy() # Not in the training data, first copy in this batch
+    df_new = df_fb[fresh]
+
+    # Record what is about to change, then append the rows and their keys
+    save_state(state_path, {**state, "pending": {
+        "training_size": training_size,
+        "keys_log_bytes": keys.log_path.stat().st_size if keys.log_path.exists() else 0,
+    }})
+    if len(df_new):
+        header = pd.read_csv(training, encoding="utf-8-sig", nrows=0).columns if training.exists() else pd.Index(KEEP)
+        renames = column_renames(header) # Write in the training file's own column order and names
+        needs_newline = training_size > 0 and not ends_with_newline(training)
+        with open(training, "a", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            if training_size == 0:
+                writer.writerow(header) # Quoted like the rows if a column name needs it
+            elif needs_newline:
+                f.write("\n")
+            for row in df_new.itertuples(index=False):
+                values = row._asdict()
+                writer.writerow([values.get(renames[c], "") for c in header])
+            f.flush()
+            os.fsync(f.fileno())
+        keys.add(ids[fresh])
+        keys.save(compact_ratio=float("inf")) # Only append to the log while the run can still be rolled back
+
+    save_state(state_path, {"offset": new_offset, "training_size": training.stat().st_size, "pending": None})
+    keys.save() # Safe to compact the key log now
+    print(f"Merged {len(df_new)} new feedback rows ({len(df_fb) - len(df_new)} duplicates skipped) -> {training}")
+
+
+if __name__ == "__main__":
+    main()
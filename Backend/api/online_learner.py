@@ -0,0 +1,168 @@
+# Backend/api/online_learner.py
+import copy
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.interface import LoadedModel, ModelStore, normalize_text
+from app.scoring import CompactScorer
+from ML.class_expansion import expand_classes
+
+# Optional online learning from /feedback. Corrections are queued by the request handler and a
+# background thread trains them with partial_fit into the learner's private SGDClassifier, then
+# publishes its weights to the ModelStore (a single reference swap, requests never wait for it).
+# The private model is trained in place batch after batch and never served: a publish copies only
+# the weight columns of features some class uses into a CompactScorer (a few MB to tens of MB for
+# hashed text, where a copy of the estimator was ~160 MB), so a model being served is never
+# modified. The private model is only re-taken from the store when the watcher loaded a newly
+# trained file (cloning its weight arrays, or loading the .joblib next to an artifact), or after a
+# failed batch, which may have left it half updated: it is then rebuilt from the weights served.
+# The learned model lives in this process only: the feedback CSV is still written
+# and the next offline retrain (which replaces it) picks the rows up. Meant for a single API worker,
+# with several workers each one would learn only from the feedback it received.
+
+_STOP = object() # Queue sentinel telling the learner thread to publish and exit
+# Arrays partial_fit writes into (the averaged ones only exist with average=True)
+_WEIGHTS = ("coef_", "intercept_", "_standard_coef", "_standard_intercept", "_average_coef", "_average_intercept")
+
+
+def _clone(model):
+    """Shallow copy of a fitted linear model with its own weight arrays: partial_fit on one never
+    changes the other, without deep-copying everything else."""
+    clone = copy.copy(model)
+    for name in _WEIGHTS:
+        value = getattr(model, name, None)
+        if isinstance(value, np.ndarray):
+            setattr(clone, name, value.copy())
+    return clone
+
+
+def _with_served_weights(model, scorer: CompactScorer):
+    """Put the weights of a learner publish (a CompactScorer, exact float64) into a model loaded from
+    its file, so the rows learned online so far are kept."""
+    coef = np.zeros((scorer.coef.shape[0], scorer.n_features))
+    coef[:, scorer.columns] = scorer.coef
+    model.coef_, model.intercept_ = coef, np.array(scorer.intercept, dtype=np.float64)
+    model.classes_ = np.array(scorer.classes)
+    return model
+
+
+class OnlineLearner:
+    def __init__(self, store: ModelStore, publish_rows: int = 50, publish_interval: float = 30.0):
+        self.store = store
+        self.publish_rows = publish_rows # Publish as soon as this many corrections are waiting
+        self.publish_interval = publish_interval # Longest time (seconds) a correction waits before it is learned
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._base_version: int | None = None # Store version self._model was taken from or published as
+        self._model = None # Private working model, trained in place and never published itself
+        self._latencies: deque = deque(maxlen=1000) # Seconds from /feedback to the model serving it, recent rows
+        self.rows_learned = 0
+        self.publishes = 0
+        self.rows_dropped = 0 # Learned into a model the watcher replaced before the publish, left to the next retrain
+        self.last_publish_seconds = 0.0 # partial_fit + compacting + publish time of the last batch
+        self.last_error: str | None = None
+
+    def start(self):
+        """Start the learner thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="online-learner", daemon=True)
+        self._thread.start()
+
+    def submit(self, vendor: str, description: str, category: str):
+        """Queue one correction, returns immediately."""
+        self._queue.put((normalize_text(vendor, description), category.strip(), time.monotonic()))
+
+    def close(self):
+        """Learn everything still queued and stop the learner thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        pending: List[Tuple[str, str, float]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty: # Interval elapsed with corrections waiting
+                item = None
+            if item is _STOP:
+                self._learn(pending)
+                return
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.publish_interval # The first waiting row starts the clock
+            if pending and (len(pending) >= self.publish_rows or time.monotonic() >= deadline):
+                self._learn(pending)
+                pending = []
+                deadline = None
+
+    def _base_model(self, current: LoadedModel):
+        """The private model to train: ours while its last publish is still the one served, otherwise
+        a clone of the store's (the watcher loaded a newly trained file). Artifacts (and our own
+        publishes) hold no estimator, so the .joblib that the trainer writes next to each one is loaded instead."""
+        if self._model is not None and current.version == self._base_version:
+            return self._model
+        if current.model is not None:
+            return _clone(current.model) # The served model is never trained in place
+        import joblib # Only once a model is updated, so the API doesn't import sklearn at startup
+        model = joblib.load(current.path.with_suffix(".joblib"))
+        if current.version == self._base_version and not getattr(model, "average", False): # Our own publish, see _learn's error path
+            _with_served_weights(model, current.scorer)
+        return model
+
+    def _learn(self, rows: List[Tuple[str, str, float]]):
+        if not rows:
+            return
+        try:
+            start = time.perf_counter()
+            current = self.store._current
+            model = self._base_model(current)
+            if not hasattr(model, "partial_fit") or not hasattr(model, "classes_"):
+                raise TypeError(f"{type(model).__name__} can't be updated online")
+
+            known = {str(c).lower(): c for c in model.classes_} # Feedback labels are free text, match case-insensitively
+            labels = np.array([known.get(cat.lower(), cat) for _, cat, _ in rows], dtype=object)
+            expand_classes(model, labels) # Brand new categories get their own weights
+            model.partial_fit(current.vectorizer.transform([text for text, _, _ in rows]), labels)
+
+            published = self.store.publish(None, path=current.path, mtime=current.mtime, # Same file, the watcher won't reload it
+                                           scorer=CompactScorer.from_model(model), vectorizer=current.vectorizer,
+                                           expected_version=current.version)
+            if published is None: # A newly trained model was loaded meanwhile, it wins; the next batch starts from it
+                self.rows_dropped += len(rows)
+                return
+            self._model, self._base_version = model, published.version
+            now = time.monotonic()
+            self._latencies.extend(now - submitted for _, _, submitted in rows)
+            self.rows_learned += len(rows)
+            self.publishes += 1
+            self.last_publish_seconds = time.perf_counter() - start
+            self.last_error = None
+        except Exception as e: # Keep serving the current model, the rows are still in the feedback CSV
+            self.last_error = f"{type(e).__name__}: {e}"
+            self._model = None # May be half updated (classes expanded, some rows fitted), rebuilt from the served version
+
+    def stats(self) -> Dict[str, Any]:
+        """Rows learned, publishes and feedback-to-model latency over the recent rows."""
+        lat = np.asarray(self._latencies, dtype=float)
+        pct = (lambda p: float(np.percentile(lat, p))) if len(lat) else (lambda p: None)
+        return {
+            "rows_learned": self.rows_learned,
+            "publishes": self.publishes,
+            "rows_dropped": self.rows_dropped,
+            "queued": self._queue.qsize(),
+            "last_publish_seconds": self.last_publish_seconds,
+            "feedback_to_model_seconds": {"p50": pct(50), "p95": pct(95), "max": float(lat.max()) if len(lat) else None},
+            "last_error": self.last_error,
+        }
@@ -1,22 +1,82 @@
 # Backend/api/predict_api.py
 from pathlib import Path
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Optional, List, Tuple, Set
-import csv
+from typing import Optional, List, Tuple
 from datetime import datetime, timezone
 import os
+import re
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware # Makes the API accessible from a frontend running on a different origin
 
 
 API_DIR = Path(__file__).resolve().parent # Directory of the current file
 ROOT = API_DIR.parent # Go up level to get the root directory
-MODELS_DIR = ROOT / "ML" / "saved_models" # Directory where models are stored
-FEEDBACK_CSV = ROOT / "data" / "feedback.csv" # Path to the feedback CSV file
+MODELS_DIR = Path(os.getenv("PAI_MODELS_DIR", str(ROOT / "ML" / "saved_models"))) # Directory where models are stored
+FEEDBACK_CSV = Path(os.getenv("PAI_FEEDBACK_CSV", str(ROOT / "data" / "feedback.csv"))) # Path to the feedback CSV file
+MAX_BATCH_ROWS = int(os.getenv("PAI_MAX_BATCH_ROWS", "10000")) # Largest number of rows accepted by /predict/batch in one request
 
 from app.interface import ModelStore # Import the ModelStore class from the inference module
-app = FastAPI(title="Bill Categorization API", version="0.1.0") # Initialize FastAPI app
-store = ModelStore(MODELS_DIR) # Initialize the model store with the models directory
+from app.cache import PredictionCache
+from api.feedback_writer import CategoryIndex, FeedbackWriter
+from api.online_learner import OnlineLearner
+from app.metrics import METRICS, MetricsMiddleware
+from app.batcher import MicroBatcher
+from api.file_scoring import FileScorer
+
+def build_cache() -> PredictionCache | None:
+    """Prediction cache configured from the environment, PAI_CACHE_ENTRIES=0 turns it off."""
+    max_entries = int(os.getenv("PAI_CACHE_ENTRIES", "100000"))
+    if max_entries <= 0:
+        return None
+    max_bytes = os.getenv("PAI_CACHE_BYTES") # Optional memory cap in bytes
+    ttl = os.getenv("PAI_CACHE_TTL") # Optional entry lifetime in seconds
+    return PredictionCache(max_entries=max_entries,
+                           max_bytes=int(max_bytes) if max_bytes else None,
+                           ttl=float(ttl) if ttl else None)
+
+ONLINE_LEARNING = os.getenv("PAI_ONLINE_LEARNING", "0") == "1" # Feedback reaches the served model without a retrain
+store = ModelStore(MODELS_DIR, watch_interval=float(os.getenv("PAI_RELOAD_INTERVAL", "2.0")), cache=build_cache(),
+                   prefer_artifacts=os.getenv("PAI_MODEL_FORMAT", "artifact") != "joblib", # Initialize the model store with the models directory
+                   use_vendor_index=os.getenv("PAI_VENDOR_INDEX", "1") != "0" # Known single-category vendors skip the model,
+                   and not ONLINE_LEARNING) # unless the model learns corrections the index can't know about
+feedback_writer = FeedbackWriter(FEEDBACK_CSV,
+                                 flush_interval=float(os.getenv("PAI_FEEDBACK_FLUSH_INTERVAL", "1.0")),
+                                 flush_size=int(os.getenv("PAI_FEEDBACK_FLUSH_SIZE", "100")))
+category_index = CategoryIndex() # Categories from the model labels and all feedback, kept in memory
+category_index.seed_from_csv(FEEDBACK_CSV) # The only time the feedback file is read
+category_index.sync_model(store.version, store.labels)
+online_learner = (OnlineLearner(store, # Off unless PAI_ONLINE_LEARNING=1, feedback then reaches the served model without a retrain
+                                publish_rows=int(os.getenv("PAI_ONLINE_PUBLISH_ROWS", "50")),
+                                publish_interval=float(os.getenv("PAI_ONLINE_PUBLISH_INTERVAL", "30")))
+                  if ONLINE_LEARNING else None)
+batcher = (MicroBatcher(store, # Concurrent /predict calls are scored together, PAI_MICROBATCH=0 scores each on its own
+                        max_wait_ms=float(os.getenv("PAI_BATCH_WAIT_MS", "0")),
+                        max_batch=int(os.getenv("PAI_BATCH_MAX", "64")))
+           if os.getenv("PAI_MICROBATCH", "1") != "0" else None)
+file_scorer = FileScorer(store, chunk_rows=int(os.getenv("PAI_FILE_CHUNK_ROWS", "2000"))) # /predict/file, rows scored per predict_many call
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers when the server starts and stop them on shutdown."""
+    store.start_watcher() # Picks up newly trained models off the request path
+    feedback_writer.start()
+    if online_learner is not None:
+        online_learner.start()
+    if batcher is not None:
+        batcher.start()
+    yield
+    if batcher is not None:
+        await batcher.close() # Answers the requests still waiting in the queue
+    if online_learner is not None:
+        online_learner.close() # Learns and publishes what is still queued
+    feedback_writer.close() # Writes any feedback still queued before the process exits
+    store.stop_watcher()
+
+app = FastAPI(title="Bill Categorization API", version="0.1.0", lifespan=lifespan) # Initialize FastAPI app
+app.add_middleware(MetricsMiddleware, metrics=METRICS) # Times every request by route, PAI_METRICS=0 turns it off
 
 app.add_middleware( # Add CORS middleware to allow requests from the frontend
     CORSMiddleware,
@@ -39,70 +99,127 @@ class PredictOut(BaseModel): # Validates output data for prediction
     category: str
     top: List[Tuple[str, float]] # List of tuples containing category and its probability
 
+class PredictBatchIn(BaseModel): # Validates input data for batch prediction
+    items: List[PredictIn] = Field(..., min_length=1) # At least one vendor/description pair
+    top_k: int = Field(3, ge=1, le=20) # Number of top categories returned per row
+
+class PredictBatchOut(BaseModel): # Validates output data for batch prediction, one result per input row in the same order
+    results: List[PredictOut]
+
 class FeedbackIn(PredictIn):  # Inherits from PredictIn, adds category field for user feedback
     category: str = Field(..., min_length=1) # Category must be at least 1 character
     date: Optional[str] = None # Kept for potential future use
     amount: Optional[float] = None 
 
-def append_feedback(row: FeedbackIn):
-    """Append feedback to the CSV file."""
-    FEEDBACK_CSV.parent.mkdir(parents=True, exist_ok=True) # Ensure the parent directory exists
-    write_header = not FEEDBACK_CSV.exists() # Check if the CSV file already exists, returns True if it does not exist
-    with FEEDBACK_CSV.open("a", newline="", encoding="utf-8") as f: # Open the CSV file in append mode, create if it doesn't exist
-        w = csv.writer(f) # Create a CSV writer object
-        if write_header: # If the file is new, write the header row with column names
-            w.writerow(["date", "amount", "vendor", "description", "category", "source", "created_at_utc"]) 
-        w.writerow([
-            row.date or "",
-            row.amount if row.amount is not None else "",
-            row.vendor,
-            row.description, 
-            row.category,
-            "feedback_api",
-            datetime.now(timezone.utc).isoformat()
-        ])
-      
-def get_categories_from_model() -> Set[str]:
-    cats: Set[str] = set()
-    if hasattr(store, "labels"):
-        cats.update([str(x) for x in store.labels])
-    return cats
-
-def get_categories_from_feedback() -> Set[str]:
-    cats: Set[str] = set()
-    if FEEDBACK_CSV.exists():
-        with FEEDBACK_CSV.open("r", newline="", encoding="utf-8") as f:
-            r = csv.DictReader(f)
-            for row in r:
-                cat = (row.get("category") or "").strip()
-                if cat:
-                    cats.add(cat)
-    return cats
+def feedback_row(row: FeedbackIn) -> list:
+    """Build the CSV row stored for one piece of feedback."""
+    return [
+        row.date or "",
+        row.amount if row.amount is not None else "",
+        row.vendor,
+        row.description,
+        row.category,
+        "feedback_api",
+        datetime.now(timezone.utc).isoformat()
+    ]
 
 @app.get("/categories") #Get endpoint for category submitted with the expense
 def categories(): #What does this do breakdown****** (copy 2and give mergez_feedback, copy 3 and give coponent file)
     """ Return all known categories (model + feedback), unique and sorted."""
-    cats = set()
-    cats |= get_categories_from_model() # Adds all categories from model to cats (union)
-    cats |= get_categories_from_feedback()
-    return {"categories": sorted(cats, key=lambda s: s.lower())} #JSON response with categories sorted by alphabet (case-insensitive)
+    category_index.sync_model(store.version, store.labels) # Only does work after a model reload
+    return {"categories": list(category_index.sorted())} #JSON response with categories sorted by alphabet (case-insensitive)
 
 
 @app.post("/predict", response_model=PredictOut) # Define a POST endpoint for predictions, expects PredictIn model, returns PredictOut model
-def predict(payload: PredictIn): # Define the function FASTAPI will call when this endpoint is hit
+async def predict(payload: PredictIn): # Define the function FASTAPI will call when this endpoint is hit
     """Endpoint to get category prediction for a given vendor and description."""
     try:
-        cat, top = store.predict(payload.vendor, payload.description, top_k=3) # Get prediction from the model store with top 3 categories
+        if batcher is not None: # Waits for the batch this row joins, the event loop keeps accepting requests meanwhile
+            cat, top = await batcher.predict(payload.vendor, payload.description, top_k=3)
+        else:
+            cat, top = await run_in_threadpool(store.predict, payload.vendor, payload.description, top_k=3) # Get prediction from the model store with top 3 categories
         return PredictOut(category=cat, top=top) # Return the prediction in the expected format
     except FileNotFoundError as e: # If no model is found, return a 503 Service Unavailable error
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e: # For any other errors, return a 500 Internal Server Error
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/predict/batch", response_model=PredictBatchOut) # Scores many rows in one call, used by statement imports
+def predict_batch(payload: PredictBatchIn):
+    """Endpoint to get category predictions for many vendor/description pairs at once."""
+    if len(payload.items) > MAX_BATCH_ROWS: # Keep a single request from holding the worker for too long
+        raise HTTPException(status_code=413, detail=f"Batch has {len(payload.items)} rows, the limit is {MAX_BATCH_ROWS}.")
+    try:
+        preds = store.predict_many([(item.vendor, item.description) for item in payload.items], top_k=payload.top_k)
+        return PredictBatchOut(results=[PredictOut(category=cat, top=top) for cat, top in preds])
+    except FileNotFoundError as e: # If no model is found, return a 503 Service Unavailable error
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e: # An empty row is a client error
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e: # For any other errors, return a 500 Internal Server Error
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/file") # Whole bank or card export in, the same CSV with category and confidence columns out
+async def predict_file(file: UploadFile = File(...), top_k: int = Query(1, ge=1, le=20)):
+    """Endpoint to categorize every row of an uploaded CSV. The response is streamed while the
+    file is read and scored in chunks, top_k > 1 adds a "top" column with the runners-up."""
+    try:
+        body = await run_in_threadpool(file_scorer.annotate, file.file, top_k) # Checks the header, scores the first chunk
+    except FileNotFoundError as e: # If no model is found, return a 503 Service Unavailable error
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e: # Not a CSV we can read, or no vendor/description column
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e: # For any other errors, return a 500 Internal Server Error
+        raise HTTPException(status_code=500, detail=str(e))
+    name = re.sub(r"[^\w.-]", "_", Path(file.filename or "expenses.csv").stem) + "_categorized.csv"
+    return StreamingResponse(body, media_type="text/csv; charset=utf-8", # Sync iterator, Starlette runs it in the threadpool
+                             headers={"Content-Disposition": f'attachment; filename="{name}"'})
+
+@app.get("/stats") # Operational information about the served model
+def stats():
+    """Return the served model version, reload timings and prediction cache counters."""
+    return {
+        "model": store.stats(),
+        "feedback": {"rows_written": feedback_writer.rows_written, "flushes": feedback_writer.flushes},
+        "online_learning": online_learner.stats() if online_learner is not None else None,
+        "micro_batching": batcher.stats() if batcher is not None else None,
+        "file_scoring": file_scorer.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse) # Prometheus scrape endpoint
+def metrics():
+    """Latency histograms (per predict stage, per route, model reloads) and current counters in Prometheus text format."""
+    model = store.stats()
+    cache = model["cache"] or {}
+    vendors = model["vendor_index"] or {}
+    learner = online_learner.stats() if online_learner is not None else {}
+    gauges = [
+        ("pai_model_version", model["version"], {"format": model["model_format"]}),
+        ("pai_cache_entries", cache.get("entries"), {}),
+        ("pai_vendor_index_seconds_saved", vendors.get("est_seconds_saved"), {}), # An estimate, may go down
+        ("pai_online_queued", learner.get("queued"), {}),
+    ]
+    counters = [ # Only ever go up (reset by a restart)
+        ("pai_model_reloads_total", model["reload_count"], {}),
+        ("pai_cache_hits_total", cache.get("hits"), {}),
+        ("pai_cache_misses_total", cache.get("misses"), {}),
+        ("pai_vendor_index_lookups_total", vendors.get("lookups"), {}),
+        ("pai_vendor_index_hits_total", vendors.get("hits"), {}),
+        ("pai_feedback_rows_written_total", feedback_writer.rows_written, {}),
+        ("pai_online_rows_learned_total", learner.get("rows_learned"), {}),
+        ("pai_file_rows_total", file_scorer.rows, {}),
+        ("pai_file_seconds_total", file_scorer.seconds, {}),
+    ]
+    return PlainTextResponse(METRICS.render(gauges, counters), media_type="text/plain; version=0.0.4")
+
 @app.post("/feedback") # Define a POST endpoint for submitting feedback
-def feedback(payload: FeedbackIn, bg: BackgroundTasks): #Input is validated against FeedbackIn model, BackgroundTasks allows for background processing
+def feedback(payload: FeedbackIn): #Input is validated against FeedbackIn model
     """Endpoint to submut user feedback on predictions."""
-    bg.add_task(append_feedback, payload) # Schedule the append_feedback function to run in the background
+    feedback_writer.submit(feedback_row(payload)) # Queued, the writer thread appends it to the CSV in batches
+    category_index.add(payload.category)
+    store.note_feedback(payload.vendor) # The vendor index no longer answers for this vendor, the model decides
+    if online_learner is not None:
+        online_learner.submit(payload.vendor, payload.description, payload.category)
     return {"status": "queued", "message": "Thanks! Your correction was recorded."} # Return a response indicating the feedback was queued
 
 
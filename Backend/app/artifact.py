@@ -0,0 +1,143 @@
+# Backend/app/artifact.py
+import os
+import sys
+import json
+import struct
+import time
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+if __package__ in (None, ""): # Run as a script (python app/artifact.py model.joblib), make Backend/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.scoring import CompactScorer, LinearScorer
+
+# Export format for bare linear models that API processes can memory-map instead of unpickling.
+# One file: an 8 byte magic, the header length, a JSON header (classes, loss, vectorizer config,
+# array specs) and then the raw little-endian weight arrays, each 64 byte aligned. Memory-mapped,
+# the weights stay in the OS page cache, so every uvicorn worker shares one copy and only the
+# pages of features actually scored are ever read.
+# The "compact" layout keeps only the weight rows of active hashed features (a realistic vocabulary
+# touches a small share of the 2**20 columns, the rest stay exactly zero under SGD) plus a sorted
+# table of their hashed indices, optionally in float32 and with near-zero rows pruned.
+
+MAGIC = b"PAILIN01"
+SUFFIX = ".linmodel"
+_ALIGN = 64
+
+
+def artifact_path(model_path: str | os.PathLike) -> Path:
+    """Artifact file that goes with a .joblib model file (same name, other suffix)."""
+    return Path(model_path).with_suffix(SUFFIX)
+
+
+def vectorizer_config(vectorizer) -> Dict[str, Any]:
+    """JSON-able parameters of the vectorizer; weights are only valid for the same config."""
+    return {k: (v if isinstance(v, (str, int, float, bool, type(None))) else repr(v))
+            for k, v in sorted(vectorizer.get_params().items())}
+
+
+def _aligned(n: int) -> int:
+    return -(-n // _ALIGN) * _ALIGN
+
+
+def export_artifact(model, path: str | os.PathLike, vectorizer=None, layout: str = "dense",
+                    dtype: str = "float64", prune: float = 0.0) -> Path | None:
+    """Write model's weights as an artifact at path, replacing any old one atomically.
+    layout "compact" stores only the active feature rows, in dtype, dropping rows whose largest
+    weight is below prune times the largest weight of the model (0 keeps every non-zero row).
+    Returns None (and writes nothing) for models the LinearScorer can't serve, e.g. a Pipeline."""
+    scorer = LinearScorer.from_model(model)
+    if scorer is None:
+        return None
+    if layout not in ("dense", "compact"):
+        raise ValueError(f"Unknown artifact layout {layout!r}")
+    # Stored feature-major (coef transposed): the scorer gathers the weights of a row's non-zero
+    # features, which then sit in one contiguous n_classes run each instead of n_classes pages apart
+    coef_t = np.asarray(scorer.coef).T
+    arrays, extra = {}, {}
+    if layout == "compact":
+        row_max = np.abs(coef_t).max(axis=1)
+        keep = row_max > prune * row_max.max() if len(row_max) else row_max > 0
+        arrays["columns"] = np.flatnonzero(keep).astype("<i4") # Sorted hashed index of every stored row
+        coef_t = np.vstack([coef_t[keep], np.zeros((1, coef_t.shape[1]))]) # Trailing zero row for every other feature
+        extra = {"layout": "compact", "n_features": int(scorer.coef.shape[1]), "prune": prune}
+    arrays["coef_t"] = np.ascontiguousarray(coef_t, dtype=np.dtype(dtype).newbyteorder("<"))
+    arrays["intercept"] = np.ascontiguousarray(scorer.intercept, dtype="<f8")
+    specs, offset = {}, 0
+    for name, arr in arrays.items():
+        specs[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset} # Offset from the data start
+        offset = _aligned(offset + arr.nbytes)
+    header = json.dumps({
+        "format": 1,
+        "model": type(model).__name__,
+        "loss": scorer.loss,
+        "classes": [str(c) for c in scorer.classes],
+        "vectorizer": vectorizer_config(vectorizer) if vectorizer is not None else None,
+        "arrays": specs,
+        "created_at": time.time(),
+        **extra,
+    }).encode("utf-8")
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        data_start = _aligned(f.tell())
+        for name, arr in arrays.items():
+            f.seek(data_start + specs[name]["offset"])
+            f.write(arr.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path) # Readers see the old or the new file, never half of one
+    return path
+
+
+def read_header(path: str | os.PathLike) -> Tuple[Dict[str, Any], int]:
+    """The artifact's JSON header and the byte offset where its arrays start."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, _aligned(len(MAGIC) + 8 + length)
+
+
+def load_artifact(path: str | os.PathLike, mmap: bool = True) -> Tuple[LinearScorer, Dict[str, Any]]:
+    """Open an artifact as a LinearScorer plus its header. With mmap the weights are mapped
+    read-only and shared with other processes; without it they are read into memory."""
+    header, data_start = read_header(path)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+        if mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + spec["offset"], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                       offset=data_start + spec["offset"]).reshape(shape)
+    classes = np.array(header["classes"])
+    if header.get("layout") == "compact":
+        scorer = CompactScorer(arrays["columns"], arrays["coef_t"], arrays["intercept"], classes, header["loss"],
+                               header["n_features"])
+    else:
+        coef = arrays["coef_t"].T # (n_classes, n_features) view, no copy
+        scorer = LinearScorer(coef, arrays["intercept"], classes, header["loss"])
+    return scorer, header
+
+
+if __name__ == "__main__":
+    # Export existing .joblib models: python app/artifact.py ML/saved_models/bill_category_model.joblib
+    import argparse
+    import joblib
+    from ML.retrain_ml_model import build_vectorizer
+
+    p = argparse.ArgumentParser(description="Export .joblib linear models as memory-mappable artifacts")
+    p.add_argument("models", nargs="+")
+    p.add_argument("--layout", choices=["dense", "compact"], default="compact")
+    p.add_argument("--dtype", choices=["float64", "float32"], default="float32")
+    p.add_argument("--prune", type=float, default=0.0, help="Drop feature rows below this fraction of the largest weight")
+    args = p.parse_args()
+    for arg in args.models:
+        out = export_artifact(joblib.load(arg), artifact_path(arg), build_vectorizer(),
+                              layout=args.layout, dtype=args.dtype, prune=args.prune)
+        print(f"{arg} -> {out} ({out.stat().st_size / 2**20:.1f} MB)" if out else f"{arg}: not a linear model, nothing exported")
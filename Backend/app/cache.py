@@ -0,0 +1,86 @@
+# Backend/app/cache.py
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+# Bounded in-process LRU for prediction results. Keys include the model version, so publishing
+# a new model makes every old entry unreachable and they age out through normal eviction.
+
+Prediction = Tuple[str, List[Tuple[str, float]]]
+
+
+def _entry_size(key: Hashable, value: Prediction) -> int:
+    """Rough number of bytes an entry keeps alive (key strings, result strings and floats)."""
+    size = sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key)
+    size += sys.getsizeof(value) + sys.getsizeof(value[0]) + sys.getsizeof(value[1])
+    size += sum(sys.getsizeof(pair) + sys.getsizeof(pair[0]) + sys.getsizeof(pair[1]) for pair in value[1])
+    return size
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = 100_000, max_bytes: int | None = None, ttl: float | None = None):
+        self.max_entries = max_entries # Evict least recently used entries above this count
+        self.max_bytes = max_bytes # Optional cap on the estimated memory held by the cache
+        self.ttl = ttl # Optional lifetime of an entry in seconds
+        self._data: "OrderedDict[Hashable, Tuple[Prediction, float, int]]" = OrderedDict() # key -> (value, stored_at, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Prediction | None:
+        """Return the cached prediction for key, or None on a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, size = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl: # Too old, drop it
+                del self._data[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key) # Mark as most recently used
+            self.hits += 1
+        return value[0], list(value[1]) # Callers get their own list
+
+    def put(self, key: Hashable, value: Prediction):
+        """Store a prediction, evicting least recently used entries while over the limits."""
+        value = (value[0], tuple(value[1])) # Stored immutable so cached results can't be changed by callers
+        size = _entry_size(key, value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._data[key] = (value, time.monotonic(), size)
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_entries
+                                  or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, (_, _, evicted) = self._data.popitem(last=False) # Oldest first
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring, hit_rate is over all lookups so far."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,135 @@
+# Backend/app/features.py
+import re
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+from scipy import sparse
+
+from ML.model_config import load_model_config
+
+# Shared feature config and a scikit-learn free copy of the trainer's HashingVectorizer for serving.
+# Importing sklearn costs about 1.4 s (and pulls pandas in), which every API process and worker
+# paid just to hash text, while the weights come from memory-mapped artifacts anyway. HashingFeatures
+# produces the same matrix bit for bit: sklearn's default tokens (two or more word characters, lower
+# cased), word n-grams joined by spaces, MurmurHash3 (x86, 32 bit, seed 0) of the UTF-8 bytes, index
+# abs(hash) % n_features, duplicate features summed, then every row scaled to unit L2 norm.
+# bench/bench_import_time.py checks it against HashingVectorizer and keeps sklearn out of the API imports.
+
+# Never tuned, ML/retrain_ml_model.py's HashingVectorizer is built with them too
+FIXED_PARAMS = {"alternate_sign": False, "norm": "l2"} # Non-negative counts, rows of unit length
+# The rest of HashingVectorizer's parameters, left at sklearn's defaults by the trainer; get_params()
+# returns them so artifact headers and holdouts written with sklearn match
+_SKLEARN_DEFAULTS = {
+    "analyzer": "word", "binary": False, "decode_error": "strict", "dtype": np.float64, "encoding": "utf-8",
+    "input": "content", "lowercase": True, "preprocessor": None, "stop_words": None, "strip_accents": None,
+    "token_pattern": r"(?u)\b\w\w+\b", "tokenizer": None,
+}
+_TOKEN = re.compile(_SKLEARN_DEFAULTS["token_pattern"])
+_C1, _C2 = np.uint32(0xCC9E2D51), np.uint32(0x1B873593)
+
+# Common header synonyms, applied in order and only when the target column is missing
+COLUMN_SYNONYMS = [
+    ("supplier", "vendor"),
+    ("details", "description"),
+    ("memo", "description"),
+    ("label", "category"),
+    ("class", "category"),
+]
+
+
+def column_renames(columns) -> dict:
+    """Map raw CSV headers to the normalized names used everywhere (lower case, synonyms resolved)."""
+    renames = {c: c.replace("\ufeff", "").strip().lower() for c in columns} # Normalize headers
+    present = set(renames.values())
+    for src, dst in COLUMN_SYNONYMS: # Map common synonyms
+        if src in present and dst not in present:
+            renames = {raw: (dst if norm == src else norm) for raw, norm in renames.items()}
+            present = set(renames.values())
+    return renames
+
+
+def _rotl(x: np.ndarray, r: int) -> np.ndarray:
+    return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+
+def _scramble(k: np.ndarray) -> np.ndarray:
+    return _rotl(k * _C1, 15) * _C2
+
+
+def murmurhash3_32(keys: List[bytes], seed: int = 0) -> np.ndarray:
+    """Signed 32 bit MurmurHash3 of every key, like sklearn.utils.murmurhash3_32, for all keys at
+    once: each key is zero-padded to whole 4 byte words (plus the tail word) in one flat array and
+    block j is mixed into the hashes of the keys that have one."""
+    n = len(keys)
+    lengths = np.fromiter(map(len, keys), dtype=np.int64, count=n)
+    nblocks = lengths >> 2
+    words = nblocks + 1
+    flat = np.frombuffer(b"".join(k.ljust(4 * (len(k) // 4 + 1), b"\0") for k in keys), dtype="<u4")
+    start = np.cumsum(words) - words
+    h = np.full(n, seed, dtype=np.uint32)
+    for j in range(int(nblocks.max(initial=0))):
+        idx = np.flatnonzero(nblocks > j)
+        hj = h[idx] ^ _scramble(flat[start[idx] + j])
+        h[idx] = _rotl(hj, 13) * np.uint32(5) + np.uint32(0xE6546B64)
+    tail = (lengths & 3) > 0 # The padding zeros make the tail word the tail bytes
+    h[tail] ^= _scramble(flat[(start + nblocks)[tail]])
+    h ^= lengths.astype(np.uint32)
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85EBCA6B)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xC2B2AE35)
+    h ^= h >> np.uint32(16)
+    return h.view(np.int32)
+
+
+class HashingFeatures:
+    """Drop-in for the trainer's HashingVectorizer at inference: transform() and get_params() only."""
+
+    def __init__(self, n_features: int = 2**20, ngram_range=(1, 2)):
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+
+    def get_params(self, deep: bool = True) -> Dict[str, Any]:
+        return {**_SKLEARN_DEFAULTS, **FIXED_PARAMS, "n_features": self.n_features, "ngram_range": self.ngram_range}
+
+    def _ngrams(self, tokens: List[str]) -> List[str]:
+        """Word n-grams in sklearn's order (which doesn't change the sums anyway)."""
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        grams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            grams += [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        return grams
+
+    def transform(self, texts: Iterable[str]) -> sparse.csr_matrix:
+        """(n_texts, n_features) float64 CSR matrix, sorted indices, each row L2-normalized."""
+        features: List[bytes] = []
+        counts = []
+        for text in texts:
+            grams = self._ngrams(_TOKEN.findall(text.lower()))
+            features += [g.encode("utf-8") for g in grams]
+            counts.append(len(grams))
+        n_rows = len(counts)
+        indices = np.abs(murmurhash3_32(features).astype(np.int64)) % self.n_features # int64, abs(-2**31) is defined
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        X = sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n_rows, self.n_features))
+        X.sum_duplicates() # Also sorts the indices, like sklearn's
+        rows = np.repeat(np.arange(n_rows), np.diff(X.indptr))
+        X.data /= np.sqrt(np.bincount(rows, weights=X.data ** 2, minlength=n_rows))[rows] # Integer counts: exact sums
+        return X
+
+
+def build_features(settings: Dict[str, Any] | None = None) -> HashingFeatures:
+    """HashingFeatures with settings (n_features, ngram_range), by default the promoted ones like build_vectorizer."""
+    settings = settings or load_model_config()["vectorizer"]
+    return HashingFeatures(n_features=settings["n_features"], ngram_range=settings["ngram_range"])
+
+
+def same_features(a: Dict[str, Any] | None, b: Dict[str, Any] | None) -> bool:
+    """Whether two vectorizer_config() dicts hash text the same way. Only keys both have are compared,
+    so a parameter a newer sklearn adds (at its default) doesn't count as a difference."""
+    if a is None or b is None:
+        return a is b
+    return all(a[k] == b[k] for k in a.keys() & b.keys())
@@ -1,111 +1,395 @@
 from pathlib import Path
-import joblib
+import os
 import time
-from typing import Dict, List, Tuple
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
 import numpy as np
-from ML.retrain_ml_model import build_vectorizer
-from sklearn.pipeline import Pipeline
+from app.scoring import LinearScorer, top_k_indices
+from app.artifact import SUFFIX as ARTIFACT_SUFFIX, load_artifact, vectorizer_config
+from app.features import build_features, same_features
+from ML.model_config import vectorizer_settings
+from ML.registry import Registry
+from ML.vendor_index import INDEX_FILE as VENDOR_INDEX_FILE, VendorIndex, normalize_vendor
+from app.cache import PredictionCache
+from app.metrics import METRICS
 
 # This module provides an interface for laoding a reusable ML model from a directory.
+# It stays free of scikit-learn, pandas and the trainer so API processes and workers start fast
+# (bench/bench_import_time.py): texts are hashed by app/features.py, and joblib (with sklearn) is
+# only imported when a .joblib model is actually loaded.
+
+def normalize_text(vendor: str, description: str) -> str:
+    """Combine vendor and description into the single lower-cased text string the model is trained on."""
+    return f"{(vendor or '').strip()} {(description or '').strip()}".lower().strip()
+
+def is_pipeline(model) -> bool:
+    """Whether model is a Pipeline (that vectorizes raw text itself), without importing sklearn."""
+    return hasattr(model, "steps")
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """One loaded model and everything derived from it. Requests read the store's current LoadedModel once,
+    so a reload publishing a new one (a single reference swap) never changes a model mid-request."""
+    model: Any # None when served from a memory-mapped artifact, the scorer holds the weights
+    path: Path
+    mtime: float
+    labels: List[str]
+    scorer: LinearScorer | None # Compiled scoring path for bare linear models, None means use the sklearn methods
+    vectorizer: Any # Hashes texts for this model, the settings it was trained with
+    version: int # Increases by one every time the store publishes a model
+    loaded_at: float # time.time() when it was published
+
 
 class ModelStore:
-    def __init__(self, models_dir: Path): 
+    def __init__(self, models_dir: Path, watch_interval: float = 2.0, cache: PredictionCache | None = None,
+                 prefer_artifacts: bool = True, mmap: bool = True, use_vendor_index: bool = True):
         self.models_dir = Path(models_dir)
+        self.cache = cache # Optional cache of results keyed by (model version, text, top_k)
+        self.prefer_artifacts = prefer_artifacts # Serve the newest .linmodel artifact when there is one
+        self.mmap = mmap # Map artifact weights read-only (shared between processes) instead of reading them in
+        self.registry = Registry(self.models_dir) # manifest.json names the active version when the trainer wrote one
+        self._manifest_stamp = None # (mtime_ns, size) of the manifest last read
+        self._manifest_target: Path | None = None # Active model file according to that manifest
         self.models_dir.mkdir(parents=True, exist_ok=True)
-        self._model_path = None 
-        self._model = None
-        self.mtime = 0.0
+        self.vectorizer = build_features() # Same features as the trainer's build_vectorizer()
+        self.watch_interval = watch_interval # Seconds between background checks for a newer model file
+        self._current: LoadedModel | None = None
+        self._version = 0
+        self._reload_lock = threading.RLock() # One load or publish at a time (loads publish while holding it), requests never take it
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.reload_count = 0
+        self.last_reload_seconds = 0.0 # Load + warm-up time of the most recent reload
+        self.last_reload_error: str | None = None
+        self.use_vendor_index = use_vendor_index # Answer confidently single-category vendors without the model
+        self._vendor_index: VendorIndex | None = None
+        self._vendor_index_stamp = None # (mtime_ns, size) of the index file loaded
+        self._feedback_vendors: Dict[str, float] = {} # Normalized vendor -> time of its latest feedback, newer than the index
+        self._feedback_lock = threading.Lock()
+        self.vendor_lookups = self.vendor_hits = self.model_rows = 0 # Rows looked up / answered by the index / scored
+        self.vendor_seconds = self.model_seconds = 0.0 # Time spent in index lookups / on the model (cache included)
+        self._counter_lock = threading.Lock() # The counters above are updated from threadpool workers
         self._load_latest()
-        self.vectorizer = build_vectorizer()
-    
-    def _latest_model_path(self) -> Path | None:
-        """Finds the latest model file in the models directory."""
-        files = sorted(self.models_dir.glob("*.joblib")) # Looks for and sorts all files ending in joblib in models_dir
-        if not files:
-            return None
-        return max(files, key=lambda p: p.stat().st_mtime) # Returns the file with the most recent modified time
-    
-    def _load_latest(self):
-        """Gets the path from the most recent model file and throws an error if none found. Also 
-        checks if the model is already loaded and reloads if not."""
-        p = self._latest_model_path() # Get the path of the latest model file
-        if not p:
-            raise FileNotFoundError(f"No model found in {self.models_dir}") 
-        mtime = p.stat().st_mtime # Get the last modified time of the file
-        if p != self._model_path or mtime != self.mtime: # If the path or modified time has changed, reload the model
-            self._model = joblib.load(p) 
-            self._model_path = p
-            self._mtime = mtime
-            
-        # Extract classes for later use
-        if hasattr(self._model, "classes_"):
-            self.labels = list(self._model.classes_)
-        elif isinstance(self._model, Pipeline) and hasattr(self._model, "classes_"):
-            self.labels = list(self._model.classes_)
+        self._load_vendor_index()
+
+    # Read-only views of the current model, kept for callers that used the old attributes
+    @property
+    def _model(self):
+        return self._current.model
+
+    @property
+    def _model_path(self) -> Path:
+        return self._current.path
+
+    @property
+    def labels(self) -> List[str]:
+        return self._current.labels
+
+    @property
+    def version(self) -> int:
+        return self._current.version
+
+    def _latest_model_path(self) -> Tuple[Path, float] | None:
+        """Finds the model file to serve, returns (path, mtime). The registry's active version when
+        there is a manifest (one stat per check, it is only re-read when it changes), otherwise the
+        newest file in the directory."""
+        try:
+            st = os.stat(self.registry.path)
+        except FileNotFoundError:
+            return self._scan_latest()
+        if self._manifest_stamp != (st.st_mtime_ns, st.st_size):
+            self._manifest_target = self.registry.active_path(prefer_artifact=self.prefer_artifacts)
+            self._manifest_stamp = (st.st_mtime_ns, st.st_size)
+        if self._manifest_target is None: # Manifest without an active version
+            return self._scan_latest()
+        return self._manifest_target, os.stat(self._manifest_target).st_mtime
+
+    def _scan_latest(self) -> Tuple[Path, float] | None:
+        """Newest model file in the directory. Artifacts win over .joblib files when prefer_artifacts
+        is set, the trainer writes both."""
+        latest = {".joblib": None, ARTIFACT_SUFFIX: None} # Newest file per kind
+        with os.scandir(self.models_dir) as it: # One directory read, scandir entries cache the stat result
+            for entry in it:
+                kind = os.path.splitext(entry.name)[1]
+                if kind in latest and entry.is_file():
+                    mtime = entry.stat().st_mtime
+                    if latest[kind] is None or mtime > latest[kind][1]: # Keep the file with the most recent modified time
+                        latest[kind] = (Path(entry.path), mtime)
+        first, second = (ARTIFACT_SUFFIX, ".joblib") if self.prefer_artifacts else (".joblib", ARTIFACT_SUFFIX)
+        return latest[first] or latest[second]
+
+    def _load_latest(self) -> bool:
+        """Gets the path from the most recent model file and throws an error if none found. Loads it
+        if the path or modified time changed since the last load, returns True when a new model was published."""
+        found = self._latest_model_path() # Get the path of the latest model file
+        if not found:
+            raise FileNotFoundError(f"No model found in {self.models_dir}")
+        p, mtime = found
+        cur = self._current
+        if cur is not None and p == cur.path and mtime == cur.mtime: # Nothing changed
+            return False
+
+        with self._reload_lock:
+            start = time.perf_counter()
+            if p.suffix == ARTIFACT_SUFFIX:
+                scorer, header = load_artifact(p, mmap=self.mmap)
+                self.publish(None, path=p, mtime=mtime, scorer=scorer, vectorizer=self._vectorizer_for(header, p))
+            else:
+                import joblib # Imports sklearn, only paid by stores serving .joblib files
+                model = joblib.load(p)
+                self.publish(model, path=p, mtime=mtime)
+            self.last_reload_seconds = time.perf_counter() - start
+        METRICS.observe("pai_model_reload_seconds", self.last_reload_seconds, format="artifact" if p.suffix == ARTIFACT_SUFFIX else "joblib")
+        return True
+
+    def _load_vendor_index(self):
+        """(Re)load vendor_index.json when the trainer wrote a new one, drop it when it was removed."""
+        if not self.use_vendor_index:
+            return
+        path = self.models_dir / VENDOR_INDEX_FILE
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._vendor_index, self._vendor_index_stamp = None, None
+            return
+        if self._vendor_index_stamp != (st.st_mtime_ns, st.st_size):
+            index = VendorIndex.load(path) # Built off to the side, then one reference swap
+            with self._feedback_lock: # Feedback the new index counted no longer needs the model
+                self._feedback_vendors = {v: t for v, t in self._feedback_vendors.items() if t > index.built_at}
+            self._vendor_index = index
+            self._vendor_index_stamp = (st.st_mtime_ns, st.st_size)
+
+    def note_feedback(self, vendor: str):
+        """A correction for vendor arrived: the vendor index, built before it, no longer answers for
+        that vendor and the model (which may learn it online) decides until the next index."""
+        with self._feedback_lock:
+            self._feedback_vendors[normalize_vendor(vendor)] = time.time()
+
+    def _vectorizer_for(self, header: Dict[str, Any], path: Path):
+        """Vectorizer for an artifact: the store's own, or one rebuilt from the settings in its header
+        when it was trained after a tuned config was promoted (before this process restarted)."""
+        config = header.get("vectorizer")
+        if config is None or same_features(config, vectorizer_config(self.vectorizer)):
+            return self.vectorizer
+        vectorizer = build_features(vectorizer_settings(config))
+        if not same_features(config, vectorizer_config(vectorizer)):
+            raise ValueError(f"{path.name} was trained with a different vectorizer config")
+        return vectorizer
+
+    def _warm(self, model, scorer: LinearScorer | None, vectorizer):
+        """Score one dummy row so the first real request doesn't pay for lazy set-up."""
+        if scorer is not None:
+            scorer.score(vectorizer.transform(["warm up"]), top_k=1)
         else:
-            self.labels = []
+            model.predict(["warm up"] if is_pipeline(model) else vectorizer.transform(["warm up"]))
+
+    def publish(self, model, path: Path | None = None, mtime: float = 0.0, scorer: LinearScorer | None = None,
+                vectorizer=None, expected_version: int | None = None) -> LoadedModel | None:
+        """Make model (or, with model None, a scorer loaded from an artifact) the one served from now on.
+        It is warmed first and then published with a single reference swap, requests already running keep
+        the model they started with. vectorizer defaults to the store's (build_features()). With
+        expected_version, nothing is published (None is returned) when another model replaced that
+        version in the meantime, e.g. the watcher loaded a newly trained file."""
+        if scorer is None:
+            scorer = LinearScorer.from_model(model)
+        vectorizer = vectorizer if vectorizer is not None else self.vectorizer
+        self._warm(model, scorer, vectorizer)
+        # Extract classes for later use
+        labels = [str(c) for c in (scorer.classes if scorer is not None else getattr(model, "classes_", []))]
+        with self._reload_lock: # Versions and the swap are serialized with the watcher's loads
+            if expected_version is not None and (self._current is None or self._current.version != expected_version):
+                return None
+            if self._current is not None:
+                self.reload_count += 1
+            self._version += 1
+            self._current = LoadedModel(model=model, path=path, mtime=mtime, labels=labels,
+                                        scorer=scorer, vectorizer=vectorizer, version=self._version, loaded_at=time.time())
+            return self._current
 
-    def _maybe_reload(self):
-        """Cheap check to see each call, reload if a newer file is dropped in the folder"""
-        p = self._latest_model_path() # Sets the path to the latest model file
-        if p and (p != self._model_path or p.stat().st_mtime != self.mtime): # If the modified time has changed, reload the model
-            self._load_latest()
+    def check_for_update(self) -> bool:
+        """Reload if a newer file was dropped in the folder. Runs on the watcher thread, never on a request."""
+        try:
+            reloaded = self._load_latest()
+            self._load_vendor_index()
+            self.last_reload_error = None
+            return reloaded
+        except Exception as e: # Keep serving the current model if the new file can't be read
+            self.last_reload_error = f"{type(e).__name__}: {e}"
+            return False
+
+    def start_watcher(self):
+        """Start the background thread that picks up new model files."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """Stop the background watcher and wait for it to exit."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            self.check_for_update()
+
+    def stats(self) -> Dict[str, Any]:
+        """Information about the served model and the reloads so far."""
+        cur = self._current
+        return {
+            "model_path": str(cur.path) if cur.path else None,
+            "model_format": "artifact" if cur.path is not None and cur.path.suffix == ARTIFACT_SUFFIX else "joblib", # Online updates keep the path
+            "weights": cur.scorer.weights_info() if cur.scorer is not None else None,
+            "version": cur.version,
+            "loaded_at": cur.loaded_at,
+            "reload_count": self.reload_count,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_reload_error": self.last_reload_error,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "vendor_index": self.vendor_index_stats(),
+        }
+
+    def vendor_index_stats(self) -> Dict[str, Any] | None:
+        """Hit rate of the vendor index and the model time it saved (hits times the mean model time per row)."""
+        index = self._vendor_index
+        if index is None:
+            return None
+        with self._counter_lock: # One consistent snapshot
+            lookups, hits, vendor_seconds = self.vendor_lookups, self.vendor_hits, self.vendor_seconds
+            model_rows, model_seconds = self.model_rows, self.model_seconds
+        model_per_row = model_seconds / model_rows if model_rows else None
+        index_per_row = vendor_seconds / lookups if lookups else 0.0
+        return {
+            "vendors": len(index),
+            "serving": index.serves(self._current.path), # False when the served model isn't the one it was built with
+            "corrected_vendors": len(self._feedback_vendors),
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "model_us_per_row": model_per_row * 1e6 if model_per_row is not None else None,
+            "index_us_per_row": index_per_row * 1e6,
+            "est_seconds_saved": hits * (model_per_row - index_per_row) if model_per_row is not None else None,
+        }
 
     def predict(self, vendor: str, description: str, top_k: int = 3) -> Tuple[str, List[Tuple[str, float]]]:
         """Predict the category for a given vendor and description using the loaded model."""
-        self._maybe_reload() # Check if the model needs to be reloaded before making a prediction
-        text = f"{(vendor or '').strip()} {(description or '').strip()}".lower().strip() # Combine vendor and description into a single text string
-
-        if not text:
-            raise ValueError("Vendor/description not provided.")
-        model = self._model
-        top: List[Tuple[str, float]] = [] # To store the top k predictions(categories)
-
-        # Case A: model is a Pipeline that includes the vectorizer
-        if isinstance(model, Pipeline):
-            # Pipeline can take raw text directly
-            y_pred = model.predict([text])[0]
-
-            probs = None
-            classes = None
-            # If the last step supports predict_proba, Pipeline exposes it too
-            if hasattr(model, "predict_proba"):
-                probs = model.predict_proba([text])[0]
-                classes = list(getattr(model, "classes_", []))
-            elif hasattr(model, "decision_function"):
-                # Fallback: turn scores into pseudo-probabilities
-                scores = model.decision_function([text])[0]
-                # Ensure 1D array
-                scores = np.array(scores, dtype=float)
-                # Softmax
-                exps = np.exp(scores - np.max(scores))
-                probs = exps / exps.sum()
-                classes = list(getattr(model, "classes_", []))
+        return self.predict_many([(vendor, description)], top_k=top_k)[0] # A single prediction is just a batch of one
 
-        else:
-            # Case B: bare classifier — vectorize text first
-            # Make sure self.vectorizer exists (e.g., set in __init__ via build_vectorizer())
-            X = self.vectorizer.transform([text])
-
-            y_pred = model.predict(X)[0]
-
-            probs = None
-            classes = None
-            if hasattr(model, "predict_proba"):
-                probs = model.predict_proba(X)[0]
-                classes = list(getattr(model, "classes_", []))
-            elif hasattr(model, "decision_function"):
-                scores = model.decision_function(X)[0]
-                scores = np.array(scores, dtype=float)
-                exps = np.exp(scores - np.max(scores))
-                probs = exps / exps.sum()
-                classes = list(getattr(model, "classes_", []))
-
-        if probs is not None and classes:
-            ranked = sorted(zip(classes, probs), key=lambda x: float(x[1]), reverse=True)[:top_k]
-            top = [(str(c), float(p)) for c, p in ranked]
-
-        return str(y_pred), top
+    def predict_many(self, items: Sequence[Tuple[str, str]], top_k: int = 3,
+                     use_cache: bool = True) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """Predict categories for many (vendor, description) pairs at once. All rows are vectorized
+        into one sparse matrix and scored together, which is much cheaper than calling predict per row.
+        use_cache=False leaves the prediction cache alone, for bulk jobs that would only evict the hot entries.
+        Rows answered by the vendor index list only the categories that vendor was seen with, so their
+        top pairs can be fewer than top_k (a single one for a vendor that always had the same category)."""
+        current = self._current # Read once, a reload swapping in a new model can't affect this request
+        with METRICS.time("pai_predict_stage_seconds", stage="normalize"):
+            texts = [normalize_text(vendor, description) for vendor, description in items] # Same text predict has always built
+
+        for i, text in enumerate(texts):
+            if not text:
+                raise ValueError("Vendor/description not provided." if len(texts) == 1 else f"Vendor/description not provided (row {i}).")
+        if not texts:
+            return []
+
+        index = self._vendor_index
+        if index is None or not index.serves(current.path): # Built for another model (rollback, older index)
+            return self._predict_cached(current, texts, top_k, use_cache)
+        start = time.perf_counter()
+        corrected = self._feedback_vendors
+        results = [index.lookup(vendor, top_k, exclude=corrected) for vendor, _ in items] # None where the model has to decide
+        todo = [i for i, r in enumerate(results) if r is None]
+        lookup_seconds = time.perf_counter() - start
+        METRICS.observe("pai_predict_stage_seconds", lookup_seconds, stage="vendor_index")
+        with self._counter_lock:
+            self.vendor_seconds += lookup_seconds
+            self.vendor_lookups += len(texts)
+            self.vendor_hits += len(texts) - len(todo)
+        if todo:
+            start = time.perf_counter()
+            scored = self._predict_cached(current, [texts[i] for i in todo], top_k, use_cache)
+            with self._counter_lock:
+                self.model_seconds += time.perf_counter() - start
+                self.model_rows += len(todo)
+            for i, result in zip(todo, scored):
+                results[i] = result
+        return results
+
+    def _predict_cached(self, current: LoadedModel, texts: List[str], top_k: int,
+                        use_cache: bool = True) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """Results from the cache where present, the model scores the rest (repeated texts once)."""
+        if self.cache is None or not use_cache:
+            return self._predict_texts(current, texts, top_k)
+
+        results: List[Tuple[str, List[Tuple[str, float]]] | None] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {} # Text -> rows still needing the model, repeated texts are scored once
+        with METRICS.time("pai_predict_stage_seconds", stage="cache"):
+            for i, text in enumerate(texts):
+                results[i] = self.cache.get((current.version, text, top_k))
+                if results[i] is None:
+                    pending.setdefault(text, []).append(i)
+
+        if pending:
+            scored = self._predict_texts(current, list(pending), top_k)
+            for (text, rows), result in zip(pending.items(), scored):
+                self.cache.put((current.version, text, top_k), result)
+                for i in rows:
+                    results[i] = (result[0], list(result[1]))
+        return results
+
+    def _predict_texts(self, current: LoadedModel, texts: List[str], top_k: int) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """Score normalized texts with the given model, one result per text."""
+        if current.scorer is not None: # Bare linear model: score straight from its weights
+            with METRICS.time("pai_predict_stage_seconds", stage="vectorize"):
+                X = current.vectorizer.transform(texts)
+            with METRICS.time("pai_predict_stage_seconds", stage="score"):
+                scores = current.scorer.decision_function(X)
+                labels, probs = current.scorer.predict(scores), current.scorer.predict_proba(scores)
+            with METRICS.time("pai_predict_stage_seconds", stage="rank"):
+                return current.scorer.rank(labels, probs, top_k)
+
+        with METRICS.time("pai_predict_stage_seconds", stage="score"): # Vectorizing included, a Pipeline does it itself
+            y_pred, probs, classes = self._score(current.model, texts, current.vectorizer)
+
+        with METRICS.time("pai_predict_stage_seconds", stage="rank"):
+            tops: List[List[Tuple[str, float]]] = [[] for _ in texts] # To store the top k predictions(categories) per row
+            if probs is not None and classes:
+                order = top_k_indices(probs, top_k) # Highest probability first, ties keep class order
+                for row, idx in enumerate(order):
+                    tops[row] = [(str(classes[j]), float(probs[row, j])) for j in idx]
+
+            return [(str(y), top) for y, top in zip(y_pred, tops)]
+
+    def _score(self, model, texts: List[str], vectorizer):
+        """Run the model over a list of normalized texts. Returns (predictions, probabilities, classes),
+        probabilities is a (n_rows, n_classes) array or None when the model can't produce any."""
+        # Case A: model is a Pipeline that includes the vectorizer, it can take raw text directly
+        # Case B: bare classifier, vectorize text first (with the vectorizer it was published with)
+        X = texts if is_pipeline(model) else vectorizer.transform(texts)
+
+        y_pred = model.predict(X)
+
+        probs = None
+        classes = None
+        # If the last step supports predict_proba, Pipeline exposes it too
+        if hasattr(model, "predict_proba"):
+            probs = np.asarray(model.predict_proba(X), dtype=float)
+            classes = list(getattr(model, "classes_", []))
+        elif hasattr(model, "decision_function"):
+            # Fallback: turn scores into pseudo-probabilities
+            scores = np.asarray(model.decision_function(X), dtype=float)
+            if scores.ndim == 1: # Binary models return one score per row
+                scores = np.column_stack([-scores, scores])
+            # Softmax
+            exps = np.exp(scores - scores.max(axis=1, keepdims=True))
+            probs = exps / exps.sum(axis=1, keepdims=True)
+            classes = list(getattr(model, "classes_", []))
+
+        return y_pred, probs, classes
 
         # y_pred = model.predict([text])[0] # Runs classification on the tect input, 
         # top = [] # To store the top k predictions(categoryies)
@@ -0,0 +1,192 @@
+# Backend/app/metrics.py
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Tuple
+
+# Small in-process timing layer: fixed-bucket histograms keyed by metric name and labels, rendered
+# as Prometheus text for /metrics or summarized as a dict for the retrain run summary. Recording a
+# value is a bisect over ~20 bucket bounds plus a few additions under a lock (about a microsecond),
+# cheap enough to leave on in production. PAI_METRICS=0 turns recording off.
+
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0) # Seconds, +Inf is implicit
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Per bucket (not cumulative), the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th value (the max for the +Inf bucket)."""
+        if self.count == 0:
+            return None
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+class _Timer:
+    """Context manager timing its block into one histogram (a class, cheaper than @contextmanager)."""
+    __slots__ = ("metrics", "key", "start")
+
+    def __init__(self, metrics: "Metrics", key):
+        self.metrics, self.key = metrics, key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._hists: Dict[Tuple[str, Labels], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        """Set the HELP line shown for name in the Prometheus output."""
+        self._help[name] = help_text
+
+    def _observe(self, key: Tuple[str, Labels], value: float):
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = Histogram()
+            hist.observe(value)
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Record one value (seconds) for name with the given labels."""
+        if self.enabled:
+            self._observe((name, tuple(sorted(labels.items()))), value)
+
+    def time(self, name: str, **labels: str):
+        """Context manager recording how long its block took: with METRICS.time("x", stage="y"): ..."""
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self, (name, tuple(sorted(labels.items()))))
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        """Per metric and label set: count, total, mean, max and bucket-based p50/p95/p99 (seconds)."""
+        with self._lock:
+            items = [(k, h.count, h.sum, h.max, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                     for k, h in self._hists.items()]
+        out: Dict[str, Any] = {}
+        for (name, labels), count, total, mx, p50, p95, p99 in sorted(items):
+            key = ",".join(f"{k}={v}" for k, v in labels) or "all"
+            out.setdefault(name, {})[key] = {"count": count, "total_seconds": total, "mean_seconds": total / count,
+                                             "max_seconds": mx, "p50_seconds": p50, "p95_seconds": p95, "p99_seconds": p99}
+        return out
+
+    def render(self, gauges: Iterable[Tuple[str, float, Dict[str, str]]] = (),
+               counters: Iterable[Tuple[str, float, Dict[str, str]]] = ()) -> str:
+        """Prometheus text exposition of every histogram plus the given (name, value, labels) gauges and
+        counters (values that only go up, named with a _total suffix so rate() handles restarts)."""
+        with self._lock:
+            snap = [(name, labels, list(h.counts), h.sum, h.count, h.buckets) for (name, labels), h in self._hists.items()]
+        lines, described = [], set()
+        for name, labels, counts, total, count, buckets in sorted(snap):
+            if name not in described:
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                described.add(name)
+            cumulative = 0
+            for bound, c in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_fmt_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {total}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+        for kind, name, value, labels in [("gauge", *g) for g in gauges] + [("counter", *c) for c in counters]:
+            if value is None:
+                continue
+            if name not in described:
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+            lines.append(f"{name}{_fmt_labels(tuple(sorted(labels.items())))} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _fmt_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware timing every HTTP request by route template, method and status."""
+
+    def __init__(self, app, metrics: "Metrics", name: str = "pai_http_request_seconds"):
+        self.app, self.metrics, self.name = app, metrics, name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route") # Set by the router, the template keeps label values bounded
+            self.metrics.observe(self.name, time.perf_counter() - start, path=getattr(route, "path", "unmatched"),
+                                 method=scope["method"], status=str(status["code"]))
+
+
+METRICS = Metrics(enabled=os.getenv("PAI_METRICS", "1") != "0") # Process-wide instance used by the API and the trainer
+METRICS.describe("pai_predict_stage_seconds", "Time spent in each stage of ModelStore.predict_many")
+METRICS.describe("pai_http_request_seconds", "HTTP request duration by route, method and status")
+METRICS.describe("pai_model_reload_seconds", "Load and warm-up time of model reloads")
+METRICS.describe("pai_train_stage_seconds", "Time spent in each stage of a retrain run")
+METRICS.describe("pai_batch_seconds", "Scoring time of micro-batched /predict rows by batch size")
+METRICS.describe("pai_file_stage_seconds", "Time per chunk of /predict/file uploads spent parsing, scoring and writing")
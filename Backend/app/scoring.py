@@ -0,0 +1,143 @@
+# Backend/app/scoring.py
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from scipy import sparse
+from scipy.special import expit
+
+# Compiled inference for bare linear classifiers (SGDClassifier). The weights are pulled out of the
+# model once when it loads, then every call does one sparse·dense product and one probability pass.
+
+
+def top_k_indices(probs: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k largest values per row, highest first. Uses a partial sort so
+    only the k winners get ordered; ties keep class order like a stable full sort would."""
+    n_classes = probs.shape[1]
+    if k >= n_classes:
+        return np.argsort(-probs, axis=1, kind="stable")
+    part = np.argpartition(-probs, k - 1, axis=1)[:, :k] # Unordered k largest per row
+    part.sort(axis=1) # Class order first, so the stable sort below breaks ties the same way
+    order = np.argsort(-np.take_along_axis(probs, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class LinearScorer:
+    """Scores hashed feature rows straight from coef_, intercept_ and classes_ of a fitted linear model.
+    Gives the same predictions and probabilities as the sklearn methods, computed once per call."""
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray, loss: str | None):
+        self.coef = coef # (n_classes, n_features), or (1, n_features) for a binary model
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.loss = loss # Decides how scores become probabilities, same as the estimator's predict_proba
+
+    @classmethod
+    def from_model(cls, model: Any) -> "LinearScorer | None":
+        """Build a scorer for a bare fitted linear classifier, None for anything else (e.g. a Pipeline)."""
+        if hasattr(model, "steps") or not all(hasattr(model, a) for a in ("coef_", "intercept_", "classes_")):
+            return None
+        loss = getattr(model, "loss", None)
+        if not hasattr(model, "predict_proba"): # e.g. hinge loss, the store falls back to a softmax of the scores
+            loss = None
+        return cls(model.coef_, model.intercept_, model.classes_, loss)
+
+    def decision_function(self, X: sparse.csr_matrix) -> np.ndarray:
+        """Raw class scores, X·coefᵀ + intercept. Only the weight columns of X's non-zero features are read."""
+        X = sparse.csr_matrix(X)
+        # Gather the weights of the non-zero features and let one CSR product sum them per row.
+        # This never touches (or copies) the full coef matrix, which sklearn's path does on every call.
+        return self._scores(X, self.coef[:, X.indices].T) # (nnz, n_classes) picked weights
+
+    def weights_info(self) -> Dict[str, Any]:
+        """Layout, precision and size of the weights served."""
+        return {"layout": "dense", "dtype": str(self.coef.dtype), "features": int(self.coef.shape[1]),
+                "mb": round(self.coef.nbytes / 2**20, 1)}
+
+    def _scores(self, X: sparse.csr_matrix, picked: np.ndarray) -> np.ndarray:
+        """Sum the gathered (nnz, n_classes) weights per row of X, plus the intercept."""
+        selector = sparse.csr_matrix((X.data, np.arange(X.nnz), X.indptr), shape=(X.shape[0], X.nnz))
+        scores = selector @ picked + self.intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_proba(self, scores: np.ndarray) -> np.ndarray:
+        """Turn decision scores into probabilities exactly like SGDClassifier.predict_proba."""
+        scores = np.array(scores, dtype=np.float64) # Copy, the caller may still need the raw scores
+        binary = scores.ndim == 1
+        if self.loss == "log_loss":
+            prob = expit(scores) # OvR logistic
+        elif self.loss == "modified_huber":
+            prob = (np.clip(scores, -1, 1) + 1.0) / 2.0
+        else: # No probabilistic loss: softmax of the scores as pseudo-probabilities
+            if binary:
+                scores = np.column_stack([-scores, scores])
+            exps = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return exps / exps.sum(axis=1, keepdims=True)
+
+        if binary:
+            return np.column_stack([1.0 - prob, prob])
+        # OvR normalization, rows that are all zero become uniform
+        prob_sum = prob.sum(axis=1)
+        all_zero = prob_sum == 0
+        if np.any(all_zero):
+            prob[all_zero, :] = 1
+            prob_sum[all_zero] = prob.shape[1]
+        return prob / prob_sum[:, None]
+
+    def predict(self, scores: np.ndarray) -> np.ndarray:
+        """Class labels from decision scores, same rule as sklearn's LinearClassifierMixin.predict."""
+        indices = (scores > 0).astype(int) if scores.ndim == 1 else scores.argmax(axis=1)
+        return self.classes[indices]
+
+    def score(self, X: sparse.csr_matrix, top_k: int) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """Predicted label and top-k (label, probability) pairs for every row of X."""
+        scores = self.decision_function(X)
+        return self.rank(self.predict(scores), self.predict_proba(scores), top_k)
+
+    def rank(self, labels: np.ndarray, probs: np.ndarray, top_k: int) -> List[Tuple[str, List[Tuple[str, float]]]]:
+        """Pair each predicted label with its top-k (label, probability) pairs."""
+        order = top_k_indices(probs, top_k)
+        classes = [str(c) for c in self.classes]
+        return [
+            (str(label), [(classes[j], float(probs[row, j])) for j in idx])
+            for row, (label, idx) in enumerate(zip(labels, order))
+        ]
+
+
+class CompactScorer(LinearScorer):
+    """LinearScorer over a compacted model: only the weight rows of the hashed features that are
+    active (non-zero after pruning) are stored. columns[i] is the hashed index of coef_t[i], and
+    coef_t has one extra all-zero row last that every other feature maps to, so pruned features and
+    features never seen in training score zero like their weights did."""
+
+    def __init__(self, columns: np.ndarray, coef_t: np.ndarray, intercept: np.ndarray, classes: np.ndarray,
+                 loss: str | None, n_features: int):
+        super().__init__(coef_t[:-1].T, intercept, classes, loss)
+        self.columns = columns # Sorted hashed feature indices, (n_active,)
+        self.coef_t = coef_t # (n_active + 1, n_classes), float32 or float64
+        self.n_features = n_features
+        # Hashed index -> compact row, a direct table (4 bytes per hashed feature, built once at load)
+        # is several times faster per lookup than a binary search over columns
+        self.remap = np.full(n_features, len(columns), dtype=np.int32)
+        self.remap[columns] = np.arange(len(columns), dtype=np.int32)
+
+    @classmethod
+    def from_model(cls, model: Any) -> "CompactScorer | None":
+        """Compact copy of a fitted linear model's weights, only the features some class has a
+        non-zero weight for. Exact (float64), and a fraction of a dense copy for hashed text."""
+        dense = LinearScorer.from_model(model)
+        if dense is None:
+            return None
+        coef = np.asarray(dense.coef, dtype=np.float64)
+        columns = np.flatnonzero(np.any(coef != 0, axis=0)).astype(np.int32)
+        coef_t = np.zeros((len(columns) + 1, coef.shape[0]), dtype=np.float64)
+        coef_t[:-1] = coef[:, columns].T
+        return cls(columns, coef_t, np.array(dense.intercept), np.array(dense.classes), dense.loss, coef.shape[1])
+
+    def decision_function(self, X: sparse.csr_matrix) -> np.ndarray:
+        """Raw class scores, X's hashed indices are mapped to compact rows through the remap table."""
+        X = sparse.csr_matrix(X)
+        picked = np.asarray(self.coef_t[self.remap[X.indices]], dtype=np.float64) # float64 products are faster than mixed
+        return self._scores(X, picked)
+
+    def weights_info(self) -> Dict[str, Any]:
+        return {"layout": "compact", "dtype": str(self.coef_t.dtype), "features": int(self.n_features),
+                "active_features": len(self.columns), "mb": round((self.coef_t.nbytes + self.remap.nbytes) / 2**20, 1)}
@@ -0,0 +1,46 @@
+# Backend/bench/_common.py
+# Shared helpers for the benchmark scripts. Run them from Backend/, e.g. `python bench/bench_predict_batch.py`.
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent # Backend/
+if str(ROOT) not in sys.path: # Scripts run from bench/, make app/ and ML/ importable
+    sys.path.insert(0, str(ROOT))
+
+TRAINING_CSV = ROOT.parent / "data" / "training_data.csv" # Default corpus the benchmarks train and score on
+
+
+def bench_models_dir() -> Path:
+    """Temporary models directory so benchmarks never touch ML/saved_models."""
+    return Path(tempfile.mkdtemp(prefix="pai_bench_models_"))
+
+
+def train_bench_model(models_dir: Path, csv_path: Path = TRAINING_CSV):
+    """Train a model on csv_path into models_dir using the normal retrain code path."""
+    from ML.retrain_ml_model import load_data, train_or_update_model
+    from ML.seen_store import SeenStore
+
+    df = load_data(str(csv_path))
+    model, _, _ = train_or_update_model(
+        df=df, outdir=str(models_dir), model_name="bill_category_model.joblib", seen=SeenStore(),
+        batch_size=2048, test_size=0.2, random_state=42,
+    )
+    return model, df
+
+
+def sample_rows(df, n: int):
+    """Return n (vendor, description) pairs, cycling through the data frame."""
+    pairs = list(zip(df["vendor"], df["description"]))
+    return [pairs[i % len(pairs)] for i in range(n)]
+
+
+def timed(fn, repeat: int = 3) -> float:
+    """Best wall-clock time in seconds over `repeat` runs of fn()."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
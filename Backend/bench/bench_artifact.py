@@ -0,0 +1,78 @@
+# Backend/bench/bench_artifact.py
+# Cold-start load time and memory per API worker: joblib.load versus the memory-mapped artifact.
+# Every measurement runs in fresh worker processes (started together, like uvicorn --workers N)
+# that open the same model, score a batch of rows and report their own load time and memory.
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from _common import ROOT, bench_models_dir, sample_rows, train_bench_model # Also puts Backend/ on sys.path
+
+WORKER = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from app.interface import ModelStore
+
+def memory():
+    # Linux: resident memory, the part of it that is file-backed (shareable page cache) and PSS,
+    # the resident memory with shared pages split between the processes sharing them
+    out = {}
+    for line in open("/proc/self/status"):
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "RssAnon", "RssFile"):
+            out[key] = int(value.split()[0]) / 1024
+    try:
+        for line in open("/proc/self/smaps_rollup"):
+            if line.startswith("Pss:"):
+                out["Pss"] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return out
+
+rows = json.loads(sys.argv[4])
+start = time.perf_counter()
+store = ModelStore(sys.argv[2], watch_interval=3600, prefer_artifacts=sys.argv[3] == "artifact")
+load = time.perf_counter() - start
+store.predict_many(rows)
+input() # Wait until every worker has loaded, so PSS reflects the sharing
+print(json.dumps({"load_seconds": load, "format": store.stats()["model_format"], **memory()}), flush=True)
+"""
+
+
+def run_workers(models_dir: Path, fmt: str, workers: int, rows) -> list:
+    procs = [subprocess.Popen([sys.executable, "-c", WORKER, str(ROOT), str(models_dir), fmt, json.dumps(rows)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    # Let every worker finish loading before any of them reports and exits
+    outs = []
+    for p in procs:
+        p.stdin.flush()
+    for p in procs:
+        out, _ = p.communicate("\n")
+        outs.append(json.loads(out.strip().splitlines()[-1]))
+    return outs
+
+
+def main():
+    p = argparse.ArgumentParser(description="Model load time and per-worker memory: joblib vs artifact")
+    p.add_argument("--workers", type=int, default=4, help="Worker processes started together")
+    p.add_argument("--rows", type=int, default=1000, help="Rows each worker scores after loading")
+    args = p.parse_args()
+
+    models_dir = bench_models_dir()
+    _, df = train_bench_model(models_dir) # Writes the .joblib files and the artifact
+    rows = sample_rows(df, args.rows)
+    sizes = {f.suffix: f.stat().st_size / 2**20 for f in models_dir.glob("bill_category_model.*")}
+    print(f"joblib {sizes.get('.joblib', 0):.0f} MB, artifact {sizes.get('.linmodel', 0):.0f} MB on disk")
+
+    for fmt in ("joblib", "artifact"):
+        results = run_workers(models_dir, fmt, args.workers, rows)
+        mean = lambda k: sum(r.get(k, 0) for r in results) / len(results)
+        print(f"{fmt:>9} ({results[0]['format']}), {args.workers} workers: load {mean('load_seconds') * 1000:8.1f} ms  "
+              f"RSS {mean('VmRSS'):6.0f} MB  (anon {mean('RssAnon'):6.0f}, file {mean('RssFile'):6.0f})  "
+              f"PSS {mean('Pss'):6.0f} MB per worker")
+
+
+if __name__ == "__main__":
+    main()
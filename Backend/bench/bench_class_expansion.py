@@ -0,0 +1,67 @@
+# Backend/bench/bench_class_expansion.py
+# Registering a new category: growing the trained model in place versus a full refit.
+# Trains on the corpus without one category, then adds that category's rows both ways and
+# compares the time taken and the accuracy on a held-out split (overall, old classes, new class).
+import argparse
+import tempfile
+import time
+
+from _common import TRAINING_CSV # Also puts Backend/ on sys.path
+
+
+def accuracy(model, vectorizer, df):
+    if len(df) == 0:
+        return float("nan")
+    return float((model.predict(vectorizer.transform(df["text"].values)) == df["category"].values).mean())
+
+
+def timed_update(df, outdir, seed, **kwargs):
+    """Run the normal retrain code path on df in outdir, returning (seconds, model)."""
+    from ML.retrain_ml_model import train_or_update_model
+    from ML.seen_store import SeenStore
+
+    start = time.perf_counter()
+    model, _, _ = train_or_update_model(
+        df=df, outdir=outdir, model_name="bill_category_model.joblib", seen=SeenStore(f"{outdir}/seen_ids"),
+        batch_size=2048, test_size=0.2, random_state=seed, **kwargs,
+    )
+    return time.perf_counter() - start, model
+
+
+def main():
+    p = argparse.ArgumentParser(description="New category registration: expand vs full refit")
+    p.add_argument("--csv", default=str(TRAINING_CSV))
+    p.add_argument("--category", default=None, help="Category held back from the first training run (default: the rarest)")
+    p.add_argument("--replay_rows", type=int, default=10_000)
+    p.add_argument("--random_state", type=int, default=42)
+    args = p.parse_args()
+
+    import shutil
+    from sklearn.model_selection import train_test_split
+    from ML.retrain_ml_model import build_vectorizer, load_data, train_or_update_model
+    from ML.seen_store import SeenStore
+
+    df = load_data(args.csv)
+    category = args.category or df["category"].value_counts().index[-1]
+    train, test = train_test_split(df, test_size=0.2, random_state=args.random_state)
+    base_df = train[train["category"] != category]
+    print(f"{len(train):,} training rows, holding back {category!r} ({int((train['category'] == category).sum()):,} rows)")
+
+    base_dir = tempfile.mkdtemp(prefix="pai_bench_expand_")
+    seen = SeenStore(f"{base_dir}/seen_ids")
+    train_or_update_model(df=base_df, outdir=base_dir, model_name="bill_category_model.joblib", seen=seen,
+                          batch_size=2048, test_size=0.2, random_state=args.random_state)
+    seen.save()
+
+    vectorizer = build_vectorizer()
+    old, new = test[test["category"] != category], test[test["category"] == category]
+    for label, kwargs in (("expand", {"replay_rows": args.replay_rows}), ("full refit", {"refit_on_new_classes": True})):
+        outdir = tempfile.mkdtemp(prefix="pai_bench_expand_")
+        shutil.copytree(base_dir, outdir, dirs_exist_ok=True) # Every variant starts from the same trained model
+        seconds, model = timed_update(train, outdir, args.random_state, **kwargs)
+        print(f"{label:>10}: {seconds:7.1f}s  accuracy {accuracy(model, vectorizer, test):.4f}  "
+              f"old classes {accuracy(model, vectorizer, old):.4f}  {category} {accuracy(model, vectorizer, new):.4f}")
+
+
+if __name__ == "__main__":
+    main()
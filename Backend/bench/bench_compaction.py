@@ -0,0 +1,91 @@
+# Backend/bench/bench_compaction.py
+# Compacted artifacts against the full model: file size, load time, scoring latency, and accuracy
+# and agreement on rows the model never saw. Variants: the dense float64 artifact, the compact
+# layout in float64 and float32, and compact float32 with near-zero feature rows pruned.
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from _common import ROOT, bench_models_dir
+
+VARIANTS = [
+    ("dense f64", dict(layout="dense", dtype="float64")),
+    ("compact f64", dict(layout="compact", dtype="float64")),
+    ("compact f32", dict(layout="compact", dtype="float32")),
+    ("compact f32 prune 1e-3", dict(layout="compact", dtype="float32", prune=1e-3)),
+    ("compact f32 prune 1e-2", dict(layout="compact", dtype="float32", prune=1e-2)),
+]
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser(description="Size, load time, latency and accuracy of compacted artifacts")
+    p.add_argument("--rows", type=int, default=200_000, help="Generated training rows")
+    p.add_argument("--categories", type=int, default=40)
+    p.add_argument("--vendors", type=int, default=60, help="Vendors per category")
+    p.add_argument("--eval_rows", type=int, default=20_000, help="Generated rows (another seed) scored for accuracy")
+    p.add_argument("--single_calls", type=int, default=2000)
+    args = p.parse_args()
+
+    from app.artifact import export_artifact, load_artifact
+    from ML.retrain_ml_model import build_vectorizer, load_data
+
+    sys.path.insert(0, str(ROOT.parent / "data"))
+    from gen_training_csv import generate_rows, write_csv
+
+    work = bench_models_dir()
+    train_csv, eval_csv = work / "train.csv", work / "eval.csv"
+    write_csv(train_csv, generate_rows(args.rows, args.categories, args.vendors, seed=11))
+    write_csv(eval_csv, generate_rows(args.eval_rows, args.categories, args.vendors, seed=12))
+    subprocess.run([sys.executable, str(ROOT / "ML" / "retrain_ml_model.py"), "--csv", str(train_csv), "--outdir", str(work),
+                    "--stream", "--holdout_fraction", "0", "--vendor_index", "", "--summary_json", ""],
+                   check=True, stdout=subprocess.DEVNULL)
+    model = joblib.load(work / "bill_category_model.joblib")
+    vectorizer = build_vectorizer()
+    df = load_data(str(eval_csv))
+    X, y = vectorizer.transform(df["text"].values), df["category"].values
+    singles = [X[i] for i in range(min(args.single_calls, X.shape[0]))]
+
+    full_pred = model.predict(X)
+    full_proba = model.predict_proba(X)
+    active = int((np.abs(model.coef_).max(axis=0) > 0).sum())
+    print(f"Model: {model.coef_.shape[0]} classes x {model.coef_.shape[1]:,} hashed features, "
+          f"{active:,} active ({active / model.coef_.shape[1]:.1%}); sklearn accuracy {np.mean(full_pred == y):.4f}")
+    print(f"{'variant':<24} {'MB':>7} {'load ms':>8} {'mmap ms':>8} {'accuracy':>9} {'delta':>8} {'agree':>7} "
+          f"{'max |dp|':>9} {'batch r/s':>10} {'1-row us':>9}")
+    for name, opts in VARIANTS:
+        path = export_artifact(model, Path(work) / f"{name.replace(' ', '_')}.linmodel", vectorizer, **opts)
+        size = path.stat().st_size / 2**20
+        load = best_of(lambda: load_artifact(path, mmap=False))
+        mapped = best_of(lambda: load_artifact(path, mmap=True))
+        scorer, _ = load_artifact(path, mmap=True)
+        scores = scorer.decision_function(X)
+        pred, proba = scorer.predict(scores), scorer.predict_proba(scores)
+        batch = best_of(lambda: scorer.score(X, 3), repeat=3)
+        single = []
+        for row in singles:
+            start = time.perf_counter()
+            scorer.score(row, 3)
+            single.append(time.perf_counter() - start)
+        acc = np.mean(pred == y)
+        print(f"{name:<24} {size:>7.1f} {load * 1000:>8.1f} {mapped * 1000:>8.2f} {acc:>9.4f} "
+              f"{acc - np.mean(full_pred == y):>+8.4f} {np.mean(pred == full_pred):>7.2%} "
+              f"{np.abs(proba - full_proba).max():>9.2e} {X.shape[0] / batch:>10,.0f} "
+              f"{np.percentile(np.asarray(single) * 1e6, 50):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Backend/bench/bench_file_predict.py
+# /predict/file: rows/sec and peak memory of FileScorer for growing CSV exports, against the one
+# /predict call per row clients make today. Every file size runs in its own process so its peak
+# RSS is its own; flat memory means the peak doesn't grow with the file. The exports use bank
+# style headers (Supplier, Memo) to go through the synonym mapping too.
+import argparse
+import csv
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from _common import ROOT, bench_models_dir
+
+
+def child(csv_path: str, models_dir: str, chunk_rows: int, single_rows: int):
+    """Score one file into a sink, print rows, seconds, peak RSS growth and the per-row baseline."""
+    from app.interface import ModelStore
+    from api.file_scoring import FileScorer
+    from ML.retrain_ml_model import peak_rss_mb
+
+    store = ModelStore(models_dir, watch_interval=3600)
+    base_rss = peak_rss_mb()
+    scorer = FileScorer(store, chunk_rows=chunk_rows)
+    out_bytes = 0
+    with open(csv_path, "rb") as f:
+        start = time.perf_counter()
+        for piece in scorer.annotate(f):
+            out_bytes += len(piece) # Sent to the client, never kept
+        seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+
+    with open(csv_path, "r", encoding="utf-8") as f:
+        rows = list(csv.reader(f))[1:single_rows + 1]
+    start = time.perf_counter()
+    for _, supplier, memo, _ in rows:
+        store.predict(supplier, memo, top_k=3) # What a /predict call per row does, without the HTTP cost
+    single = len(rows) / (time.perf_counter() - start)
+    print(scorer.rows, seconds, (peak - base_rss) if peak and base_rss else -1, single, out_bytes)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Throughput and memory of the bulk file endpoint")
+    p.add_argument("--sizes", default="20000,100000,400000", help="Rows per generated export")
+    p.add_argument("--chunk_rows", type=int, default=2000)
+    p.add_argument("--single_rows", type=int, default=3000, help="Rows scored one predict call at a time for the baseline")
+    p.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], args.chunk_rows, args.single_rows)
+        return
+
+    sys.path.insert(0, str(ROOT.parent / "data"))
+    from gen_training_csv import generate_rows, write_csv
+
+    work = bench_models_dir()
+    train_csv = work / "train.csv"
+    write_csv(train_csv, generate_rows(100_000, seed=3))
+    subprocess.run([sys.executable, str(ROOT / "ML" / "retrain_ml_model.py"), "--csv", str(train_csv), "--outdir", str(work),
+                    "--stream", "--feedback_csv", "", "--summary_json", ""], check=True, stdout=subprocess.DEVNULL)
+
+    print(f"{'rows':>8} {'file MB':>8} {'seconds':>8} {'rows/sec':>10} {'peak RSS +MB':>13} {'per-call rows/sec':>18}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        export = Path(work) / f"export_{n}.csv"
+        with open(export, "w", newline="", encoding="utf-8") as f: # Unseen rows, bank export headers
+            w = csv.writer(f)
+            w.writerow(["Date", "Supplier", "Memo", "Amount"])
+            w.writerows([day, vendor, description, amount] for vendor, description, _, day, amount in generate_rows(n, seed=n))
+        out = subprocess.run([sys.executable, __file__, "--child", str(export), str(work), "--chunk_rows", str(args.chunk_rows),
+                              "--single_rows", str(args.single_rows)], check=True, capture_output=True, text=True).stdout
+        scored, seconds, rss, single, _ = out.strip().splitlines()[-1].split()
+        scored, seconds = int(scored), float(seconds)
+        print(f"{scored:>8} {export.stat().st_size / 2**20:>8.1f} {seconds:>8.2f} {scored / seconds:>10,.0f} "
+              f"{float(rss):>13.0f} {float(single):>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Backend/bench/bench_import_time.py
+# Import and start-up time of the serving modules, each measured in a fresh interpreter (best of
+# --repeat runs), and a guard against regressions: it exits with status 1 when an import takes
+# longer than --max_ms or pulls in a training-only module (scikit-learn, pandas, joblib, the
+# trainer). It also checks that app/features.py hashes texts exactly like the trainer's
+# HashingVectorizer, the serving path depends on both producing the same matrix.
+#   python bench/bench_import_time.py
+#   python bench/bench_import_time.py --max_ms 800 --skip_startup
+import argparse
+import json
+import subprocess
+import sys
+
+from _common import ROOT, TRAINING_CSV, bench_models_dir
+
+MODULES = ["app.interface", "api.file_scoring", "api.online_learner", "api.feedback_writer", "app.batcher"]
+FORBIDDEN = ["sklearn", "pandas", "joblib", "ML.retrain_ml_model"] # Training-only, loaded lazily if at all
+
+_IMPORT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+_STARTUP = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app.interface import ModelStore
+imported = time.perf_counter() - start
+store = ModelStore({models_dir!r}, watch_interval=3600)
+store.predict("Toronto Hydro", "monthly bill", top_k=3)
+print(json.dumps({{"import": imported, "ready": time.perf_counter() - start}}))
+"""
+
+
+def run(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def time_import(module: str, repeat: int) -> dict:
+    runs = [run(_IMPORT.format(root=str(ROOT), module=module, forbidden=FORBIDDEN)) for _ in range(repeat)]
+    return {"ms": min(r["seconds"] for r in runs) * 1000, "loaded": runs[0]["loaded"]}
+
+
+def check_features(rows: int) -> int:
+    """Rows whose HashingFeatures output differs from HashingVectorizer's (0 expected), for every
+    vectorizer setting the tuner searches."""
+    import numpy as np
+    from app.artifact import vectorizer_config
+    from app.features import build_features, same_features
+    from ML.retrain_ml_model import build_vectorizer, load_data
+
+    texts = list(load_data(str(TRAINING_CSV))["text"].values[:rows])
+    texts += ["", "a", "Café Crème #12 — naïve 東京 tabs\tand\nnewlines", "x" * 37, "über straße ÜBER"]
+    bad = 0
+    for settings in ({"n_features": 2**20, "ngram_range": [1, 2]}, {"n_features": 2**18, "ngram_range": [1, 1]},
+                     {"n_features": 1000, "ngram_range": [1, 3]}):
+        ours, theirs = build_features(settings), build_vectorizer(settings)
+        if not same_features(vectorizer_config(ours), vectorizer_config(theirs)):
+            print(f"  config differs for {settings}")
+            bad += len(texts)
+            continue
+        A, B = ours.transform(texts), theirs.transform(texts)
+        same = (np.array_equal(A.indptr, B.indptr) and np.array_equal(A.indices, B.indices)
+                and np.array_equal(A.data, B.data))
+        if not same:
+            bad += int((abs(A - B).sum(axis=1) > 0).sum()) or len(texts)
+    return bad
+
+
+def main():
+    p = argparse.ArgumentParser(description="Import time of the serving modules, with a regression guard")
+    p.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module, the best run counts")
+    p.add_argument("--max_ms", type=float, default=1000.0, help="Budget for importing any one module")
+    p.add_argument("--rows", type=int, default=20_000, help="Training rows compared against HashingVectorizer")
+    p.add_argument("--skip_startup", action="store_true", help="Don't train a model to time a store's start-up")
+    args = p.parse_args()
+
+    failed = False
+    print(f"{'module':<22} {'import ms':>10}  training-only modules loaded")
+    for module in MODULES:
+        r = time_import(module, args.repeat)
+        over = r["ms"] > args.max_ms
+        failed |= over or bool(r["loaded"])
+        print(f"{module:<22} {r['ms']:>10.0f}  {', '.join(r['loaded']) or '-'}{'  OVER BUDGET' if over else ''}")
+
+    if not args.skip_startup:
+        work = bench_models_dir()
+        subprocess.run([sys.executable, str(ROOT / "ML" / "retrain_ml_model.py"), "--csv", str(TRAINING_CSV), "--outdir", str(work),
+                        "--feedback_csv", "", "--summary_json", ""], check=True, stdout=subprocess.DEVNULL)
+        runs = [run(_STARTUP.format(root=str(ROOT), models_dir=str(work))) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["ready"])
+        print(f"Store start-up (import, load the artifact, first prediction): {best['ready'] * 1000:.0f} ms "
+              f"({best['import'] * 1000:.0f} ms of it importing)")
+
+    bad = check_features(args.rows)
+    print(f"HashingFeatures vs HashingVectorizer: {'identical' if bad == 0 else f'{bad} rows differ'}")
+    failed |= bad > 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
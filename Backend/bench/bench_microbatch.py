@@ -0,0 +1,142 @@
+# Backend/bench/bench_microbatch.py
+# /predict throughput and tail latency at several concurrency levels: the plain handler (one
+# store.predict per request in the threadpool) against the micro-batched one. The server runs
+# in its own process under uvicorn, the client is an asyncio loop keeping N requests open.
+import argparse
+import asyncio
+import json
+import time
+from multiprocessing import get_context
+from typing import List, Tuple
+
+import numpy as np
+
+from _common import bench_models_dir, sample_rows, train_bench_model # Also puts Backend/ on sys.path
+
+
+def serve(models_dir: str, port: int, max_wait_ms: float, max_batch: int):
+    """Server process: the two /predict variants over one ModelStore."""
+    from contextlib import asynccontextmanager
+
+    import uvicorn
+    from fastapi import FastAPI
+    from pydantic import BaseModel
+
+    from app.batcher import MicroBatcher
+    from app.interface import ModelStore
+
+    class PredictIn(BaseModel): # Same shapes as api/predict_api.py, importing it would load ML/saved_models
+        vendor: str
+        description: str
+
+    class PredictOut(BaseModel):
+        category: str
+        top: List[Tuple[str, float]]
+
+    store = ModelStore(models_dir, watch_interval=3600)
+    batcher = MicroBatcher(store, max_wait_ms=max_wait_ms, max_batch=max_batch)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        batcher.start()
+        yield
+        await batcher.close()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/predict/plain", response_model=PredictOut)
+    def plain(payload: PredictIn): # The handler as it was: sync, runs in the threadpool
+        cat, top = store.predict(payload.vendor, payload.description, top_k=3)
+        return PredictOut(category=cat, top=top)
+
+    @app.post("/predict/batched", response_model=PredictOut)
+    async def batched(payload: PredictIn):
+        cat, top = await batcher.predict(payload.vendor, payload.description, top_k=3)
+        return PredictOut(category=cat, top=top)
+
+    @app.get("/batches")
+    def batches():
+        return batcher.stats()
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def load(port: int, path: str, rows, concurrency: int, seconds: float):
+    """Keep concurrency requests in flight for seconds, returns the per-request latencies. Plain
+    keep-alive HTTP/1.1 over asyncio streams, a full client library would cost more CPU than the server."""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def worker(offset: int):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        i = offset
+        try:
+            while time.perf_counter() < deadline:
+                vendor, description = rows[i % len(rows)]
+                body = json.dumps({"vendor": vendor, "description": description}).encode()
+                start = time.perf_counter()
+                writer.write(f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(next(line.split(b":")[1] for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")))
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - start)
+                if not head.startswith(b"HTTP/1.1 200"):
+                    raise RuntimeError(head.split(b"\r\n")[0].decode())
+                i += concurrency
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+    return latencies
+
+
+def wait_ready(base: str, timeout: float = 60.0):
+    import httpx
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(base + "/batches", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Plain vs micro-batched /predict under concurrent load")
+    p.add_argument("--concurrency", default="1,8,32,128,256", help="Comma separated numbers of requests in flight")
+    p.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+    p.add_argument("--max_wait_ms", type=float, default=0.0)
+    p.add_argument("--max_batch", type=int, default=64)
+    p.add_argument("--port", type=int, default=8765)
+    args = p.parse_args()
+
+    import httpx
+
+    models_dir = bench_models_dir()
+    _, df = train_bench_model(models_dir)
+    rows = sample_rows(df, 5000)
+    base = f"http://127.0.0.1:{args.port}"
+    server = get_context("spawn").Process(target=serve, args=(str(models_dir), args.port, args.max_wait_ms, args.max_batch), daemon=True)
+    server.start()
+    try:
+        wait_ready(base)
+        print(f"{'concurrency':>11} {'handler':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean batch':>10}")
+        for n in (int(c) for c in args.concurrency.split(",")):
+            for mode in ("plain", "batched"):
+                before = httpx.get(base + "/batches").json()
+                lat = asyncio.run(load(args.port, f"/predict/{mode}", rows, n, args.seconds))
+                after = httpx.get(base + "/batches").json()
+                ms = np.asarray(lat) * 1000.0
+                batches = after["batches"] - before["batches"]
+                mean_batch = (after["rows"] - before["rows"]) / batches if batches else float("nan")
+                print(f"{n:>11} {mode:>8} {len(lat) / args.seconds:>9,.0f} {np.percentile(ms, 50):>8.2f} "
+                      f"{np.percentile(ms, 95):>8.2f} {np.percentile(ms, 99):>8.2f} {mean_batch:>10.1f}")
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Backend/bench/bench_online_learning.py
+# Online learning from feedback: /predict-path latency while corrections are being learned and
+# published, and the time from a correction being submitted to the model serving it.
+import argparse
+import threading
+import time
+
+from _common import bench_models_dir, sample_rows, train_bench_model # Also puts Backend/ on sys.path
+from bench_reload import percentiles, run_requests
+
+
+def main():
+    p = argparse.ArgumentParser(description="Serving latency and feedback-to-model time with online learning")
+    p.add_argument("--seconds", type=float, default=5.0, help="Duration of each phase")
+    p.add_argument("--feedback_per_sec", type=float, default=50.0, help="Corrections submitted per second")
+    p.add_argument("--publish_rows", type=int, default=50)
+    p.add_argument("--publish_interval", type=float, default=1.0)
+    args = p.parse_args()
+
+    from api.online_learner import OnlineLearner
+    from app.interface import ModelStore
+
+    models_dir = bench_models_dir()
+    _, df = train_bench_model(models_dir)
+    rows = sample_rows(df, 1000)
+    corrections = list(zip(df["vendor"], df["description"], df["category"]))
+    store = ModelStore(models_dir, watch_interval=3600)
+    learner = OnlineLearner(store, publish_rows=args.publish_rows, publish_interval=args.publish_interval)
+    learner.start()
+
+    idle = run_requests(store, rows, args.seconds)
+
+    stop = threading.Event()
+
+    def send_feedback():
+        i = 0
+        while not stop.is_set():
+            learner.submit(*corrections[i % len(corrections)])
+            i += 1
+            time.sleep(1.0 / args.feedback_per_sec)
+
+    sender = threading.Thread(target=send_feedback)
+    sender.start()
+    during = run_requests(store, rows, args.seconds)
+    stop.set()
+    sender.join()
+    learner.close()
+
+    for name, lat in (("idle", idle), ("while learning", during)):
+        pct = percentiles(lat)
+        print(f"{name:>15}: {len(lat):>7} calls  p50 {pct[50]:.3f} ms  p95 {pct[95]:.3f} ms  p99 {pct[99]:.3f} ms  "
+              f"max {max(lat) * 1000:.3f} ms")
+    s = learner.stats()
+    lat = s["feedback_to_model_seconds"]
+    print(f"learned {s['rows_learned']} rows in {s['publishes']} publishes, last fit+publish "
+          f"{s['last_publish_seconds'] * 1000:.0f} ms, feedback->model p50 {lat['p50']:.2f}s p95 {lat['p95']:.2f}s "
+          f"max {lat['max']:.2f}s, errors: {s['last_error']}, store version {store.version}")
+
+
+if __name__ == "__main__":
+    main()
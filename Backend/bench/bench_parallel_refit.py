@@ -0,0 +1,55 @@
+# Backend/bench/bench_parallel_refit.py
+# Full refit wall-clock time with vectorization pipelined across worker processes, and a check
+# that the trained weights match sequential training exactly.
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from _common import TRAINING_CSV # Also puts Backend/ on sys.path
+
+
+def synthetic_corpus(n: int, seed: int = 0) -> pd.DataFrame:
+    """n rows resampled from the training CSV, each with a random reference so texts differ."""
+    from ML.retrain_ml_model import load_data
+
+    base = load_data(str(TRAINING_CSV))
+    rng = np.random.default_rng(seed)
+    df = base.sample(n, replace=True, random_state=seed).reset_index(drop=True)
+    df["text"] = df["text"] + " ref " + pd.Series(rng.integers(0, 10**9, n)).astype(str)
+    return df[["text", "category"]]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Pipelined multi-process vectorization for _full_refit")
+    p.add_argument("--rows", type=int, default=2_000_000, help="Corpus size")
+    p.add_argument("--workers", default=f"1,2,4,{os.cpu_count()}", help="Comma separated worker counts")
+    p.add_argument("--batch_size", type=int, default=2048)
+    args = p.parse_args()
+
+    from ML.parallel_vectorize import VectorizePool
+    from ML.retrain_ml_model import _full_refit, build_vectorizer, new_model
+
+    df = synthetic_corpus(args.rows)
+    classes = np.unique(df["category"].values)
+    vectorizer = build_vectorizer()
+    print(f"{args.rows:,} rows, {os.cpu_count()} CPUs")
+
+    baseline = None
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        model = new_model(42)
+        start = time.perf_counter()
+        with VectorizePool(vectorizer, workers) as pool:
+            _full_refit(df, model, vectorizer, classes, args.batch_size, pool=pool)
+        seconds = time.perf_counter() - start
+        if baseline is None:
+            baseline = (seconds, model)
+        same = np.array_equal(model.coef_, baseline[1].coef_) and np.array_equal(model.intercept_, baseline[1].intercept_)
+        print(f"workers {workers:>3}: {seconds:8.1f}s  {args.rows / seconds:>10,.0f} rows/s  "
+              f"speedup {baseline[0] / seconds:4.2f}x  identical weights: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# Backend/bench/bench_predict_batch.py
+# Compares rows/sec of ModelStore.predict_many against looping ModelStore.predict.
+import argparse
+
+from _common import bench_models_dir, sample_rows, timed, train_bench_model # Also puts Backend/ on sys.path
+
+
+def main():
+    p = argparse.ArgumentParser(description="Batch vs per-row prediction throughput")
+    p.add_argument("--sizes", default="1,32,1000,10000", help="Comma separated batch sizes")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per measurement, best one is reported")
+    p.add_argument("--loop_cap", type=int, default=2000, help="Rows timed for the per-row loop, rows/sec is extrapolated")
+    args = p.parse_args()
+
+    from app.interface import ModelStore
+
+    models_dir = bench_models_dir()
+    _, df = train_bench_model(models_dir)
+    store = ModelStore(models_dir)
+
+    print(f"\n{'batch':>8} {'loop rows/s':>14} {'batch rows/s':>14} {'speedup':>9}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        rows = sample_rows(df, n)
+        loop_rows = rows[:args.loop_cap]
+        loop_t = timed(lambda: [store.predict(v, d) for v, d in loop_rows], args.repeat) * n / len(loop_rows)
+        batch_t = timed(lambda: store.predict_many(rows), args.repeat)
+        print(f"{n:>8} {n / loop_t:>14,.0f} {n / batch_t:>14,.0f} {loop_t / batch_t:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Backend/bench/bench_reload.py
+# Measures model reload time and /predict-path latency while new snapshots are being hot-loaded.
+import argparse
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from _common import bench_models_dir, sample_rows, train_bench_model # Also puts Backend/ on sys.path
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000.0
+    return {p: float(np.percentile(ms, p)) for p in (50, 95, 99)}
+
+
+def run_requests(store, rows, seconds):
+    """Call predict in a tight loop for `seconds`, return per-call latencies."""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        v, d = rows[i % len(rows)]
+        start = time.perf_counter()
+        store.predict(v, d)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies
+
+
+def main():
+    p = argparse.ArgumentParser(description="Hot-reload time and request latency during reloads")
+    p.add_argument("--seconds", type=float, default=5.0, help="Duration of each phase")
+    p.add_argument("--reloads", type=int, default=5, help="Snapshots dropped in during the reload phase")
+    p.add_argument("--interval", type=float, default=0.05, help="Watcher poll interval in seconds")
+    args = p.parse_args()
+
+    from app.artifact import artifact_path
+    from app.interface import ModelStore
+    from ML.registry import Registry
+
+    models_dir = bench_models_dir()
+    _, df = train_bench_model(models_dir)
+    rows = sample_rows(df, 1000)
+    store = ModelStore(models_dir, watch_interval=args.interval)
+    store.start_watcher()
+
+    idle = run_requests(store, rows, args.seconds)
+
+    src = models_dir / "bill_category_model.joblib"
+    if artifact_path(src).exists(): # The store serves artifacts first, drop those
+        src = artifact_path(src)
+    registry = Registry(models_dir)
+    reload_times = []
+
+    def drop_snapshots():
+        for i in range(args.reloads):
+            time.sleep(args.seconds / (args.reloads + 1))
+            before = store.reload_count
+            copy = models_dir / f"bill_categorizer_incremental_bench{i:03d}{src.suffix}"
+            shutil.copy(src, copy)
+            registry.register(copy) # Becomes the active version the watcher loads
+            while store.reload_count == before: # Wait for the watcher to publish it
+                time.sleep(0.001)
+            reload_times.append(store.last_reload_seconds)
+
+    dropper = threading.Thread(target=drop_snapshots)
+    dropper.start()
+    during = run_requests(store, rows, args.seconds)
+    dropper.join()
+    store.stop_watcher()
+
+    print(f"\nreloads: {len(reload_times)}, mean load+warm {np.mean(reload_times) * 1000:.1f} ms, "
+          f"max {np.max(reload_times) * 1000:.1f} ms")
+    for name, lat in (("idle", idle), ("during reloads", during)):
+        pct = percentiles(lat)
+        print(f"{name:>15}: {len(lat):>7} calls  p50 {pct[50]:.3f} ms  p95 {pct[95]:.3f} ms  p99 {pct[99]:.3f} ms  "
+              f"max {max(lat) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
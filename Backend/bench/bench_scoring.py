@@ -0,0 +1,52 @@
+# Backend/bench/bench_scoring.py
+# Compares the compiled LinearScorer with the sklearn predict/predict_proba path, for both
+# results (must be identical) and latency per call.
+import argparse
+
+import numpy as np
+
+from _common import bench_models_dir, sample_rows, timed, train_bench_model # Also puts Backend/ on sys.path
+
+
+def sklearn_path(model, X, top_k):
+    """What ModelStore.predict did before the compiled path: predict, then predict_proba, then rank."""
+    y_pred = model.predict(X)
+    probs = model.predict_proba(X)
+    classes = list(model.classes_)
+    out = []
+    for row, label in enumerate(y_pred):
+        ranked = sorted(zip(classes, probs[row]), key=lambda x: float(x[1]), reverse=True)[:top_k]
+        out.append((str(label), [(str(c), float(p)) for c, p in ranked]))
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser(description="Compiled scorer vs sklearn predict path")
+    p.add_argument("--sizes", default="1,32,1000", help="Comma separated batch sizes")
+    p.add_argument("--repeat", type=int, default=5, help="Runs per measurement, best one is reported")
+    args = p.parse_args()
+
+    from app.scoring import LinearScorer
+    from ML.retrain_ml_model import build_vectorizer
+
+    model, df = train_bench_model(bench_models_dir())
+    scorer = LinearScorer.from_model(model)
+    vectorizer = build_vectorizer()
+
+    print(f"\n{'batch':>8} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>9} {'identical':>10}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        X = vectorizer.transform([f"{v} {d}".lower() for v, d in sample_rows(df, n)])
+        expected = sklearn_path(model, X, 3)
+        got = scorer.score(X, 3)
+        same = all(
+            e[0] == g[0] and [c for c, _ in e[1]] == [c for c, _ in g[1]]
+            and np.allclose([p for _, p in e[1]], [p for _, p in g[1]], rtol=0, atol=1e-12)
+            for e, g in zip(expected, got)
+        )
+        slow = timed(lambda: sklearn_path(model, X, 3), args.repeat)
+        fast = timed(lambda: scorer.score(X, 3), args.repeat)
+        print(f"{n:>8} {slow * 1000:>12.3f} {fast * 1000:>12.3f} {slow / fast:>8.1f}x {str(same):>10}")
+
+
+if __name__ == "__main__":
+    main()
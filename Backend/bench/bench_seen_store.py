@@ -0,0 +1,102 @@
+# Backend/bench/bench_seen_store.py
+# Memory and time of the seen-row bookkeeping: legacy sha256 hex strings in a set + JSON file
+# vs the binary SeenStore, at 1M and 10M rows.
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import _common # noqa: F401  Puts Backend/ on sys.path
+
+
+def synthetic_rows(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vendors = np.array([f"vendor {i}" for i in range(5000)], dtype=object)
+    texts = vendors[rng.integers(0, len(vendors), n)] + " txn " + np.arange(n).astype(str).astype(object)
+    categories = np.array([f"cat {i}" for i in range(20)], dtype=object)[rng.integers(0, 20, n)]
+    return texts, categories
+
+
+def measure(fn):
+    """Run fn twice: once timed, once under tracemalloc (which slows Python allocations down a lot)
+    for its memory. Returns (result, seconds, peak traced MB, MB still held by the result)."""
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    held, peak = (b / 2**20 for b in tracemalloc.get_traced_memory())
+    tracemalloc.stop()
+    return result, seconds, peak, held
+
+
+class _fresh_store:
+    """Empty on-disk store at path, so the timed and the traced run both start from nothing."""
+
+    def __init__(self, path):
+        from ML.seen_store import SeenStore
+
+        for suffix in (".ids", ".log"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self.store = SeenStore(path)
+
+    def add_and_save(self, ids):
+        self.store.add(ids)
+        self.store.save()
+
+
+def bench_legacy(texts, categories, workdir):
+    from ML.retrain_ml_model import row_id
+
+    path = os.path.join(workdir, "seen_hashes.json")
+    seen, t_hash, mem, _ = measure(lambda: {row_id(t, c) for t, c in zip(texts, categories)})
+    _, t_save, _, _ = measure(lambda: json.dump(sorted(seen), open(path, "w", encoding="utf-8")))
+    del seen
+    loaded, t_load, mem_load, held = measure(lambda: set(json.load(open(path, "r", encoding="utf-8"))))
+    ids = [row_id(t, c) for t, c in zip(texts[:100_000], categories[:100_000])]
+    _, t_lookup, _, _ = measure(lambda: [i in loaded for i in ids])
+    return {"hash_s": t_hash, "save_s": t_save, "load_s": t_load, "lookup_100k_s": t_lookup,
+            "peak_mb": max(mem, mem_load), "held_mb": held, "disk_mb": os.path.getsize(path) / 2**20}
+
+
+def bench_store(texts, categories, workdir):
+    from ML.seen_store import SeenStore, row_ids
+
+    path = os.path.join(workdir, "seen_ids")
+    ids, t_hash, mem_hash, _ = measure(lambda: row_ids(texts, categories))
+    _, t_save, mem_save, _ = measure(lambda: _fresh_store(path).add_and_save(ids))
+    loaded, t_load, mem_load, held = measure(lambda: SeenStore(path))
+    _, t_lookup, _, _ = measure(lambda: loaded.contains(ids[:100_000]))
+    disk = sum(os.path.getsize(p) for p in (loaded.ids_path, loaded.log_path) if p.exists())
+    return {"hash_s": t_hash, "save_s": t_save, "load_s": t_load, "lookup_100k_s": t_lookup,
+            "peak_mb": max(mem_hash, mem_save, mem_load), "held_mb": held, "disk_mb": disk / 2**20}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Legacy JSON seen set vs binary SeenStore")
+    p.add_argument("--rows", default="1000000,10000000", help="Comma separated row counts")
+    p.add_argument("--legacy_max_rows", type=int, default=10_000_000, help="Skip the legacy path above this size")
+    args = p.parse_args()
+
+    for n in [int(s) for s in args.rows.split(",")]:
+        texts, categories = synthetic_rows(n)
+        results = {}
+        with tempfile.TemporaryDirectory() as workdir:
+            results["binary store"] = bench_store(texts, categories, workdir)
+            if n <= args.legacy_max_rows:
+                results["legacy json"] = bench_legacy(texts, categories, workdir)
+        print(f"\n{n:,} rows")
+        print(f"{'':>14} {'hash s':>8} {'save s':>8} {'load s':>8} {'lookup 100k s':>14} "
+              f"{'peak MB':>9} {'held MB':>9} {'disk MB':>9}")
+        for name, r in results.items():
+            print(f"{name:>14} {r['hash_s']:>8.2f} {r['save_s']:>8.2f} {r['load_s']:>8.2f} {r['lookup_100k_s']:>14.3f} "
+                  f"{r['peak_mb']:>9.1f} {r['held_mb']:>9.1f} {r['disk_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Backend/bench/bench_sharded.py
+# Training from scratch: the sequential path (one partial_fit pass in one process, what _full_refit
+# does) against ML/sharded.py's replicas with parameter averaging, for growing worker counts and
+# for one-shot vs several synchronized rounds. Reports wall-clock time, speedup, accuracy and
+# macro F1 on held-out rows, and how often the averaged model agrees with the sequential one.
+# Part of the training labels can be flipped (--label_noise) so accuracy isn't pinned at 100%
+# on the generated data; the held-out labels stay clean. Speedup needs as many idle cores as
+# workers, the CPU count is printed with the results.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from _common import ROOT # Also puts Backend/ on sys.path
+
+
+def main():
+    p = argparse.ArgumentParser(description="Sequential vs sharded (parameter averaging) training")
+    p.add_argument("--rows", type=int, default=300_000)
+    p.add_argument("--categories", type=int, default=20)
+    p.add_argument("--label_noise", type=float, default=0.2, help="Share of training labels replaced by a random category")
+    p.add_argument("--eval_rows", type=int, default=20_000)
+    p.add_argument("--shards", default="2,4,8", help="Comma separated worker/shard counts")
+    p.add_argument("--rounds", default="1,4", help="Comma separated numbers of averaging rounds")
+    p.add_argument("--batch_size", type=int, default=2048)
+    args = p.parse_args()
+
+    sys.path.insert(0, str(ROOT.parent / "data"))
+    from gen_training_csv import generate_rows
+    from sklearn.metrics import accuracy_score, f1_score
+    from ML.retrain_ml_model import _full_refit, build_vectorizer, clean_frame, new_model
+    from ML.sharded import sharded_fit
+
+    df = clean_frame(pd.DataFrame(list(generate_rows(args.rows + args.eval_rows, categories=args.categories, seed=21)),
+                                  columns=["vendor", "description", "category", "date", "amount"]))
+    train, test = df[:-args.eval_rows].reset_index(drop=True), df[-args.eval_rows:]
+    rng = np.random.default_rng(0)
+    labels = train["category"].values.copy()
+    flip = rng.random(len(labels)) < args.label_noise
+    labels[flip] = rng.choice(np.unique(labels), int(flip.sum()))
+    train["category"] = labels
+    classes = np.unique(df["category"].values)
+    vectorizer = build_vectorizer()
+    X_test, y_test = vectorizer.transform(test["text"].values), test["category"].values
+
+    def score(model, seconds):
+        y_pred = model.predict(X_test)
+        return {"seconds": seconds, "accuracy": accuracy_score(y_test, y_pred),
+                "macro_f1": f1_score(y_test, y_pred, average="macro", zero_division=0), "pred": y_pred}
+
+    start = time.perf_counter()
+    model = new_model(42)
+    _full_refit(train, model, vectorizer, classes, args.batch_size)
+    base = score(model, time.perf_counter() - start)
+
+    print(f"{len(train):,} training rows ({args.label_noise:.0%} noisy labels), {len(classes)} categories, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'mode':<22} {'seconds':>8} {'speedup':>8} {'accuracy':>9} {'macro F1':>9} {'agrees':>7}")
+    print(f"{'sequential':<22} {base['seconds']:>8.1f} {1.0:>7.2f}x {base['accuracy']:>9.4f} {base['macro_f1']:>9.4f} {1.0:>7.1%}")
+    for shards in (int(s) for s in args.shards.split(",")):
+        for rounds in (int(r) for r in args.rounds.split(",")):
+            start = time.perf_counter()
+            model = sharded_fit(train["text"].values, train["category"].values, classes, vectorizer, shards,
+                                rounds=rounds, batch_size=args.batch_size, verbose=False)
+            r = score(model, time.perf_counter() - start)
+            agrees = float((r["pred"] == base["pred"]).mean())
+            print(f"{f'{shards} shards, {rounds} rounds':<22} {r['seconds']:>8.1f} {base['seconds'] / r['seconds']:>7.2f}x "
+                  f"{r['accuracy']:>9.4f} {r['macro_f1']:>9.4f} {agrees:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Backend/bench/bench_vendor_index.py
+# Vendor index fast path: hit rate on a traffic sample, single-row latency of index hits against
+# the model, and how often the index answer agrees with what the model would have said. Trains on
+# a generated CSV (or --csv) with the normal retrain CLI, which also writes the index.
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from _common import ROOT, bench_models_dir
+
+
+def percentile_us(seconds, p) -> float:
+    return float(np.percentile(np.asarray(seconds) * 1e6, p))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Hit rate and latency saved by the vendor index")
+    p.add_argument("--csv", default=None, help="Training CSV (default: generate one)")
+    p.add_argument("--rows", type=int, default=100_000, help="Rows to generate when --csv isn't given")
+    p.add_argument("--vendors", type=int, default=None, help="Vendors per category of the generated data")
+    p.add_argument("--calls", type=int, default=5000, help="Single-row predict calls timed per store")
+    args = p.parse_args()
+
+    from app.interface import ModelStore
+    from ML.retrain_ml_model import load_data
+
+    models_dir = bench_models_dir()
+    csv_path = args.csv
+    if csv_path is None:
+        sys.path.insert(0, str(ROOT.parent / "data"))
+        from gen_training_csv import generate_rows, write_csv
+        csv_path = str(models_dir / "bench_vendor.csv")
+        write_csv(csv_path, generate_rows(args.rows, vendors=args.vendors, seed=7))
+    subprocess.run([sys.executable, str(ROOT / "ML" / "retrain_ml_model.py"), "--csv", csv_path, "--outdir", str(models_dir),
+                    "--stream", "--feedback_csv", "", "--summary_json", ""], check=True, stdout=subprocess.DEVNULL)
+
+    df = load_data(csv_path).sample(n=args.calls, random_state=1) # Traffic sample with the training vendor mix
+    pairs = list(zip(df["vendor"], df["description"]))
+    with_index = ModelStore(models_dir, watch_interval=3600)
+    model_only = ModelStore(models_dir, watch_interval=3600, use_vendor_index=False)
+
+    hits = [with_index._vendor_index.lookup(v) is not None for v, _ in pairs]
+    timings = {"index hit": [], "model (index on, miss)": [], "model (index off)": []}
+    agree = total_hits = 0
+    for (vendor, description), hit in zip(pairs, hits):
+        start = time.perf_counter()
+        fast = with_index.predict(vendor, description)
+        timings["index hit" if hit else "model (index on, miss)"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        slow = model_only.predict(vendor, description)
+        timings["model (index off)"].append(time.perf_counter() - start)
+        if hit:
+            total_hits += 1
+            agree += fast[0] == slow[0]
+
+    stats = with_index.vendor_index_stats()
+    print(f"Index: {stats['vendors']} confident vendors, hit rate {np.mean(hits):.1%} over {len(pairs)} calls")
+    print(f"Index answer equals the model's on {agree / max(total_hits, 1):.2%} of the hits")
+    for name, secs in timings.items():
+        if secs:
+            print(f"  {name:<24} p50 {percentile_us(secs, 50):8.1f} us   p99 {percentile_us(secs, 99):8.1f} us   ({len(secs)} calls)")
+    saved = sum(timings["model (index off)"]) - sum(timings["index hit"]) - sum(timings["model (index on, miss)"])
+    print(f"Time saved over {len(pairs)} calls: {saved * 1000:.0f} ms "
+          f"({saved / max(sum(timings['model (index off)']), 1e-9):.0%}), store estimate {stats['est_seconds_saved'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# Backend/bench/loadtest.py
+# End-to-end HTTP load test of api/predict_api.py. By default it trains a model on a generated CSV,
+# starts the real app under uvicorn on localhost (its own process, models directory and feedback
+# CSV, PAI_* variables of this shell are passed on) and drives it through phases:
+#   steady    --mix of requests
+#   reload    the same mix while the served model file is touched every --reload_every seconds,
+#             so the store hot-loads it again and again
+#   feedback  --feedback_mix, mostly /feedback, so feedback.csv keeps growing (--feedback_rows
+#             pre-fills it, the app reads it once at start-up)
+# Load is either a fixed number of requests in flight (--concurrency) or a fixed arrival rate
+# (--rate, latency then counts from the scheduled send time, so a slow server can't hide its
+# queue). Every phase reports p50/p95/p99 latency, throughput and error rate per route, written
+# as JSON so versions can be diffed:
+#   python bench/loadtest.py --concurrency 32
+#   python bench/loadtest.py --rate 500 --compare bench/results/loadtest_<earlier>.json
+#   python bench/loadtest.py --url http://127.0.0.1:8000 --phases steady   (a server already running)
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from _common import ROOT, bench_models_dir
+from run_suite import RESULTS_DIR, flatten, git_commit
+
+ROUTES = {
+    "predict": ("POST", "/predict"),
+    "batch": ("POST", "/predict/batch"),
+    "feedback": ("POST", "/feedback"),
+    "categories": ("GET", "/categories"),
+}
+PHASES = ["steady", "reload", "feedback"]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """"predict=80,feedback=15,categories=5" -> weights per route."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ROUTES:
+            raise ValueError(f"Unknown route {name!r} in the mix, choose from {sorted(ROUTES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Requests:
+    """Request bodies drawn from generated expense rows, route picked by the mix weights."""
+
+    def __init__(self, rows: List[tuple], batch_rows: int, seed: int):
+        self.rows = rows
+        self.batch_rows = batch_rows
+        self.random = random.Random(seed)
+
+    def next(self, mix: Dict[str, float]) -> Tuple[str, str, str, bytes | None]:
+        route = self.random.choices(list(mix), weights=list(mix.values()))[0]
+        method, path = ROUTES[route]
+        vendor, description, category, day, amount = self.rows[self.random.randrange(len(self.rows))]
+        if route == "predict":
+            body = {"vendor": vendor, "description": description}
+        elif route == "batch":
+            picked = self.random.sample(self.rows, min(self.batch_rows, len(self.rows)))
+            body = {"items": [{"vendor": r[0], "description": r[1]} for r in picked], "top_k": 3}
+        elif route == "feedback":
+            body = {"vendor": vendor, "description": description, "category": category, "date": day, "amount": float(amount)}
+        else:
+            body = None
+        return route, method, path, json.dumps(body).encode() if body is not None else None
+
+
+class Connections:
+    """Keep-alive HTTP/1.1 connections over asyncio streams, at most limit at a time. Plain sockets
+    instead of a client library, which would cost more CPU than the server it measures."""
+
+    def __init__(self, host: str, port: int, limit: int):
+        self.host, self.port = host, port
+        self.limit = asyncio.Semaphore(limit)
+        self.idle = []
+
+    async def request(self, method: str, path: str, body: bytes | None) -> int:
+        """Send one request, return the response status."""
+        async with self.limit:
+            reader, writer = self.idle.pop() if self.idle else await asyncio.open_connection(self.host, self.port)
+            try:
+                head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                if body is not None:
+                    head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                writer.write((head + "\r\n").encode() + (body or b""))
+                lines = (await reader.readuntil(b"\r\n\r\n")).split(b"\r\n")
+                length = next((int(line.split(b":", 1)[1]) for line in lines[1:] if line.lower().startswith(b"content-length:")), 0)
+                await reader.readexactly(length)
+            except BaseException:
+                writer.close()
+                raise
+            self.idle.append((reader, writer))
+            return int(lines[0].split()[1])
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+
+
+async def drive(host: str, port: int, requests: Requests, mix: Dict[str, float], seconds: float,
+                concurrency: int, rate: float | None) -> List[Tuple[str, float, int]]:
+    """Run the mix for seconds, returns (route, latency seconds, status) per request, status 0 for
+    a failed connection. With rate, requests are sent on a fixed schedule (at most concurrency
+    connections, requests wait for a free one), otherwise concurrency clients send back to back."""
+    pool = Connections(host, port, concurrency)
+    results = []
+
+    async def one(scheduled: float):
+        route, method, path, body = requests.next(mix)
+        try:
+            status = await pool.request(method, path, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status = 0
+        results.append((route, time.perf_counter() - scheduled, status))
+
+    start = time.perf_counter()
+    deadline = start + seconds
+    if rate:
+        tasks = []
+        for i in range(int(seconds * rate)):
+            at = start + i / rate
+            delay = at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(at)))
+        await asyncio.gather(*tasks)
+    else:
+        async def client():
+            while time.perf_counter() < deadline:
+                await one(time.perf_counter())
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    pool.close()
+    return results
+
+
+def summarize(results: List[Tuple[str, float, int]], seconds: float) -> dict:
+    """Latency percentiles, throughput and error rate overall and per route."""
+    def stats(rows) -> dict:
+        if not rows:
+            return {"requests": 0}
+        ms = np.asarray([r[1] for r in rows]) * 1000.0
+        errors = sum(1 for r in rows if not 200 <= r[2] < 300)
+        statuses = {}
+        for r in rows:
+            statuses[str(r[2])] = statuses.get(str(r[2]), 0) + 1
+        return {"requests": len(rows), "throughput_rps": len(rows) / seconds, "errors": errors,
+                "error_rate": errors / len(rows), "statuses": statuses, "mean_ms": float(ms.mean()),
+                **{f"p{p}_ms": float(np.percentile(ms, p)) for p in (50, 95, 99)}, "max_ms": float(ms.max())}
+
+    return {"all": stats(results), "routes": {route: stats([r for r in results if r[0] == route])
+                                              for route in sorted({r[0] for r in results})}}
+
+
+def get_json(base: str, path: str) -> dict:
+    import httpx
+    return httpx.get(base + path, timeout=10.0).json()
+
+
+def wait_ready(base: str, server: subprocess.Popen | None, timeout: float = 60.0):
+    import httpx
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"The server exited with status {server.returncode}")
+        try:
+            httpx.get(base + "/stats", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def active_model(models_dir: Path) -> Path:
+    """The file the store serves: the manifest's active artifact, else the newest .linmodel."""
+    from ML.registry import Registry
+    return Registry(models_dir).active_path() or max(models_dir.glob("*.linmodel"), key=lambda p: p.stat().st_mtime)
+
+
+def keep_reloading(path: Path, every: float, stop: threading.Event):
+    """Touch the served model file every `every` seconds, the store's watcher reloads it each time."""
+    while not stop.wait(every):
+        os.utime(path)
+
+
+def prepare(args) -> Tuple[Path, Path, List[tuple]]:
+    """Train a model on a generated CSV into a temporary models directory and pre-fill a feedback
+    CSV. Returns (models dir, feedback CSV, rows the requests are drawn from)."""
+    sys.path.insert(0, str(ROOT.parent / "data"))
+    from gen_training_csv import generate_rows, write_csv
+
+    work = bench_models_dir()
+    train_csv = work / "train.csv"
+    write_csv(train_csv, generate_rows(args.train_rows, seed=11))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(ROOT / "ML" / "retrain_ml_model.py"), "--csv", str(train_csv), "--outdir", str(work),
+                    "--stream", "--feedback_csv", "", "--summary_json", ""], check=True, stdout=subprocess.DEVNULL)
+    print(f"Trained on {args.train_rows:,} generated rows in {time.perf_counter() - start:.1f}s -> {work}")
+
+    feedback_csv = work / "feedback.csv"
+    with open(feedback_csv, "w", newline="", encoding="utf-8") as f: # Same columns as the API writes
+        w = csv.writer(f)
+        w.writerow(["date", "amount", "vendor", "description", "category", "source", "created_at_utc"])
+        w.writerows([day, amount, vendor, description, category, "loadtest", ""]
+                    for vendor, description, category, day, amount in generate_rows(args.feedback_rows, seed=12))
+    return work, feedback_csv, list(generate_rows(5000, seed=13)) # Rows the model hasn't seen
+
+
+def compare(current: dict, previous_path: str):
+    """Print every numeric figure next to the same figure of an earlier report."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    now, before = flatten(current["phases"]), flatten(previous["phases"])
+    print(f"\nCompared with {previous_path} ({previous['meta'].get('git_commit')}):")
+    for key in sorted(now.keys() & before.keys()):
+        if ".statuses." in key or ".mix." in key:
+            continue
+        ratio = now[key] / before[key] if before[key] else float("nan")
+        print(f"  {key:<50} {before[key]:>12,.3f} -> {now[key]:>12,.3f}  ({ratio:5.2f}x)")
+
+
+def main():
+    p = argparse.ArgumentParser(description="HTTP load test of the prediction API")
+    p.add_argument("--url", default=None, help="Test a server that is already running instead of starting one")
+    p.add_argument("--models_dir", default=None, help="With --url: the server's models directory, for the reload phase")
+    p.add_argument("--port", type=int, default=8766, help="Port of the server this script starts")
+    p.add_argument("--phases", default=",".join(PHASES), help=f"Comma separated, from {PHASES}")
+    p.add_argument("--seconds", type=float, default=10.0, help="Duration of each phase")
+    p.add_argument("--concurrency", type=int, default=16, help="Requests in flight (with --rate: connections at most)")
+    p.add_argument("--rate", type=float, default=None, help="Requests per second on a fixed schedule instead")
+    p.add_argument("--mix", default="predict=85,categories=10,feedback=5", help="Route weights of the steady and reload phases")
+    p.add_argument("--feedback_mix", default="feedback=70,predict=25,categories=5", help="Route weights of the feedback phase")
+    p.add_argument("--batch_rows", type=int, default=100, help="Rows per /predict/batch request")
+    p.add_argument("--reload_every", type=float, default=1.0, help="Seconds between model reloads in the reload phase")
+    p.add_argument("--train_rows", type=int, default=100_000, help="Generated rows the served model is trained on")
+    p.add_argument("--feedback_rows", type=int, default=50_000, help="Rows in the feedback CSV when the server starts")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", default=None, help="Report JSON (default bench/results/loadtest_<timestamp>.json)")
+    p.add_argument("--compare", default=None, help="Earlier report JSON to compare against")
+    args = p.parse_args()
+    phases = [name.strip() for name in args.phases.split(",")]
+    mixes = {"steady": parse_mix(args.mix), "reload": parse_mix(args.mix), "feedback": parse_mix(args.feedback_mix)}
+
+    server = None
+    feedback_csv = None
+    if args.url:
+        base = args.url.rstrip("/")
+        models_dir = Path(args.models_dir) if args.models_dir else None
+        sys.path.insert(0, str(ROOT.parent / "data"))
+        from gen_training_csv import generate_rows
+        rows = list(generate_rows(5000, seed=13))
+    else:
+        models_dir, feedback_csv, rows = prepare(args)
+        base = f"http://127.0.0.1:{args.port}"
+        env = {**os.environ, "PAI_MODELS_DIR": str(models_dir), "PAI_FEEDBACK_CSV": str(feedback_csv),
+               "PAI_RELOAD_INTERVAL": os.getenv("PAI_RELOAD_INTERVAL", "0.5")}
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.predict_api:app", "--host", "127.0.0.1",
+                                   "--port", str(args.port), "--log-level", "warning"], cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL)
+    host, port = urlsplit(base).hostname, urlsplit(base).port or 80
+    requests = Requests(rows, args.batch_rows, args.seed)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "url": base,
+            "load": f"{args.rate} req/s" if args.rate else f"{args.concurrency} in flight",
+            "args": vars(args),
+        },
+        "phases": {},
+    }
+    try:
+        start = time.perf_counter()
+        wait_ready(base, server)
+        report["meta"]["server_ready_seconds"] = time.perf_counter() - start
+        print(f"{'phase':<9} {'route':<11} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name in phases:
+            if name not in mixes:
+                raise ValueError(f"Unknown phase {name!r}, choose from {PHASES}")
+            stop = threading.Event()
+            if name == "reload":
+                if models_dir is None:
+                    print("reload    skipped, --url needs --models_dir to reload the model")
+                    continue
+                threading.Thread(target=keep_reloading, args=(active_model(models_dir), args.reload_every, stop), daemon=True).start()
+            before = get_json(base, "/stats")
+            try:
+                results = asyncio.run(drive(host, port, requests, mixes[name], args.seconds, args.concurrency, args.rate))
+            finally:
+                stop.set()
+            time.sleep(1.5) # Lets the feedback writer flush what this phase queued
+            after = get_json(base, "/stats")
+            phase = summarize(results, args.seconds)
+            phase["mix"] = mixes[name]
+            phase["model_reloads"] = after["model"]["reload_count"] - before["model"]["reload_count"]
+            phase["last_reload_seconds"] = after["model"]["last_reload_seconds"]
+            phase["feedback_rows_written"] = after["feedback"]["rows_written"] - before["feedback"]["rows_written"]
+            if feedback_csv is not None:
+                phase["feedback_csv_mb"] = feedback_csv.stat().st_size / 2**20
+            report["phases"][name] = phase
+            for route, s in [("all", phase["all"])] + sorted(phase["routes"].items()):
+                if s["requests"]:
+                    print(f"{name:<9} {route:<11} {s['requests']:>9} {s['throughput_rps']:>8,.0f} {s['error_rate']:>7.2%} "
+                          f"{s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.1f}")
+            if name == "reload":
+                print(f"{'':<9} {phase['model_reloads']} model reloads, the last took {phase['last_reload_seconds'] * 1000:.1f} ms")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"loadtest_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"\nReport written to {out}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
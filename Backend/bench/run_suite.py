@@ -0,0 +1,232 @@
+# Backend/bench/run_suite.py
+# End-to-end offline benchmark suite: ingestion, dedup, vectorization, training, evaluation and
+# inference on a generated (or given) CSV. Each stage runs in a fresh process so its peak memory
+# is its own, and the results are written as JSON so runs can be compared over time:
+#   python bench/run_suite.py --rows 1000000
+#   python bench/run_suite.py --rows 1000000 --compare bench/results/suite_<earlier>.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from _common import ROOT # Also puts Backend/ on sys.path
+
+RESULTS_DIR = ROOT / "bench" / "results"
+
+
+def _rates(rows: int, seconds: float) -> dict:
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / max(seconds, 1e-9)}
+
+
+def _percentiles(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000.0
+    return {f"p{p}_ms": float(np.percentile(ms, p)) for p in (50, 95, 99)}
+
+
+def _with_memory(fn, *args) -> dict:
+    """Run one stage in this (fresh) process and add its memory figures."""
+    from ML.retrain_ml_model import peak_rss_mb
+    base = peak_rss_mb()
+    result = fn(*args)
+    return {**result, "baseline_rss_mb": base, "peak_rss_mb": peak_rss_mb()}
+
+
+def stage_ingest(csv_path: str, opts: dict) -> dict:
+    from ML.retrain_ml_model import iter_data_chunks, load_data
+    start = time.perf_counter()
+    rows = len(load_data(csv_path))
+    loaded = _rates(rows, time.perf_counter() - start)
+    start = time.perf_counter()
+    streamed = sum(len(c) for c in iter_data_chunks(csv_path, opts["chunk_size"]))
+    return {"load_data": loaded, "stream": _rates(streamed, time.perf_counter() - start)}
+
+
+def stage_dedup(csv_path: str, opts: dict) -> dict:
+    from ML.retrain_ml_model import load_data
+    from ML.seen_store import SeenStore, row_ids
+    df = load_data(csv_path)
+    start = time.perf_counter()
+    ids = row_ids(df["text"].values, df["category"].values)
+    hashed = _rates(len(df), time.perf_counter() - start)
+    store = SeenStore()
+    start = time.perf_counter()
+    store.add(ids)
+    added = _rates(len(ids), time.perf_counter() - start)
+    start = time.perf_counter()
+    store.contains(ids)
+    return {"row_ids": hashed, "add": added, "contains": _rates(len(ids), time.perf_counter() - start),
+            "unique_rows": len(store)}
+
+
+def stage_vectorize(csv_path: str, opts: dict) -> dict:
+    from ML.retrain_ml_model import _text_batches, build_vectorizer, load_data
+    df = load_data(csv_path)
+    vectorizer = build_vectorizer()
+    start = time.perf_counter()
+    nnz = sum(vectorizer.transform(batch).nnz for batch in _text_batches(df, opts["batch_size"]))
+    return {**_rates(len(df), time.perf_counter() - start), "nnz_per_row": nnz / max(len(df), 1)}
+
+
+def stage_train(csv_path: str, opts: dict) -> dict:
+    from ML.parallel_vectorize import VectorizePool
+    from ML.retrain_ml_model import _partial_fit_stream, build_vectorizer, load_data, new_model, save_model
+    df = load_data(csv_path)
+    df_train = df.iloc[:len(df) - opts["eval_rows"]].reset_index(drop=True) # The tail is left for evaluation
+    model, vectorizer = new_model(42), build_vectorizer()
+    start = time.perf_counter()
+    with VectorizePool(vectorizer, opts["workers"]) as pool:
+        _partial_fit_stream(df_train, model, vectorizer, opts["batch_size"], classes=np.unique(df["category"].values), pool=pool)
+    trained = _rates(len(df_train), time.perf_counter() - start)
+    start = time.perf_counter()
+    save_model(model, opts["models_dir"], "bill_category_model.joblib")
+    return {**trained, "workers": opts["workers"], "save_seconds": time.perf_counter() - start}
+
+
+def stage_evaluate(csv_path: str, opts: dict) -> dict:
+    import joblib
+    from ML.holdout import Holdout
+    from ML.retrain_ml_model import build_vectorizer, load_data
+    from ML.seen_store import row_ids
+    df = load_data(csv_path).tail(opts["eval_rows"])
+    model = joblib.load(Path(opts["models_dir"]) / "bill_category_model.joblib")
+    holdout = Holdout(Path(opts["models_dir"]) / "suite_holdout", build_vectorizer(), fraction=1.0, max_rows=len(df))
+    start = time.perf_counter()
+    holdout.update(df["text"].values, df["category"].values, row_ids(df["text"].values, df["category"].values))
+    built = _rates(len(holdout), time.perf_counter() - start)
+    start = time.perf_counter()
+    report = holdout.evaluate(model)
+    return {"build_holdout": built, "evaluate": _rates(len(holdout), time.perf_counter() - start),
+            "accuracy": report["accuracy"] if report else None, "latency": report["latency"] if report else None}
+
+
+def stage_inference(csv_path: str, opts: dict) -> dict:
+    from app.interface import ModelStore
+    from ML.retrain_ml_model import load_data
+    df = load_data(csv_path).tail(opts["eval_rows"])
+    pairs = list(zip(df["vendor"], df["description"]))
+    start = time.perf_counter()
+    store = ModelStore(opts["models_dir"], watch_interval=3600) # No cache, every call reaches the model
+    load_seconds = time.perf_counter() - start
+    single = []
+    for i in range(opts["single_calls"]):
+        v, d = pairs[i % len(pairs)]
+        t = time.perf_counter()
+        store.predict(v, d)
+        single.append(time.perf_counter() - t)
+    batch = pairs[:opts["batch_rows"]]
+    start = time.perf_counter()
+    store.predict_many(batch)
+    return {"load_seconds": load_seconds, "single": {"calls": len(single), **_percentiles(single)},
+            "batch": _rates(len(batch), time.perf_counter() - start)}
+
+
+STAGES = [("ingest", stage_ingest), ("dedup", stage_dedup), ("vectorize", stage_vectorize),
+          ("train", stage_train), ("evaluate", stage_evaluate), ("inference", stage_inference)]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(current: dict, previous_path: str):
+    """Print every numeric metric next to the same metric of an earlier run."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    now, before = flatten(current["stages"]), flatten(previous["stages"])
+    print(f"\nCompared with {previous_path} ({previous['meta'].get('git_commit')}):")
+    for key in sorted(now.keys() & before.keys()):
+        ratio = now[key] / before[key] if before[key] else float("nan")
+        print(f"  {key:<45} {before[key]:>14,.3f} -> {now[key]:>14,.3f}  ({ratio:5.2f}x)")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Offline benchmark suite with machine-readable results")
+    p.add_argument("--csv", default=None, help="Existing CSV to benchmark on (default: generate one)")
+    p.add_argument("--rows", type=int, default=200_000, help="Rows to generate when --csv isn't given")
+    p.add_argument("--categories", type=int, default=20)
+    p.add_argument("--vendors", type=int, default=None)
+    p.add_argument("--dup_rate", type=float, default=0.05)
+    p.add_argument("--stages", default=",".join(name for name, _ in STAGES), help="Comma separated stages to run")
+    p.add_argument("--batch_size", type=int, default=2048)
+    p.add_argument("--chunk_size", type=int, default=100_000)
+    p.add_argument("--workers", type=int, default=1, help="Vectorizing processes during training")
+    p.add_argument("--eval_rows", type=int, default=20_000, help="Rows at the end of the CSV kept out of training")
+    p.add_argument("--single_calls", type=int, default=2000, help="Single-row predict calls timed")
+    p.add_argument("--batch_rows", type=int, default=10_000, help="Rows in the timed predict_many call")
+    p.add_argument("--out", default=None, help="Results JSON (default bench/results/suite_<timestamp>.json)")
+    p.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = p.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="pai_suite_"))
+    csv_path = args.csv
+    if csv_path is None:
+        sys.path.insert(0, str(ROOT.parent / "data"))
+        from gen_training_csv import generate_rows, write_csv
+        csv_path = str(work / f"suite_{args.rows}.csv")
+        start = time.perf_counter()
+        write_csv(csv_path, generate_rows(args.rows, args.categories, args.vendors, args.dup_rate, seed=303))
+        print(f"Generated {args.rows:,} rows in {time.perf_counter() - start:.1f}s -> {csv_path}")
+
+    opts = {"batch_size": args.batch_size, "chunk_size": args.chunk_size, "workers": args.workers,
+            "eval_rows": args.eval_rows, "single_calls": args.single_calls, "batch_rows": args.batch_rows,
+            "models_dir": str(work / "models")}
+    selected = set(args.stages.split(","))
+    if selected & {"evaluate", "inference"}:
+        selected.add("train") # They score the model the train stage saves
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "csv": csv_path,
+            "csv_bytes": os.path.getsize(csv_path),
+            "args": vars(args),
+        },
+        "stages": {},
+    }
+    for name, fn in STAGES:
+        if name not in selected:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex: # Fresh process per stage
+            result = ex.submit(_with_memory, fn, csv_path, opts).result()
+        results["stages"][name] = result
+        print(f"{name:>10}: " + json.dumps(result, default=float)[:300])
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"suite_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, default=float)
+    print(f"\nResults written to {out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 -- Create a single view used as training data for the ML pipeline.
 -- This combines user-provided labels and system "seed" labels into
--- a uniform row shape: (vendor, description, category, source).
+-- a uniform row shape: (vendor, description, category, source, created_at).
+-- created_at is the training watermark: retrain_ml_model.py --source sql only reads
+-- rows newer than the last run (seed rows have none and are read on the first run).
 CREATE OR REPLACE VIEW training_expenses AS
 -- Rows coming from real users' labels. We only include rows where
 -- the user has chosen a category (chosen_cat is not NULL).
@@ -8,7 +10,8 @@ SELECT
   vendor,
   description,
   chosen_cat AS category,    -- rename chosen_cat to category for consistency
-  'user_label' AS source     -- mark source so downstream code can treat user labels specially
+  'user_label' AS source,    -- mark source so downstream code can treat user labels specially
+  created_at                 -- when the label was recorded, used for incremental training
 FROM user_labels
 WHERE chosen_cat IS NOT NULL
 
@@ -20,7 +23,8 @@ SELECT
   vendor,
   description,
   category,
-  'seed' AS source           -- mark these rows as seed data (system-provided)
+  'seed' AS source,          -- mark these rows as seed data (system-provided)
+  NULL::timestamptz AS created_at -- seed rows have no label time
 FROM seed_expenses;
 
 -- RUN THIS & "C:\Program Files\PostgreSQL\18\bin\psql.exe" -P pager=off "$env:PGURL" -f "C:\Users\saifb\Downloads\PAI\Database\training_view.sql"
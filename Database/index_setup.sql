@@ -5,6 +5,9 @@ CREATE INDEX IF NOT EXISTS idx_expenses_user_date
 CREATE INDEX IF NOT EXISTS idx_labels_expense
   ON user_labels(expense_id);
 
+CREATE INDEX IF NOT EXISTS idx_labels_created  -- incremental training reads labels by created_at
+  ON user_labels(created_at);
+
 ALTER TABLE user_labels
   ADD CONSTRAINT unique_user_expense UNIQUE (user_id, expense_id);
 
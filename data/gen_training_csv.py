@@ -1,8 +1,7 @@
-import csv, random, re
+import csv, random, re, argparse
+from collections import deque
 from datetime import date, timedelta
 
-random.seed(303)
-
 CATS = [
     "Groceries","Coffee","Utilities","Rent","Internet","Phone",
     "Office Supplies","Dining","Transportation","Fuel","Pharmacy",
@@ -58,47 +57,101 @@ DESCS = {
 
 LOC = ["London ON","Downtown","Campus","Masonville","Online","Store #214","Richmond St"]
 MOD = ["promo","student","receipt","order","invoice","ref","txn","branch"]
+FIELDS = ["vendor","description","category","date","amount"]
+_WORDS = ["alpha","bravo","delta","echo","gamma","kilo","lima","nova","orbit","pixel","quartz","sierra","tango","vega"]
+
+def get_args():
+    p = argparse.ArgumentParser(description="Generate a synthetic training CSV of any size, written as it is generated")
+    p.add_argument("--rows", type=int, default=400, help="Rows to write (default 20 per category)")
+    p.add_argument("--categories", type=int, default=len(CATS),
+                   help="Number of categories, past the built-in ones synthetic categories are added")
+    p.add_argument("--vendors", type=int, default=None,
+                   help="Vendors per category (default: the built-in lists, more adds numbered branches)")
+    p.add_argument("--dup_rate", type=float, default=0.0, help="Share of rows that repeat a recent row exactly")
+    p.add_argument("--out", default=None, help="Output CSV (default training_data_<rows>.csv)")
+    p.add_argument("--seed", type=int, default=303, help="Random seed, same arguments give the same file")
+    p.add_argument("--end_date", default=None, help="Latest date in the data (YYYY-MM-DD, default today)")
+    return p.parse_args()
 
-def mix_desc(base: str) -> str:
+def build_catalog(n_categories: int, n_vendors: int | None):
+    """Category names with their vendor and description lists, extended synthetically past the built-in ones."""
+    cats, vendors, descs = [], {}, {}
+    for i in range(n_categories):
+        if i < len(CATS):
+            cat = CATS[i]
+            vendors[cat], descs[cat] = list(VENDORS[cat]), list(DESCS[cat])
+        else: # Synthetic category with made-up vendor names and descriptions
+            a, b = _WORDS[i % len(_WORDS)], _WORDS[(i // len(_WORDS)) % len(_WORDS)]
+            cat = f"{a.title()} {b.title()} {i}"
+            vendors[cat] = [f"{a.title()}{b} Co {j}" for j in range(6)]
+            descs[cat] = [f"{a} {b} service {j}" for j in range(4)]
+        if n_vendors is not None: # Trim, or add numbered branches of the existing vendors
+            base = vendors[cat]
+            vendors[cat] = [base[j] if j < len(base) else f"{base[j % len(base)]} Branch {j}" for j in range(n_vendors)]
+        cats.append(cat)
+    return cats, vendors, descs
+
+def mix_desc(base: str, rng: random.Random = random) -> str:
     parts = [base]
-    if random.random() < 0.5: parts.append(random.choice(LOC))
-    if random.random() < 0.4: parts.append(f"{random.choice(MOD)} #{random.randint(1000,9999)}")
+    if rng.random() < 0.5: parts.append(rng.choice(LOC))
+    if rng.random() < 0.4: parts.append(f"{rng.choice(MOD)} #{rng.randint(1000,9999)}")
     txt = " ".join(parts)
-    if random.random() < 0.25:
-        txt = re.sub(r" ", "  ", txt, count=random.randint(1,3))
-    r = random.random()
+    if rng.random() < 0.25:
+        txt = re.sub(r" ", "  ", txt, count=rng.randint(1,3))
+    r = rng.random()
     if   r < 0.15: txt = txt.lower()
     elif r < 0.30: txt = txt.title()
     return txt
 
-def rand_date() -> str:
-    d = date.today() - timedelta(days=random.randint(0, 270))
+def rand_date(rng: random.Random = random, end: date | None = None) -> str:
+    d = (end or date.today()) - timedelta(days=rng.randint(0, 270))
     return d.strftime("%Y-%m-%d")
 
-def amount_for(cat: str) -> float:
-    if cat == "Rent": return round(random.uniform(700, 1900), 2)
-    if cat in ["Utilities","Internet","Phone","Insurance","Fitness","Education"]: return round(random.uniform(12, 220), 2)
-    if cat == "Travel": return round(random.uniform(60, 900), 2)
-    if cat in ["Electronics","Clothing","Household"]: return round(random.uniform(10, 500), 2)
-    return round(random.uniform(3, 140), 2)
+def amount_for(cat: str, rng: random.Random = random) -> float:
+    if cat == "Rent": return round(rng.uniform(700, 1900), 2)
+    if cat in ["Utilities","Internet","Phone","Insurance","Fitness","Education"]: return round(rng.uniform(12, 220), 2)
+    if cat == "Travel": return round(rng.uniform(60, 900), 2)
+    if cat in ["Electronics","Clothing","Household"]: return round(rng.uniform(10, 500), 2)
+    return round(rng.uniform(3, 140), 2)
+
+def generate_rows(rows: int, categories: int = len(CATS), vendors: int | None = None, dup_rate: float = 0.0,
+                  seed: int = 303, end: date | None = None):
+    """Yield rows one at a time (memory stays flat for any row count). Categories take turns so
+    every prefix of the output is balanced; duplicates repeat one of the last 10k rows."""
+    rng = random.Random(seed)
+    cats, vendor_lists, desc_lists = build_catalog(categories, vendors)
+    recent = deque(maxlen=10_000) # Pool the duplicates are drawn from
+    for i in range(rows):
+        if recent and rng.random() < dup_rate:
+            yield recent[rng.randrange(len(recent))]
+            continue
+        cat = cats[i % len(cats)]
+        vendor = rng.choice(vendor_lists[cat])
+        vendor = f"{vendor} #{rng.randint(100, 899)}" if rng.random() < 0.35 else vendor
+        row = [vendor, mix_desc(rng.choice(desc_lists[cat]), rng), cat, rand_date(rng, end), amount_for(cat, rng)]
+        recent.append(row)
+        yield row
 
-rows = []
-for cat in CATS:
-    for _ in range(20):  # 20 per category = 400
-        vendor = random.choice(VENDORS[cat])
-        vendor = f"{vendor} #{random.randint(100, 899)}" if random.random() < 0.35 else vendor
-        desc = mix_desc(random.choice(DESCS[cat]))
-        rows.append({
-            "vendor": vendor,
-            "description": desc,
-            "category": cat,
-            "date": rand_date(),
-            "amount": amount_for(cat)
-        })
+def write_csv(out: str, rows, batch: int = 10_000) -> int:
+    """Write rows to out in batches, returns the number written."""
+    n = 0
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(FIELDS)
+        buf = []
+        for row in rows:
+            buf.append(row)
+            if len(buf) >= batch:
+                w.writerows(buf); n += len(buf); buf.clear()
+        w.writerows(buf); n += len(buf)
+    return n
 
-out = "training_data_400.csv"
-with open(out, "w", newline="", encoding="utf-8") as f:
-    w = csv.DictWriter(f, fieldnames=["vendor","description","category","date","amount"])
-    w.writeheader(); w.writerows(rows)
+def main():
+    args = get_args()
+    end = date.fromisoformat(args.end_date) if args.end_date else None
+    out = args.out or f"training_data_{args.rows}.csv"
+    n = write_csv(out, generate_rows(args.rows, args.categories, args.vendors, args.dup_rate, args.seed, end))
+    print(f"Wrote {n} rows to {out}")
 
-print(f"Wrote {len(rows)} rows to {out}")
+if __name__ == "__main__":
+    main()